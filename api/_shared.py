@@ -0,0 +1,434 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════╗
+║                            AEGIS RECON                                     ║
+║              Advanced Threat Intelligence System                           ║
+╠═══════════════════════════════════════════════════════════════════════════╣
+║  Author: VexSpitta                                                         ║
+║  GitHub: https://github.com/Vexx-bit                                       ║
+║  Project: https://github.com/Vexx-bit/Aegis-Recon                         ║
+║                                                                            ║
+║  © 2024-2026 VexSpitta. All Rights Reserved.                              ║
+║  Unauthorized copying, modification, or distribution is prohibited.       ║
+╚═══════════════════════════════════════════════════════════════════════════╝
+
+
+Aegis Recon - Shared Helpers
+Response encoding, the metrics registry and the scan store used by both
+serverless functions. The leading underscore keeps Vercel from deploying
+this file as a function of its own; vercel.json bundles it with each.
+"""
+
+import base64
+import bisect
+import functools
+import gzip
+import itertools
+import json
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from collections.abc import Mapping
+from urllib.request import urlopen, Request
+from urllib.error import URLError, HTTPError
+
+# Optional accelerators - used when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# ==================================================================
+# RESPONSE ENCODING
+# ==================================================================
+
+# Bodies smaller than this are not worth a compression pass
+COMPRESS_MIN_BYTES = 1024
+
+
+def _dumps_json(data):
+    """Serialize to UTF-8 JSON, using orjson when it is installed"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, default=_json_default)
+        except TypeError:
+            pass  # Non-string keys, oversized ints - let json handle them
+    return json.dumps(data, default=_json_default).encode('utf-8')
+
+
+def _negotiate_encoding(accept_encoding):
+    """Pick br or gzip from an Accept-Encoding header, honouring q=0"""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        match = re.search(r'q\s*=\s*([0-9.]+)', params)
+        try:
+            accepted[name.strip().lower()] = float(match.group(1)) if match else 1.0
+        except ValueError:
+            accepted[name.strip().lower()] = 0.0
+    
+    for encoding in ('br', 'gzip'):
+        if encoding == 'br' and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def _json_default(value):
+    """Objects that know their JSON form (compact result records) give it via to_dict()"""
+    to_dict = getattr(value, 'to_dict', None)
+    if to_dict is not None:
+        return to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# iter_json() walks the outer objects and long lists itself and hands
+# everything below them to _dumps_json, so the peak is one host or one
+# DNS record rather than the whole document, at close to one-shot speed
+STREAM_CHUNK_BYTES = 65536
+STREAM_DEPTH = 2       # Objects nested deeper than this are encoded in one piece...
+STREAM_LIST_MIN = 16   # ...except longer lists of objects, which are walked item by item
+
+
+def _iter_json(value, depth):
+    if isinstance(value, Mapping) and depth < STREAM_DEPTH and all(type(k) is str for k in value):
+        yield b'{'
+        for i, (key, item) in enumerate(value.items()):
+            yield (b',' if i else b'') + _dumps_json(key) + b':'
+            yield from _iter_json(item, depth + 1)
+        yield b'}'
+    elif isinstance(value, (list, tuple)) and len(value) > STREAM_LIST_MIN and isinstance(value[0], (Mapping, list)):
+        yield b'['
+        for i, item in enumerate(value):
+            if i:
+                yield b','
+            yield from _iter_json(item, depth + 1)
+        yield b']'
+    else:
+        yield _dumps_json(value)
+
+
+def iter_json(data, chunk_size=STREAM_CHUNK_BYTES):
+    """UTF-8 JSON for data in chunks of about chunk_size bytes, never the whole document"""
+    buffer = bytearray()
+    for piece in _iter_json(data, 0):
+        buffer += piece
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def write_json(data, stream):
+    """Stream data as JSON to a binary file object; returns the bytes written"""
+    written = 0
+    for chunk in iter_json(data):
+        stream.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def _compressor(encoding):
+    """(feed, finish) of an incremental br or gzip compressor"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        return compressor.process, compressor.finish
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+
+def json_response(data, accept_encoding):
+    """(content encoding, body chunks, content length or None) for a JSON response
+    
+    A document that fits in one chunk is sent whole and compressed past
+    COMPRESS_MIN_BYTES. A larger one is compressed as it is encoded, or,
+    for a client that takes no compression, handed out chunk by chunk with
+    no length - the connection close ends the body.
+    """
+    chunks = iter_json(data)
+    first = next(chunks, b'')
+    second = next(chunks, None)
+    if second is None:
+        encoding = _negotiate_encoding(accept_encoding) if len(first) >= COMPRESS_MIN_BYTES else None
+        body = _compress(first, encoding) if encoding else first
+        return encoding, [body], len(body)
+    
+    chunks = itertools.chain((first, second), chunks)
+    encoding = _negotiate_encoding(accept_encoding)
+    if encoding is None:
+        return None, chunks, None
+    feed, finish = _compressor(encoding)
+    body = [feed(chunk) for chunk in chunks]
+    body.append(finish())
+    return encoding, body, sum(len(part) for part in body)
+
+
+def compress_json(data, wbits=zlib.MAX_WBITS, level=6):
+    """zlib (or, with wbits=31, gzip) compressed JSON without the uncompressed text in memory"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+    return b''.join([compressor.compress(chunk) for chunk in iter_json(data)] + [compressor.flush()])
+
+
+# ==================================================================
+# METRICS
+# ==================================================================
+#
+# Counters and latency histograms kept in process memory and served in
+# the Prometheus text format (GET ?metrics). Values belong to one warm
+# instance and reset on a cold start; the instance label on aegis_info
+# tells scrapes of different instances apart.
+
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _is_timeout(error):
+    return isinstance(error, socket.timeout) or (
+        isinstance(error, URLError) and isinstance(error.reason, socket.timeout)
+    )
+
+
+def _series_key(name, labels):
+    items = tuple(labels.items())
+    return (name, tuple(sorted(items)) if len(items) > 1 else items)
+
+
+class _Timer:
+    """Observes the time spent in its with-block (MetricsRegistry.timer)"""
+    __slots__ = ('registry', 'name', 'labels', 'started')
+    
+    def __init__(self, registry, name, labels):
+        self.registry, self.name, self.labels = registry, name, labels
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+    
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.started, **self.labels)
+
+
+class _Outbound(_Timer):
+    """Times an outbound call and counts how it failed (MetricsRegistry.outbound)"""
+    __slots__ = ()
+    
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__()
+        if exc is not None:
+            if isinstance(exc, HTTPError):
+                kind = 'http'
+            elif isinstance(exc, Exception):
+                kind = 'timeout' if _is_timeout(exc) else 'error'
+            else:
+                return
+            self.registry.inc('aegis_outbound_errors_total', kind=kind, **self.labels)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class MetricsRegistry:
+    """Thread-safe counters and fixed-bucket histograms
+    
+    A series is a dict entry keyed by metric name and label pairs, so an
+    update is one lookup and an addition under a lock. Collectors are
+    callables returning [(name, kind, help, [(labels, value)])] that are
+    read at render time, for values other objects already keep.
+    """
+    
+    def __init__(self, service, buckets=LATENCY_BUCKETS):
+        self.service = service
+        self.instance = uuid.uuid4().hex[:12]
+        self.started = time.time()
+        self.buckets = buckets
+        self._help = {}
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+    
+    def describe(self, name, kind, text):
+        self._help[name] = (kind, text)
+    
+    def register(self, collector):
+        self._collectors.append(collector)
+    
+    def inc(self, name, value=1, **labels):
+        key = _series_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def observe(self, name, value, **labels):
+        key = _series_key(name, labels)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then the sum
+                series = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bucket] += 1
+            series[-1] += value
+    
+    def timer(self, name, **labels):
+        return _Timer(self, name, labels)
+    
+    def timed(self, name, **labels):
+        """Decorator form of timer()"""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+    
+    def outbound(self, dependency):
+        """Time an outbound call and count how it failed"""
+        return _Outbound(self, 'aegis_outbound_request_seconds', {'dependency': dependency})
+    
+    def render(self):
+        """All series in the Prometheus text exposition format"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(series)) for key, series in self._histograms.items())
+        
+        families = {}
+        for (name, labels), value in counters:
+            families.setdefault(name, ('counter', []))[1].append((labels, value))
+        for collector in self._collectors:
+            for name, kind, text, samples in collector():
+                self._help.setdefault(name, (kind, text))
+                families.setdefault(name, (kind, []))[1].extend(
+                    (tuple(sorted(labels.items())), value) for labels, value in samples
+                )
+        
+        lines = [
+            '# TYPE aegis_info gauge',
+            f'aegis_info{_format_labels([("instance", self.instance), ("service", self.service)])} 1',
+            '# TYPE aegis_uptime_seconds gauge',
+            f'aegis_uptime_seconds {time.time() - self.started:.3f}',
+        ]
+        
+        def header(name, kind):
+            text = self._help.get(name, (kind, ''))[1]
+            if text:
+                lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} {kind}')
+        
+        for name in sorted(families):
+            kind, samples = families[name]
+            header(name, kind)
+            for labels, value in samples:
+                lines.append(f'{name}{_format_labels(labels)} {value if isinstance(value, int) else round(value, 6)}')
+        
+        last = None
+        for (name, labels), series in histograms:
+            if name != last:
+                header(name, 'histogram')
+                last = name
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {series[-1]:.6f}')
+            lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+# ==================================================================
+# SHARED SCAN STORE
+# ==================================================================
+
+class ScanStore:
+    """Shared key/value store for scan results and reports
+    
+    Uses a Redis REST endpoint (Vercel KV / Upstash) when KV_REST_API_URL
+    and KV_REST_API_TOKEN are set, otherwise a local directory, which is
+    enough for `vercel dev` and single-instance deployments. Values are
+    gzipped JSON that expire after `ttl` seconds. KV calls go through
+    `opener` (an open_url with the caller's metrics) when one is given.
+    """
+    
+    def __init__(self, ttl=86400, opener=None):
+        self.ttl = ttl
+        self.opener = opener or (lambda request, timeout, dependency=None: urlopen(request, timeout=timeout))
+        self.kv_url = os.environ.get('KV_REST_API_URL', '').rstrip('/')
+        self.kv_token = os.environ.get('KV_REST_API_TOKEN')
+        self.directory = os.environ.get('SCAN_STORE_DIR') or os.path.join(tempfile.gettempdir(), 'aegis-recon-store')
+    
+    @property
+    def shared(self):
+        """True when other functions see the same data: KV, or an explicitly configured directory
+        
+        The /tmp fallback is private to each serverless function instance.
+        """
+        return bool(self.kv_url and self.kv_token) or bool(os.environ.get('SCAN_STORE_DIR'))
+    
+    def _path(self, key):
+        return os.path.join(self.directory, key.replace(':', '_') + '.json.gz')
+    
+    def put(self, key, value):
+        blob = compress_json(value, wbits=31)  # gzip, without the JSON text in memory
+        
+        if self.kv_url and self.kv_token:
+            req = Request(
+                f"{self.kv_url}/set/{key}?EX={self.ttl}",
+                data=base64.b64encode(blob),
+                headers={'Authorization': f"Bearer {self.kv_token}"},
+                method='POST'
+            )
+            with self.opener(req, timeout=5, dependency='kv') as response:
+                response.read()
+            return
+        
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(blob)
+        os.replace(path + '.tmp', path)
+    
+    def get(self, key):
+        """Return the stored value, or None if missing or expired"""
+        if self.kv_url and self.kv_token:
+            req = Request(f"{self.kv_url}/get/{key}", headers={'Authorization': f"Bearer {self.kv_token}"})
+            with self.opener(req, timeout=5, dependency='kv') as response:
+                encoded = json.loads(response.read().decode('utf-8')).get('result')
+            if not encoded:
+                return None
+            blob = base64.b64decode(encoded)
+        else:
+            path = self._path(key)
+            try:
+                if os.path.getmtime(path) + self.ttl < time.time():
+                    os.remove(path)
+                    return None
+                with open(path, 'rb') as f:
+                    blob = f.read()
+            except OSError:
+                return None
+        
+        return json.loads(gzip.decompress(blob).decode('utf-8'))
@@ -18,10 +18,26 @@ Generates threat intelligence reports using GROQ API
 from http.server import BaseHTTPRequestHandler
 import json
 import os
+import re
+import sys
+import hashlib
+import hmac
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs
 from urllib.request import urlopen, Request
 from urllib.error import URLError, HTTPError
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))  # _shared.py sits beside this file
+
+from _shared import (
+    METRICS_TOKEN, MetricsRegistry, ScanStore, json_response,
+)
+
 
 class handler(BaseHTTPRequestHandler):
     """Vercel serverless handler for AI analysis"""
@@ -31,7 +47,7 @@ class handler(BaseHTTPRequestHandler):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
         self.end_headers()
     
     def do_POST(self):
@@ -43,13 +59,79 @@ class handler(BaseHTTPRequestHandler):
             data = json.loads(body) if body else {}
             
             scan_results = data.get('results', {})
+            scan_id = str(data.get('scan_id') or '')
+            
+            # Analyze-by-reference: results stored by /api/scan
+            if scan_id:
+                if not re.fullmatch(r'[0-9a-f]{32}', scan_id):
+                    self._send_json({'success': False, 'error': 'Invalid scan_id'}, 400)
+                    return
+                scan_results = SCAN_STORE.get(f"scan:{scan_id}")
+                if not scan_results:
+                    self._send_json({'success': False, 'error': 'Scan not found or expired'}, 404)
+                    return
             
             if not scan_results:
                 self._send_json({'success': False, 'error': 'Scan results required'}, 400)
                 return
             
+            stream = data.get('stream') or 'text/event-stream' in self.headers.get('Accept', '')
+            
+            if scan_id:
+                stored = SCAN_STORE.get(f"report:{scan_id}")
+                
+                # Speculative run triggered by /api/scan - compute and park the report,
+                # unless the user's own request already did
+                if data.get('speculative'):
+                    if stored:
+                        self._send_json({'success': True, 'scan_id': scan_id, 'model': stored.get('model'), 'cached': True})
+                        return
+                    analysis = self.generate_analysis(scan_results)
+                    self._store_report(scan_id, analysis)
+                    self._send_json({'success': True, 'scan_id': scan_id, 'model': analysis['model']})
+                    return
+                
+                if stored:
+                    stored = dict(stored, cached=True)
+                    if stream:
+                        self._send_event_stream([
+                            ('token', {'content': stored['report']}),
+                            ('done', _analysis_metadata(stored))
+                        ])
+                    else:
+                        self._send_json({'success': True, 'analysis': stored})
+                    return
+            
+            # Hedged mode: answer within a deadline, upgrade to the GROQ report later
+            if data.get('hedge') or data.get('deadline_ms') is not None:
+                deadline_ms = data.get('deadline_ms')
+                if deadline_ms is None:
+                    deadline_ms = ANALYSIS_DEADLINE_MS
+                try:
+                    deadline_ms = float(deadline_ms)
+                except (TypeError, ValueError):
+                    deadline_ms = float('nan')
+                if not math.isfinite(deadline_ms):
+                    self._send_json({'success': False, 'error': 'deadline_ms must be a number'}, 400)
+                    return
+                deadline = min(max(deadline_ms, 0), 30000) / 1000
+                if stream:
+                    self._send_event_stream(self.generate_hedged_stream(scan_results, deadline))
+                else:
+                    self._send_json({
+                        'success': True,
+                        'analysis': self.generate_hedged_analysis(scan_results, deadline)
+                    })
+                return
+            
+            if stream:
+                self._send_event_stream(self.generate_analysis_stream(scan_results))
+                return
+            
             # Generate analysis
             analysis = self.generate_analysis(scan_results)
+            if scan_id:
+                self._store_report(scan_id, analysis)
             
             self._send_json({
                 'success': True,
@@ -57,10 +139,30 @@ class handler(BaseHTTPRequestHandler):
             })
             
         except Exception as e:
+            METRICS.inc('aegis_errors_total', stage='request')
             self._send_json({'success': False, 'error': str(e)}, 500)
     
     def do_GET(self):
-        """Handle GET requests (health check)"""
+        """Handle GET requests (health check, hedged report lookup, metrics)"""
+        query = parse_qs(urlparse(self.path).query, keep_blank_values=True)
+        if 'metrics' in query:
+            self._send_metrics()
+            return
+        report_id = query.get('report_id', [''])[0]
+        
+        if report_id:
+            if not re.fullmatch(r'[0-9a-f]{64}', report_id):
+                self._send_json({'success': False, 'error': 'Invalid report_id'}, 400)
+                return
+            analysis = ANALYSIS_CACHE.get(report_id)
+            if analysis is not None:
+                self._send_json({'success': True, 'pending': False, 'analysis': dict(analysis, report_id=report_id)})
+            elif ANALYSIS_CACHE.is_pending(report_id):
+                self._send_json({'success': True, 'pending': True, 'report_id': report_id})
+            else:
+                self._send_json({'success': False, 'error': 'Report not found or expired'}, 404)
+            return
+        
         self._send_json({
             'status': 'ok',
             'service': 'Aegis Recon AI Analyzer',
@@ -68,13 +170,60 @@ class handler(BaseHTTPRequestHandler):
             'github': 'https://github.com/Vexx-bit'
         })
     
+    def _send_metrics(self):
+        """Prometheus text exposition of this instance's METRICS"""
+        if METRICS_TOKEN:
+            supplied = self.headers.get('Authorization', '')
+            if not hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {METRICS_TOKEN}".encode('utf-8')):
+                self._send_json({'success': False, 'error': 'Unauthorized'}, 401)
+                return
+        
+        body = METRICS.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
     def _send_json(self, data, status=200):
-        """Send JSON response"""
+        """Send JSON response, compressed when the client accepts it"""
+        encoding, body, length = json_response(data, self.headers.get('Accept-Encoding', ''))
+        
         self.send_response(status)
         self.send_header('Content-Type', 'application/json')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        if length is not None:
+            self.send_header('Content-Length', str(length))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        for chunk in body:
+            self.wfile.write(chunk)
+    
+    def _store_report(self, scan_id, analysis):
+        """Park a GROQ report next to its scan; rule-based reports are cheap to rebuild"""
+        if not analysis.get('model', '').startswith('groq'):
+            return
+        try:
+            SCAN_STORE.put(f"report:{scan_id}", analysis)
+        except Exception:
+            pass
+    
+    def _send_event_stream(self, events):
+        """Relay (event, data) pairs to the client as server-sent events"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode('utf-8'))
+        
+        try:
+            for event, payload in events:
+                self.wfile.write(f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client went away mid-report
     
     def generate_analysis(self, scan_results):
         """Use GROQ to generate threat analysis"""
@@ -84,197 +233,164 @@ class handler(BaseHTTPRequestHandler):
             return self.generate_fallback_analysis(scan_results)
         
         try:
-            # Prepare context
-            target = scan_results.get('target', 'Unknown')
-            phases = scan_results.get('phases', {})
-            score = scan_results.get('security_score', 100)
-            
-            # Build summary
-            subdomain_count = len(phases.get('subdomains', []))
-            host_count = len(phases.get('hosts', []))
-            email_count = len(phases.get('osint', {}).get('emails', []))
-            tech_list = [t['name'] for t in phases.get('technologies', [])]
-            
-            # Get open ports
-            all_ports = []
-            for host in phases.get('hosts', []):
-                all_ports.extend(host.get('ports', []))
-            
-            # Get new security check data
-            headers_info = scan_results.get('security_headers', {})
-            headers_grade = headers_info.get('grade', 'Unknown')
-            missing_headers = [h['name'] for h in headers_info.get('headers_missing', [])]
-            
-            ssl_info = scan_results.get('ssl_info', {})
-            ssl_valid = ssl_info.get('valid', False)
-            ssl_issuer = ssl_info.get('issuer', 'Unknown')
-            ssl_tls = ssl_info.get('tls_version', 'Unknown')
-            ssl_days = ssl_info.get('days_until_expiry', 'Unknown')
-            
-            cves = scan_results.get('known_cves', [])
-            cve_list = [f"{c['cve']} ({c['severity']}) - {c['technology']}" for c in cves]
-            
-            admin_panels = scan_results.get('admin_panels', {}).get('found', [])
-            accessible_panels = [p['path'] for p in admin_panels if p.get('accessible')]
-            protected_panels = [p['path'] for p in admin_panels if not p.get('accessible')]
-            
-            robots_data = scan_results.get('robots_txt', {})
-            sensitive_paths = [p['path'] for p in robots_data.get('sensitive_paths', [])]
-            
-            dir_listing = scan_results.get('directory_listing', {})
-            exposed_dirs = dir_listing.get('exposed_dirs', [])
-            
-            score_factors = scan_results.get('score_factors', [])
-            
-            # New OSINT data
-            dns_records = scan_results.get('dns_records', [])
-            dns_summary = [f"{r['type']}: {r['value']}" for r in dns_records[:15]]
-            
-            whois_info = scan_results.get('whois_info', {})
-            
-            cookie_data = scan_results.get('cookie_security', {}).get('cookies', [])
-            cookie_summary = [f"{c['name']} (Secure:{c.get('secure')}, HttpOnly:{c.get('httponly')}, SameSite:{c.get('samesite')})" for c in cookie_data]
-            
-            http_methods = scan_results.get('http_methods', {})
-            risky_methods = http_methods.get('risky_methods', [])
-            
-            cors_data = scan_results.get('cors_check', {})
-            
-            prompt = f"""You are a senior cybersecurity consultant preparing a comprehensive threat intelligence report for {target}.
-
-RECONNAISSANCE DATA:
-- Target Domain: {target}
-- Security Score: {score}/100
-- Subdomains Discovered: {subdomain_count}
-- Active Hosts Identified: {host_count}
-- Open Ports Detected: {sorted(set(all_ports)) if all_ports else 'None detected'}
-- Email Addresses Exposed: {email_count}
-- Technology Stack: {', '.join(tech_list) if tech_list else 'None detected'}
-
-SECURITY HEADERS ANALYSIS:
-- Grade: {headers_grade}
-- Missing Headers: {', '.join(missing_headers) if missing_headers else 'None'}
-
-SSL/TLS CERTIFICATE:
-- Valid: {ssl_valid}
-- Issuer: {ssl_issuer}
-- TLS Version: {ssl_tls}
-- Days Until Expiry: {ssl_days}
-
-DNS RECORDS:
-{chr(10).join(dns_summary) if dns_summary else 'No DNS records retrieved'}
-
-WHOIS INTELLIGENCE:
-- Registrar: {whois_info.get('registrar', 'Unknown')}
-- Created: {whois_info.get('creation_date', 'Unknown')}
-- Expires: {whois_info.get('expiry_date', 'Unknown')}
-- Name Servers: {whois_info.get('name_servers', 'Unknown')}
-- DNSSEC: {whois_info.get('dnssec', 'Unknown')}
-
-COOKIE SECURITY:
-{chr(10).join(cookie_summary) if cookie_summary else 'No cookies detected'}
-
-HTTP METHODS:
-- Allowed: {', '.join(http_methods.get('methods', []))}
-- Risky Methods: {', '.join(risky_methods) if risky_methods else 'None'}
-
-CORS POLICY:
-- Wildcard Origin: {cors_data.get('wildcard_origin', False)}
-- Reflects Arbitrary Origin: {cors_data.get('reflects_origin', False)}
-
-KNOWN VULNERABILITIES (CVEs):
-{chr(10).join(cve_list) if cve_list else 'No known CVEs detected'}
-
-ADMIN PANELS DETECTED:
-- Accessible (No Auth): {', '.join(accessible_panels) if accessible_panels else 'None'}
-- Protected: {', '.join(protected_panels) if protected_panels else 'None'}
-
-ROBOTS.TXT SENSITIVE PATHS:
-{', '.join(sensitive_paths) if sensitive_paths else 'None found'}
-
-DIRECTORY LISTING:
-- Vulnerable: {dir_listing.get('vulnerable', False)}
-- Exposed Directories: {', '.join(exposed_dirs) if exposed_dirs else 'None'}
-
-SCORE BREAKDOWN:
-{chr(10).join(score_factors) if score_factors else 'No detailed breakdown available'}
-
-Generate a DETAILED professional threat assessment report with the following sections:
-
-## Executive Summary
-Provide a comprehensive 4-5 sentence overview of the target's security posture, key concerns, and overall risk profile. Reference the security score and major findings.
-
-## Key Findings
-Provide detailed bullet points for each discovery:
-- Security Headers analysis and implications for XSS/clickjacking protection
-- SSL/TLS configuration assessment
-- DNS configuration including SPF/DMARC email security
-- WHOIS intelligence and domain registration details
-- Cookie security analysis
-- HTTP methods and CORS policy assessment
-- Known CVEs affecting detected technologies
-- Admin panel exposure risks
-- Subdomain and email enumeration results
-- Open port analysis with specific risks
-
-## Risk Assessment
-Provide a thorough risk analysis including:
-- Overall risk rating (Critical/High/Medium/Low) with detailed justification
-- Attack surface analysis based on all findings
-- Potential threat vectors and exploitation paths
-- Business impact considerations
-
-## Vulnerabilities & Concerns
-List specific security weaknesses identified:
-- Each CVE with exploitation potential
-- Missing security headers and their impact
-- Cookie security issues (missing Secure/HttpOnly/SameSite flags)
-- CORS misconfigurations
-- Exposed admin panels and sensitive paths
-- Directory listing vulnerabilities
-- Severity rating for each issue
-
-## Recommended Actions
-Provide a comprehensive remediation roadmap:
-- Immediate actions (within 24-48 hours)
-- Short-term improvements (1-2 weeks)
-- Medium-term hardening (1-3 months)
-- Long-term security strategy
-
-Be thorough and detailed. This report will be presented to executive leadership. Use professional language and provide actionable insights."""
-
-            # Call GROQ API
-            request_data = json.dumps({
-                "model": "llama-3.1-8b-instant",
-                "messages": [
-                    {"role": "system", "content": "You are a senior cybersecurity consultant with 15+ years of experience in penetration testing, threat intelligence, and security architecture. You provide detailed, professional reports suitable for executive briefings."},
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": 2500,
-                "temperature": 0.4
-            }).encode('utf-8')
+            key, make_prompt = plan_analysis(scan_results)
             
-            req = Request(
-                "https://api.groq.com/openai/v1/chat/completions",
-                data=request_data,
-                headers={
-                    "Authorization": f"Bearer {groq_key}",
-                    "Content-Type": "application/json"
-                },
-                method="POST"
+            # Identical inputs share one cached report and one in-flight GROQ call
+            analysis, cached = ANALYSIS_CACHE.get_or_compute(
+                key, lambda: complete_analysis(make_prompt, groq_key)
             )
-            
-            with urlopen(req, timeout=30) as response:
-                result = json.loads(response.read().decode('utf-8'))
-                return {
-                    "report": result['choices'][0]['message']['content'],
-                    "model": "groq-llama-3.1-8b",
-                    "generated_at": datetime.now(timezone.utc).isoformat()
-                }
+            return dict(analysis, cached=cached)
                 
         except Exception as e:
+            METRICS.inc('aegis_fallbacks_total', reason='error')
             return self.generate_fallback_analysis(scan_results)
     
+    def _start_hedged_analysis(self, scan_results):
+        """Kick off the GROQ report in the background; returns (report_id, wait)
+        
+        wait(timeout) returns (analysis, cached) or raises FutureTimeout.
+        The key is claimed in the request thread, so GET ?report_id= sees
+        it as pending even while the job is still queued. (None, None) means
+        no GROQ report is coming: no key, unplannable input, or a full backlog.
+        """
+        groq_key = os.environ.get('GROQ_API_KEY')
+        if not groq_key:
+            return None, None
+        
+        try:
+            key, make_prompt = plan_analysis(scan_results)
+        except Exception:
+            return None, None
+        
+        value, flight, leader = ANALYSIS_CACHE.claim(key)
+        if value is not None:
+            return key, lambda timeout=None: (value, True)
+        
+        if leader:
+            if not ANALYSIS_BACKLOG.acquire(blocking=False):
+                ANALYSIS_CACHE.abandon(key, flight, RuntimeError('Analysis backlog full'))
+                return None, None
+            
+            def run():
+                try:
+                    ANALYSIS_CACHE.complete(key, flight, lambda: complete_analysis(make_prompt, groq_key))
+                finally:
+                    ANALYSIS_BACKLOG.release()
+            
+            try:
+                ANALYSIS_EXECUTOR.submit(run)
+            except Exception as e:
+                ANALYSIS_BACKLOG.release()
+                ANALYSIS_CACHE.abandon(key, flight, e)
+                return None, None
+        
+        return key, lambda timeout=None: (flight.result(timeout), not leader)
+    
+    def generate_hedged_analysis(self, scan_results, deadline):
+        """Return the GROQ report if it lands within `deadline` seconds, else the rule-based one
+        
+        A late GROQ report keeps running and can be fetched with
+        GET /api/analyze?report_id=<report_id>.
+        """
+        started = time.monotonic()
+        report_id, wait = self._start_hedged_analysis(scan_results)
+        fallback = self.generate_fallback_analysis(scan_results)
+        
+        if wait is None:
+            return fallback
+        
+        try:
+            analysis, cached = wait(max(0, deadline - (time.monotonic() - started)))
+            return dict(analysis, cached=cached, report_id=report_id)
+        except FutureTimeout:
+            METRICS.inc('aegis_fallbacks_total', reason='deadline')
+            return dict(fallback, report_id=report_id, pending=True)
+        except Exception:
+            return fallback
+    
+    def generate_hedged_stream(self, scan_results, deadline):
+        """Hedged mode over SSE: the first report by the deadline, then an 'upgrade' event"""
+        started = time.monotonic()
+        report_id, wait = self._start_hedged_analysis(scan_results)
+        fallback = self.generate_fallback_analysis(scan_results)
+        
+        if wait is not None:
+            try:
+                analysis, cached = wait(max(0, deadline - (time.monotonic() - started)))
+                yield 'token', {'content': analysis['report']}
+                yield 'done', dict(_analysis_metadata(analysis), cached=cached, report_id=report_id)
+                return
+            except FutureTimeout:
+                pass
+            except Exception:
+                wait = None
+        
+        yield 'token', {'content': fallback['report']}
+        yield 'done', dict(
+            _analysis_metadata(fallback), cached=False, report_id=report_id, pending=wait is not None
+        )
+        
+        if wait is not None:
+            try:
+                analysis, cached = wait()
+                yield 'upgrade', dict(analysis, cached=cached, report_id=report_id)
+            except Exception as e:
+                yield 'error', {'error': str(e), 'report_id': report_id}
+    
+    def generate_analysis_stream(self, scan_results):
+        """Stream the GROQ report as 'token' events followed by a final 'done' event
+        
+        A report another request is already writing is waited for and sent
+        whole instead of starting a second GROQ call.
+        """
+        groq_key = os.environ.get('GROQ_API_KEY')
+        
+        if groq_key:
+            parts = []
+            owned = None  # The flight this request leads, until it completes
+            try:
+                key, make_prompt = plan_analysis(scan_results)
+                cached, flight, leader = ANALYSIS_CACHE.claim(key)
+                if leader:
+                    owned = flight
+                elif cached is None:
+                    cached = flight.result()
+                
+                if cached is not None:
+                    yield 'token', {'content': cached['report']}
+                    yield 'done', dict(_analysis_metadata(cached), cached=True)
+                    return
+                
+                prompt, meta = make_prompt(groq_key)
+                for content in stream_groq_analysis(prompt, groq_key):
+                    parts.append(content)
+                    yield 'token', {'content': content}
+                
+                if parts:
+                    analysis = dict(
+                        meta,
+                        report=''.join(parts),
+                        model="groq-llama-3.1-8b",
+                        generated_at=datetime.now(timezone.utc).isoformat()
+                    )
+                    owned = None
+                    ANALYSIS_CACHE.complete(key, flight, lambda: analysis)
+                    yield 'done', dict(_analysis_metadata(analysis), cached=False)
+                    return
+            except Exception as e:
+                if parts:
+                    # Tokens already reached the client - report the failure instead of switching reports
+                    yield 'error', {'error': str(e)}
+                    return
+            finally:
+                if owned is not None:
+                    # Failed, empty or abandoned by the client: waiters fall back on their own
+                    ANALYSIS_CACHE.abandon(key, owned, RuntimeError('Streamed analysis did not complete'))
+        
+        analysis = self.generate_fallback_analysis(scan_results)
+        yield 'token', {'content': analysis['report']}
+        yield 'done', dict(_analysis_metadata(analysis), cached=False)
+    
     def generate_fallback_analysis(self, scan_results):
         """Generate comprehensive rule-based analysis when GROQ is unavailable"""
         phases = scan_results.get('phases', {})
@@ -484,3 +600,769 @@ This comprehensive threat intelligence assessment of **{target}** has identified
             "model": "aegis-fallback-v2",
             "generated_at": datetime.now(timezone.utc).isoformat()
         }
+
+# ==================================================================
+# METRICS
+# ==================================================================
+#
+# Counters and latency histograms kept in process memory and served in
+# the Prometheus text format (GET ?metrics). Values belong to one warm
+# instance and reset on a cold start; the instance label on aegis_info
+# tells scrapes of different instances apart.
+
+# Outbound hosts reported under their own dependency label; anything
+# else is reported as 'other'
+DEPENDENCY_HOSTS = {
+    'crt.sh': 'crt.sh',
+    'dns.google': 'dns.google',
+    'rdap.org': 'rdap.org',
+    'ipinfo.io': 'ipinfo',
+    'api.groq.com': 'groq',
+}
+
+
+def open_url(request, timeout, dependency=None):
+    """urlopen with per-dependency latency and failure metrics"""
+    if dependency is None:
+        dependency = DEPENDENCY_HOSTS.get(urlparse(request.full_url).hostname or '', 'other')
+    with METRICS.outbound(dependency):
+        return urlopen(request, timeout=timeout)
+
+
+METRICS = MetricsRegistry('analyze')
+METRICS.describe('aegis_phase_seconds', 'histogram', 'Wall time of each analysis phase')
+METRICS.describe('aegis_outbound_request_seconds', 'histogram', 'Time to response of outbound HTTP calls by dependency')
+METRICS.describe('aegis_outbound_errors_total', 'counter', 'Failed outbound calls by dependency and kind (timeout, http, error)')
+METRICS.describe('aegis_fallbacks_total', 'counter', 'Rule-based reports served instead of GROQ, by reason')
+METRICS.describe('aegis_errors_total', 'counter', 'Failures swallowed by the handler, by stage')
+
+
+# ==================================================================
+# ANALYSIS INPUTS & PROMPT
+# ==================================================================
+
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', 3000))
+
+SEVERITY_RANK = {'critical': 0, 'high': 1, 'medium': 2, 'low': 3}
+
+# Email-security and delegation records say the most about posture
+DNS_TYPE_RANK = {'TXT': 0, 'MX': 1, 'NS': 2, 'CNAME': 3, 'SOA': 4, 'A': 5, 'AAAA': 6}
+
+# Which lists give way first when the prompt is over budget, and how
+# many items each keeps no matter what
+PROMPT_TRIM_ORDER = [
+    ('dns_records', 3),
+    ('technologies', 5),
+    ('cookies', 3),
+    ('protected_panels', 3),
+    ('sensitive_paths', 3),
+    ('exposed_dirs', 3),
+    ('score_factors', 6),
+    ('missing_headers', 3),
+    ('accessible_panels', 3),
+    ('cves', 5),
+]
+
+
+REPORT_INSTRUCTIONS = """Generate a DETAILED professional threat assessment report with the following sections:
+
+## Executive Summary
+Provide a comprehensive 4-5 sentence overview of the target's security posture, key concerns, and overall risk profile. Reference the security score and major findings.
+
+## Key Findings
+Provide detailed bullet points for each discovery:
+- Security Headers analysis and implications for XSS/clickjacking protection
+- SSL/TLS configuration assessment
+- DNS configuration including SPF/DMARC email security
+- WHOIS intelligence and domain registration details
+- Cookie security analysis
+- HTTP methods and CORS policy assessment
+- Known CVEs affecting detected technologies
+- Admin panel exposure risks
+- Subdomain and email enumeration results
+- Open port analysis with specific risks
+
+## Risk Assessment
+Provide a thorough risk analysis including:
+- Overall risk rating (Critical/High/Medium/Low) with detailed justification
+- Attack surface analysis based on all findings
+- Potential threat vectors and exploitation paths
+- Business impact considerations
+
+## Vulnerabilities & Concerns
+List specific security weaknesses identified:
+- Each CVE with exploitation potential
+- Missing security headers and their impact
+- Cookie security issues (missing Secure/HttpOnly/SameSite flags)
+- CORS misconfigurations
+- Exposed admin panels and sensitive paths
+- Directory listing vulnerabilities
+- Severity rating for each issue
+
+## Recommended Actions
+Provide a comprehensive remediation roadmap:
+- Immediate actions (within 24-48 hours)
+- Short-term improvements (1-2 weeks)
+- Medium-term hardening (1-3 months)
+- Long-term security strategy
+
+Be thorough and detailed. This report will be presented to executive leadership. Use professional language and provide actionable insights."""
+
+
+def _dedupe(items):
+    """Drop repeated items, keeping first-seen order"""
+    return list(dict.fromkeys(items))
+
+
+def _severity_rank(severity):
+    return SEVERITY_RANK.get(str(severity).lower(), len(SEVERITY_RANK))
+
+
+def _score_factor_rank(factor):
+    """Biggest deductions first, then bonuses, then notes like score caps"""
+    match = re.match(r'^([+-])(\d+):', factor)
+    if not match:
+        return (2, 0)
+    points = int(match.group(2))
+    return (0, -points) if match.group(1) == '-' else (1, -points)
+
+
+def _summarize_cves(cves):
+    """One line per CVE, most severe first, listing every affected technology"""
+    grouped = OrderedDict()
+    for c in sorted(cves, key=lambda c: _severity_rank(c.get('severity'))):
+        key = (c['cve'], c['severity'])
+        if c['cve'] == 'Multiple':
+            key += (c.get('description', ''),)  # 'Multiple' is not an identifier
+        grouped.setdefault(key, [])
+        if c['technology'] not in grouped[key]:
+            grouped[key].append(c['technology'])
+    return [f"{key[0]} ({key[1]}) - {', '.join(techs)}" for key, techs in grouped.items()]
+
+
+def estimate_tokens(text):
+    """Approximate token count (~4 characters per token for Llama tokenizers)"""
+    return (len(text) + 3) // 4
+
+
+def _compact(items, limit):
+    """Keep the first `limit` items and summarize the rest"""
+    if len(items) <= limit:
+        return items
+    return items[:limit] + [f"... and {len(items) - limit} more"]
+
+def extract_analysis_inputs(scan_results):
+    """Extract and normalize the scan fields the analysis prompt is built from"""
+    phases = scan_results.get('phases', {})
+    
+    # Get open ports
+    all_ports = []
+    for host in phases.get('hosts', []):
+        all_ports.extend(host.get('ports', []))
+    
+    headers_info = scan_results.get('security_headers', {})
+    ssl_info = scan_results.get('ssl_info', {})
+    admin_panels = scan_results.get('admin_panels', {}).get('found', [])
+    dir_listing = scan_results.get('directory_listing', {})
+    whois_info = scan_results.get('whois_info', {})
+    http_methods = scan_results.get('http_methods', {})
+    cors_data = scan_results.get('cors_check', {})
+    
+    return {
+        'target': str(scan_results.get('target', 'Unknown')).strip().lower(),
+        'score': scan_results.get('security_score', 100),
+        'subdomain_count': len(phases.get('subdomains', [])),
+        'host_count': len(phases.get('hosts', [])),
+        'email_count': len(phases.get('osint', {}).get('emails', [])),
+        'technologies': _dedupe(t['name'] for t in phases.get('technologies', [])),
+        'open_ports': sorted(set(all_ports)),
+        'headers_grade': headers_info.get('grade', 'Unknown'),
+        'missing_headers': _dedupe(
+            h['name'] for h in sorted(headers_info.get('headers_missing', []), key=lambda h: _severity_rank(h.get('importance')))
+        ),
+        'ssl_valid': ssl_info.get('valid', False),
+        'ssl_issuer': ssl_info.get('issuer', 'Unknown'),
+        'ssl_tls': ssl_info.get('tls_version', 'Unknown'),
+        'ssl_days': ssl_info.get('days_until_expiry', 'Unknown'),
+        'dns_records': _dedupe(
+            f"{r['type']}: {r['value']}"
+            for r in sorted(scan_results.get('dns_records', []), key=lambda r: DNS_TYPE_RANK.get(r.get('type'), len(DNS_TYPE_RANK)))
+        ),
+        'whois': {
+            'registrar': whois_info.get('registrar', 'Unknown'),
+            'creation_date': whois_info.get('creation_date', 'Unknown'),
+            'expiry_date': whois_info.get('expiry_date', 'Unknown'),
+            'name_servers': whois_info.get('name_servers', 'Unknown'),
+            'dnssec': whois_info.get('dnssec', 'Unknown')
+        },
+        'cookies': _dedupe(
+            f"{c['name']} (Secure:{c.get('secure')}, HttpOnly:{c.get('httponly')}, SameSite:{c.get('samesite')})"
+            for c in sorted(
+                scan_results.get('cookie_security', {}).get('cookies', []),
+                key=lambda c: bool(c.get('secure')) + bool(c.get('httponly'))  # Insecure cookies first
+            )
+        ),
+        'http_methods': http_methods.get('methods', []),
+        'risky_methods': http_methods.get('risky_methods', []),
+        'cors_wildcard': cors_data.get('wildcard_origin', False),
+        'cors_reflects': cors_data.get('reflects_origin', False),
+        'cves': _summarize_cves(scan_results.get('known_cves', [])),
+        'accessible_panels': _dedupe(p['path'] for p in admin_panels if p.get('accessible')),
+        'protected_panels': _dedupe(p['path'] for p in admin_panels if not p.get('accessible')),
+        'sensitive_paths': _dedupe(p['path'] for p in scan_results.get('robots_txt', {}).get('sensitive_paths', [])),
+        'dir_listing_vulnerable': dir_listing.get('vulnerable', False),
+        'exposed_dirs': _dedupe(dir_listing.get('exposed_dirs', [])),
+        'score_factors': sorted(_dedupe(scan_results.get('score_factors', [])), key=_score_factor_rank)
+    }
+
+
+def build_analysis_prompt(inputs, token_budget=None):
+    """Render the GROQ report prompt within a token budget
+    
+    Lists are already ranked most-severe-first, so compaction keeps the
+    head of each list. Returns (prompt, estimated_tokens).
+    """
+    token_budget = token_budget or PROMPT_TOKEN_BUDGET
+    limits = {name: len(inputs[name]) for name, _ in PROMPT_TRIM_ORDER}
+    
+    prompt = _render_analysis_prompt(inputs, limits)
+    tokens = estimate_tokens(prompt)
+    
+    # Halve the lowest-priority list that can still shrink until the prompt fits
+    while tokens > token_budget:
+        for name, floor in PROMPT_TRIM_ORDER:
+            if limits[name] > floor:
+                limits[name] = max(floor, limits[name] // 2)
+                break
+        else:
+            break  # Everything is at its floor
+        prompt = _render_analysis_prompt(inputs, limits)
+        tokens = estimate_tokens(prompt)
+    
+    return prompt, tokens
+
+
+def _render_analysis_prompt(inputs, limits):
+    """Fill the report prompt template, compacting lists to the given limits"""
+    target = inputs['target']
+    whois_info = inputs['whois']
+    lists = {name: _compact(inputs[name], limit) for name, limit in limits.items()}
+    
+    return f"""You are a senior cybersecurity consultant preparing a comprehensive threat intelligence report for {target}.
+
+RECONNAISSANCE DATA:
+- Target Domain: {target}
+- Security Score: {inputs['score']}/100
+- Subdomains Discovered: {inputs['subdomain_count']}
+- Active Hosts Identified: {inputs['host_count']}
+- Open Ports Detected: {inputs['open_ports'] if inputs['open_ports'] else 'None detected'}
+- Email Addresses Exposed: {inputs['email_count']}
+- Technology Stack: {', '.join(lists['technologies']) if lists['technologies'] else 'None detected'}
+
+SECURITY HEADERS ANALYSIS:
+- Grade: {inputs['headers_grade']}
+- Missing Headers: {', '.join(lists['missing_headers']) if lists['missing_headers'] else 'None'}
+
+SSL/TLS CERTIFICATE:
+- Valid: {inputs['ssl_valid']}
+- Issuer: {inputs['ssl_issuer']}
+- TLS Version: {inputs['ssl_tls']}
+- Days Until Expiry: {inputs['ssl_days']}
+
+DNS RECORDS:
+{chr(10).join(lists['dns_records']) if lists['dns_records'] else 'No DNS records retrieved'}
+
+WHOIS INTELLIGENCE:
+- Registrar: {whois_info['registrar']}
+- Created: {whois_info['creation_date']}
+- Expires: {whois_info['expiry_date']}
+- Name Servers: {whois_info['name_servers']}
+- DNSSEC: {whois_info['dnssec']}
+
+COOKIE SECURITY:
+{chr(10).join(lists['cookies']) if lists['cookies'] else 'No cookies detected'}
+
+HTTP METHODS:
+- Allowed: {', '.join(inputs['http_methods'])}
+- Risky Methods: {', '.join(inputs['risky_methods']) if inputs['risky_methods'] else 'None'}
+
+CORS POLICY:
+- Wildcard Origin: {inputs['cors_wildcard']}
+- Reflects Arbitrary Origin: {inputs['cors_reflects']}
+
+KNOWN VULNERABILITIES (CVEs):
+{chr(10).join(lists['cves']) if lists['cves'] else 'No known CVEs detected'}
+
+ADMIN PANELS DETECTED:
+- Accessible (No Auth): {', '.join(lists['accessible_panels']) if lists['accessible_panels'] else 'None'}
+- Protected: {', '.join(lists['protected_panels']) if lists['protected_panels'] else 'None'}
+
+ROBOTS.TXT SENSITIVE PATHS:
+{', '.join(lists['sensitive_paths']) if lists['sensitive_paths'] else 'None found'}
+
+DIRECTORY LISTING:
+- Vulnerable: {inputs['dir_listing_vulnerable']}
+- Exposed Directories: {', '.join(lists['exposed_dirs']) if lists['exposed_dirs'] else 'None'}
+
+SCORE BREAKDOWN:
+{chr(10).join(lists['score_factors']) if lists['score_factors'] else 'No detailed breakdown available'}
+
+{REPORT_INSTRUCTIONS}"""
+
+
+# ==================================================================
+# GROQ CLIENT
+# ==================================================================
+
+GROQ_API_URL = os.environ.get('GROQ_API_URL', 'https://api.groq.com/openai/v1/chat/completions')
+GROQ_MODEL = 'llama-3.1-8b-instant'
+SYSTEM_PROMPT = "You are a senior cybersecurity consultant with 15+ years of experience in penetration testing, threat intelligence, and security architecture. You provide detailed, professional reports suitable for executive briefings."
+
+
+def _groq_request(prompt, groq_key, stream=False, max_tokens=2500):
+    """Build the chat-completions request for a report prompt"""
+    payload = {
+        "model": GROQ_MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": max_tokens,
+        "temperature": 0.4
+    }
+    if stream:
+        payload["stream"] = True
+    
+    return Request(
+        GROQ_API_URL,
+        data=json.dumps(payload).encode('utf-8'),
+        headers={
+            "Authorization": f"Bearer {groq_key}",
+            "Content-Type": "application/json"
+        },
+        method="POST"
+    )
+
+
+def request_groq_analysis(prompt, groq_key, max_tokens=2500):
+    """Send the report prompt to GROQ and return the analysis dict"""
+    with open_url(_groq_request(prompt, groq_key, max_tokens=max_tokens), timeout=30) as response:
+        result = json.loads(response.read().decode('utf-8'))
+        return {
+            "report": result['choices'][0]['message']['content'],
+            "model": "groq-llama-3.1-8b",
+            "generated_at": datetime.now(timezone.utc).isoformat()
+        }
+
+
+def stream_groq_analysis(prompt, groq_key):
+    """Yield report text deltas from a streaming GROQ completion"""
+    with open_url(_groq_request(prompt, groq_key, stream=True), timeout=30) as response:
+        for raw in response:
+            line = raw.decode('utf-8').strip()
+            if not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                return
+            chunk = json.loads(data)
+            choices = chunk.get('choices') or [{}]
+            content = choices[0].get('delta', {}).get('content')
+            if content:
+                yield content
+
+
+# ==================================================================
+# ANALYSIS PLANNING & MAP-REDUCE
+# ==================================================================
+
+# Scans whose raw findings exceed this many tokens are summarized per
+# category first (map) and then synthesized into one report (reduce)
+MAP_REDUCE_MIN_TOKENS = int(os.environ.get('MAP_REDUCE_MIN_TOKENS', 4000))
+MAP_CHUNK_TOKENS = int(os.environ.get('MAP_CHUNK_TOKENS', 1500))
+MAP_REDUCE_WORKERS = int(os.environ.get('MAP_REDUCE_WORKERS', 8))
+MAP_SUMMARY_TOKENS = 400
+
+MAP_PROMPT = """You are reviewing one slice of a reconnaissance scan of {target}.
+Category: {category} (part {part} of {parts})
+
+FINDINGS:
+{findings}
+
+Summarize the security-relevant findings in at most 8 concise bullet points, most severe first. Name specific hosts, ports, records or versions where they matter, and describe patterns across many similar items instead of listing them all."""
+
+
+@METRICS.timed('aegis_phase_seconds', phase='plan')
+def plan_analysis(scan_results):
+    """Pick single-prompt or map-reduce analysis for a scan
+    
+    Returns (cache_key, make_prompt) where make_prompt(groq_key) returns
+    (prompt, metadata). Building the map-reduce prompt makes GROQ calls,
+    so it is deferred until the cache misses.
+    """
+    inputs = extract_analysis_inputs(scan_results)
+    findings = collect_findings(scan_results, inputs)
+    total_tokens = sum(estimate_tokens(line) + 1 for lines in findings.values() for line in lines)
+    
+    if total_tokens <= MAP_REDUCE_MIN_TOKENS:
+        def make_prompt(groq_key):
+            prompt, prompt_tokens = build_analysis_prompt(inputs)
+            return prompt, {'prompt_tokens': prompt_tokens}
+        return analysis_cache_key(inputs), make_prompt
+    
+    # Grow slices until one wave of workers covers them all, so latency is
+    # about one map call plus the reduce call and the reduce input stays bounded
+    chunk_tokens = MAP_CHUNK_TOKENS
+    chunks = chunk_findings(findings, chunk_tokens)
+    while len(chunks) > max(MAP_REDUCE_WORKERS, len(findings)):
+        chunk_tokens = chunk_tokens * 3 // 2
+        chunks = chunk_findings(findings, chunk_tokens)
+    
+    def make_prompt(groq_key):
+        summaries = run_map_phase(inputs['target'], chunks, groq_key)
+        prompt = build_reduce_prompt(inputs, chunks, summaries)
+        return prompt, {
+            'prompt_tokens': estimate_tokens(prompt),
+            'strategy': 'map_reduce',
+            'map_chunks': len(chunks)
+        }
+    return analysis_cache_key({'inputs': inputs, 'chunks': chunks}), make_prompt
+
+
+@METRICS.timed('aegis_phase_seconds', phase='complete')
+def complete_analysis(make_prompt, groq_key):
+    """Build the planned prompt and fetch the GROQ report"""
+    prompt, metadata = make_prompt(groq_key)
+    return dict(request_groq_analysis(prompt, groq_key), **metadata)
+
+
+def _analysis_metadata(analysis):
+    """Everything about an analysis except the report text"""
+    return {k: v for k, v in analysis.items() if k != 'report'}
+
+
+def collect_findings(scan_results, inputs):
+    """Every finding in the scan as one line of text, grouped by category"""
+    phases = scan_results.get('phases', {})
+    hosts = phases.get('hosts', [])
+    
+    # TLS
+    tls = []
+    ssl_info = scan_results.get('ssl_info', {})
+    if ssl_info.get('valid'):
+        tls.append(
+            f"Certificate for {ssl_info.get('subject', inputs['target'])} issued by {ssl_info.get('issuer', 'Unknown')}, "
+            f"{ssl_info.get('tls_version', 'Unknown')}, expires {ssl_info.get('not_after', 'Unknown')} "
+            f"({ssl_info.get('days_until_expiry', 'Unknown')} days), expired: {ssl_info.get('is_expired', False)}"
+        )
+    else:
+        tls.append(f"Certificate could not be verified: {ssl_info.get('error', 'no TLS service')}")
+    if 'Strict-Transport-Security' in inputs['missing_headers']:
+        tls.append("HSTS header missing")
+    for host in hosts:
+        ports = host.get('ports', [])
+        if 80 in ports and 443 not in ports:
+            tls.append(f"{host.get('hostname')} serves HTTP (80) without HTTPS (443)")
+    
+    # DNS
+    dns = [f"DNS {r}" for r in inputs['dns_records']]
+    dns += [f"WHOIS {k.replace('_', ' ')}: {v}" for k, v in inputs['whois'].items()]
+    subdomains = sorted(set(phases.get('subdomains', [])))
+    for i in range(0, len(subdomains), 20):
+        dns.append(f"Subdomains: {', '.join(subdomains[i:i + 20])}")
+    
+    # Web exposure
+    web = [f"Security headers grade {inputs['headers_grade']}"]
+    web += [f"Known vulnerability: {c}" for c in inputs['cves']]
+    web += [f"Admin path accessible without auth: {p}" for p in inputs['accessible_panels']]
+    web += [f"Admin path protected: {p}" for p in inputs['protected_panels']]
+    web += [f"Missing header: {h}" for h in inputs['missing_headers']]
+    web += [f"Cookie {c}" for c in inputs['cookies']]
+    if inputs['cors_wildcard'] or inputs['cors_reflects']:
+        web.append(f"CORS wildcard origin: {inputs['cors_wildcard']}, reflects arbitrary origin: {inputs['cors_reflects']}")
+    if inputs['risky_methods']:
+        web.append(f"Risky HTTP methods allowed: {', '.join(inputs['risky_methods'])}")
+    web += [f"Directory listing enabled: {d}" for d in inputs['exposed_dirs']]
+    web += [f"robots.txt sensitive path: {p}" for p in inputs['sensitive_paths']]
+    web += [f"Technology: {t}" for t in inputs['technologies']]
+    web += [f"Exposed email: {e}" for e in phases.get('osint', {}).get('emails', [])]
+    
+    # Ports
+    ports = []
+    for host in hosts:
+        line = f"{host.get('hostname')} ({host.get('ip')}): {host.get('status', 'unknown')}, open ports {host.get('ports', [])}"
+        if host.get('geo', {}).get('org'):
+            line += f", {host['geo']['org']}"
+        ports.append(line)
+    
+    return OrderedDict([('TLS', tls), ('DNS', dns), ('Web exposure', web), ('Ports', ports)])
+
+
+def chunk_findings(findings, token_budget):
+    """Split each category's lines into slices of at most token_budget tokens"""
+    chunks = []
+    for category, lines in findings.items():
+        slices, current, size = [], [], 0
+        for line in lines:
+            cost = estimate_tokens(line) + 1
+            if current and size + cost > token_budget:
+                slices.append(current)
+                current, size = [], 0
+            current.append(line)
+            size += cost
+        if current:
+            slices.append(current)
+        
+        for part, lines_slice in enumerate(slices, 1):
+            chunks.append({'category': category, 'part': part, 'parts': len(slices), 'lines': lines_slice})
+    return chunks
+
+
+def summarize_chunk(target, chunk, groq_key):
+    """Map step: GROQ summary of one slice, cached by content"""
+    prompt = MAP_PROMPT.format(
+        target=target,
+        category=chunk['category'],
+        part=chunk['part'],
+        parts=chunk['parts'],
+        findings='\n'.join(chunk['lines'])
+    )
+    summary, _ = MAP_SUMMARY_CACHE.get_or_compute(
+        analysis_cache_key({'target': target, 'chunk': chunk}),
+        lambda: request_groq_analysis(prompt, groq_key, max_tokens=MAP_SUMMARY_TOKENS)
+    )
+    return summary['report']
+
+
+@METRICS.timed('aegis_phase_seconds', phase='map')
+def run_map_phase(target, chunks, groq_key):
+    """Summarize all slices concurrently with bounded parallelism
+    
+    A slice whose summary fails falls back to its first raw lines; if
+    every slice fails GROQ is treated as unavailable.
+    """
+    def summarize(chunk):
+        try:
+            return summarize_chunk(target, chunk, groq_key), True
+        except Exception:
+            return '\n'.join(f"- {line}" for line in _compact(chunk['lines'], 8)), False
+    
+    with ThreadPoolExecutor(max_workers=MAP_REDUCE_WORKERS) as pool:
+        results = list(pool.map(summarize, chunks))
+    
+    if not any(ok for _, ok in results):
+        raise RuntimeError('GROQ failed for every map chunk')
+    return [summary for summary, _ in results]
+
+
+def build_reduce_prompt(inputs, chunks, summaries):
+    """Reduce step: headline numbers plus per-slice summaries, with the report instructions"""
+    sections = []
+    for chunk, summary in zip(chunks, summaries):
+        heading = chunk['category'] if chunk['parts'] == 1 else f"{chunk['category']} (part {chunk['part']} of {chunk['parts']})"
+        sections.append(f"### {heading}\n{summary.strip()}")
+    
+    technologies = _compact(inputs['technologies'], 10)
+    score_factors = _compact(inputs['score_factors'], 10)
+    
+    return f"""You are a senior cybersecurity consultant preparing a comprehensive threat intelligence report for {inputs['target']}.
+
+RECONNAISSANCE DATA:
+- Target Domain: {inputs['target']}
+- Security Score: {inputs['score']}/100
+- Subdomains Discovered: {inputs['subdomain_count']}
+- Active Hosts Identified: {inputs['host_count']}
+- Open Ports Detected: {inputs['open_ports'] if inputs['open_ports'] else 'None detected'}
+- Email Addresses Exposed: {inputs['email_count']}
+- Technology Stack: {', '.join(technologies) if technologies else 'None detected'}
+- Security Headers Grade: {inputs['headers_grade']}
+
+SCORE BREAKDOWN:
+{chr(10).join(score_factors) if score_factors else 'No detailed breakdown available'}
+
+FINDINGS BY CATEGORY (summarized from the full scan):
+{chr(10).join(sections)}
+
+{REPORT_INSTRUCTIONS}"""
+
+
+# ==================================================================
+# ANALYSIS CACHE
+# ==================================================================
+
+def analysis_cache_key(inputs):
+    """Content address of the normalized analysis inputs"""
+    canonical = json.dumps(inputs, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class _Flight:
+    """A single in-progress computation that concurrent callers wait on"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+    
+    def result(self, timeout=None):
+        """Wait for the value; raises FutureTimeout or the computation's error"""
+        if not self.done.wait(timeout):
+            raise FutureTimeout()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class AnalysisCache:
+    """TTL/LRU cache with single-flight coalescing of identical requests
+    
+    Lives at module level so entries survive across warm invocations.
+    Only successful computations are stored; errors are handed to every
+    waiting caller and the next request retries.
+    """
+    
+    def __init__(self, ttl=3600, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = self.coalesced = self.misses = 0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def get(self, key, record=False):
+        """Return a fresh cached value or None; record counts the lookup as a hit or miss"""
+        with self._lock:
+            value = self._get_locked(key)
+            if record:
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return value
+    
+    def _get_locked(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+    
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entries"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def claim(self, key):
+        """Return (value, flight, leader) for key
+        
+        value is the cached entry, if any. Otherwise flight is the
+        computation to wait on, and leader says the caller registered it
+        and must run it with complete(). Claiming in the request thread
+        makes the key visible to is_pending() before any work is queued.
+        """
+        with self._lock:
+            value = self._get_locked(key)
+            if value is not None:
+                self.hits += 1
+                return value, None, False
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return None, flight, False
+            self.misses += 1
+            flight = self._inflight[key] = _Flight()
+            return None, flight, True
+    
+    def complete(self, key, flight, compute):
+        """Run a claimed computation, cache its value and release the waiters"""
+        try:
+            flight.value = compute()
+            self.put(key, flight.value)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+    
+    def abandon(self, key, flight, error):
+        """Give up a claimed computation without running it"""
+        flight.error = error
+        with self._lock:
+            self._inflight.pop(key, None)
+        flight.done.set()
+    
+    def get_or_compute(self, key, compute):
+        """Return (value, cached) - concurrent misses on one key share one compute() call"""
+        value, flight, leader = self.claim(key)
+        if value is not None:
+            return value, True
+        if not leader:
+            return flight.result(), True
+        return self.complete(key, flight, compute), False
+    
+    def is_pending(self, key):
+        """True while a computation for key is in flight"""
+        with self._lock:
+            return key in self._inflight
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+ANALYSIS_CACHE = AnalysisCache(
+    ttl=int(os.environ.get('ANALYSIS_CACHE_TTL', 3600)),
+    max_entries=int(os.environ.get('ANALYSIS_CACHE_SIZE', 256))
+)
+
+# Map-step summaries are kept apart so they never evict reports, and
+# GET ?report_id= can only ever return a full report
+MAP_SUMMARY_CACHE = AnalysisCache(
+    ttl=int(os.environ.get('ANALYSIS_CACHE_TTL', 3600)),
+    max_entries=int(os.environ.get('MAP_SUMMARY_CACHE_SIZE', 512))
+)
+
+
+def _cache_metrics():
+    requests, ratios, sizes = [], [], []
+    for name, cache in (('report', ANALYSIS_CACHE), ('map_summary', MAP_SUMMARY_CACHE)):
+        counts = {'hit': cache.hits, 'coalesced': cache.coalesced, 'miss': cache.misses}
+        total = sum(counts.values())
+        requests.extend(({'cache': name, 'result': result}, n) for result, n in counts.items())
+        ratios.append(({'cache': name}, (counts['hit'] + counts['coalesced']) / total if total else 0.0))
+        sizes.append(({'cache': name}, len(cache)))
+    return [
+        ('aegis_cache_requests_total', 'counter', 'Cache lookups by result (coalesced: joined an in-flight computation)', requests),
+        ('aegis_cache_hit_ratio', 'gauge', 'Share of lookups served without a new GROQ call', ratios),
+        ('aegis_cache_entries', 'gauge', 'Entries currently cached', sizes),
+    ]
+
+
+METRICS.register(_cache_metrics)
+
+# Background workers for hedged analyses that outlive their request;
+# ANALYSIS_BACKLOG bounds how many may be running or queued at once
+ANALYSIS_EXECUTOR = ThreadPoolExecutor(max_workers=8)
+ANALYSIS_BACKLOG = threading.BoundedSemaphore(int(os.environ.get('ANALYSIS_BACKLOG', 32)))
+
+ANALYSIS_DEADLINE_MS = int(os.environ.get('ANALYSIS_DEADLINE_MS', 3000))
+
+
+# ==================================================================
+# SHARED SCAN STORE
+# ==================================================================
+
+SCAN_STORE = ScanStore(ttl=int(os.environ.get('SCAN_STORE_TTL', 86400)), opener=open_url)
@@ -20,76 +20,2558 @@ import json
 import os
 import socket
 import re
+import sys
+import asyncio
+import bisect
+import codecs
+import contextvars
+import errno
+import hmac
+import ipaddress
+import itertools
+import linecache
+import mmap
+import queue
+import random
+import selectors
+import sqlite3
+import string
+import struct
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from contextlib import contextmanager, nullcontext
 from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs
 from urllib.request import urlopen, Request
 from urllib.error import URLError, HTTPError
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))  # _shared.py sits beside this file
+
+from _shared import (
+    METRICS_TOKEN, MetricsRegistry, ScanStore, _dumps_json, compress_json, json_response,
+)
+
+# Optional accelerators - used when installed
+try:
+    import charset_normalizer
+except ImportError:
+    charset_normalizer = None
+
 
 class handler(BaseHTTPRequestHandler):
     """Vercel serverless handler for scanning"""
     
-    def do_OPTIONS(self):
-        """Handle CORS preflight"""
-        self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.end_headers()
+    def do_OPTIONS(self):
+        """Handle CORS preflight"""
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.end_headers()
+    
+    def do_POST(self):
+        """Handle scan requests"""
+        try:
+            # Read request body
+            content_length = int(self.headers.get('Content-Length', 0))
+            body = self.rfile.read(content_length).decode('utf-8')
+            data = json.loads(body) if body else {}
+            
+            # Clean domain - the same host typed differently is the same scan
+            domain = normalize_domain(data.get('domain', ''))
+            
+            if not domain:
+                self._send_json({'success': False, 'error': 'Domain is required'}, 400)
+                return
+            
+            # Profiling exposes internals and slows the scan, so it needs its own token
+            profile = bool(data.get('profile'))
+            if profile:
+                if not PROFILE_TOKEN:
+                    self._send_json({'success': False, 'error': 'Profiling is disabled'}, 403)
+                    return
+                supplied = self.headers.get('Authorization', '')
+                if not hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {PROFILE_TOKEN}".encode('utf-8')):
+                    self._send_json({'success': False, 'error': 'Unauthorized'}, 401)
+                    return
+            
+            bruteforce = data.get('bruteforce')
+            if bruteforce is None:
+                bruteforce = os.environ.get('DNS_BRUTEFORCE') == '1'
+            bruteforce = bool(bruteforce)
+            
+            # A profiled scan has to run on its own; any other scan joins an
+            # identical one that is running or just finished
+            if profile:
+                try:
+                    outcome, shared = self._run_scan(domain, bruteforce, profile=True), False
+                except ProfilerBusy as e:
+                    self._send_json({'success': False, 'error': str(e)}, 409)
+                    return
+            else:
+                outcome, shared = SCAN_FLIGHTS.run(
+                    scan_key(domain, bruteforce),
+                    lambda: self._run_scan(domain, bruteforce)
+                )
+            
+            response = {
+                'success': True,
+                **outcome,
+                'timestamp': datetime.now(timezone.utc).isoformat()
+            }
+            if shared:
+                response['shared'] = True
+            
+            self._send_json(response)
+            
+        except Exception as e:
+            METRICS.inc('aegis_errors_total', stage='request')
+            self._send_json({'success': False, 'error': str(e)}, 500)
+    
+    def do_GET(self):
+        """Handle GET requests (health check, scan history queries)"""
+        query = parse_qs(urlparse(self.path).query, keep_blank_values=True)
+        if 'history' in query:
+            self._send_history(query)
+            return
+        if 'metrics' in query:
+            self._send_metrics()
+            return
+        
+        self._send_json({
+            'status': 'ok',
+            'service': 'Aegis Recon Scanner',
+            'author': 'VexSpitta',
+            'github': 'https://github.com/Vexx-bit'
+        })
+    
+    def _send_json(self, data, status=200):
+        """Send JSON response, compressed when the client accepts it"""
+        encoding, body, length = json_response(data, self.headers.get('Accept-Encoding', ''))
+        
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        if length is not None:
+            self.send_header('Content-Length', str(length))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        for chunk in body:
+            self.wfile.write(chunk)
+    
+    def _send_metrics(self):
+        """Prometheus text exposition of this instance's METRICS"""
+        if METRICS_TOKEN:
+            supplied = self.headers.get('Authorization', '')
+            if not hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {METRICS_TOKEN}".encode('utf-8')):
+                self._send_json({'success': False, 'error': 'Unauthorized'}, 401)
+                return
+        
+        body = METRICS.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_history(self, query):
+        """Answer /api/scan?history=trend|search|lost_dnssec|new_subdomains|scan queries"""
+        token = os.environ.get('HISTORY_API_TOKEN')
+        if SCAN_HISTORY is None or not token:
+            self._send_json({'success': False, 'error': 'Scan history API is disabled'}, 404)
+            return
+        
+        # History spans every requester's scans, so it is never public
+        supplied = self.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {token}".encode('utf-8')):
+            self._send_json({'success': False, 'error': 'Unauthorized'}, 401)
+            return
+        
+        def arg(name, cast=str):
+            value = query.get(name, [None])[0]
+            return cast(value) if value not in (None, '') else None
+        
+        try:
+            view = arg('history')
+            days = arg('days', int)
+            since = int(time.time()) - days * 86400 if days is not None else None
+            limit = min(arg('limit', int) or 500, 5000)
+            started = time.perf_counter()
+            
+            if view == 'trend':
+                domain = arg('domain')
+                if not domain:
+                    self._send_json({'success': False, 'error': 'domain is required'}, 400)
+                    return
+                rows = SCAN_HISTORY.trend(domain, since=since, limit=limit)
+            elif view == 'search':
+                dnssec = arg('dnssec')
+                rows = SCAN_HISTORY.search(
+                    min_score=arg('min_score', int),
+                    max_score=arg('max_score', int),
+                    grade=arg('grade'),
+                    cve=arg('cve'),
+                    port=arg('port', int),
+                    dnssec=None if dnssec is None else dnssec.lower() in ('1', 'true', 'signed'),
+                    tls_expiring_days=arg('tls_expiring_days', int),
+                    latest_only=arg('all') is None,
+                    since=since,
+                    limit=limit
+                )
+            elif view == 'new_subdomains':
+                rows = SCAN_HISTORY.new_subdomains(since or int(time.time()) - 7 * 86400,
+                                                   domain=arg('domain'), limit=limit)
+            elif view == 'lost_dnssec':
+                rows = SCAN_HISTORY.lost_dnssec(since or int(time.time()) - 30 * 86400, limit=limit)
+            elif view == 'scan':
+                result = SCAN_HISTORY.get(arg('id', int))
+                if result is None:
+                    self._send_json({'success': False, 'error': 'Scan not found'}, 404)
+                    return
+                rows = [result]
+            else:
+                self._send_json({'success': False, 'error': f'Unknown history view: {view}'}, 400)
+                return
+            
+            self._send_json({
+                'success': True,
+                'view': view,
+                'results': rows,
+                'query_ms': round((time.perf_counter() - started) * 1000, 2)
+            })
+        except ValueError as e:
+            self._send_json({'success': False, 'error': str(e)}, 400)
+    
+    def _run_scan(self, domain, bruteforce, profile=False):
+        """Scan, store and record once; the returned fields are shared by coalesced requests"""
+        scanner = AegisScanner(domain, bruteforce=bruteforce)
+        outcome = {}
+        with METRICS.timer('aegis_scan_seconds'):
+            if profile:
+                results, outcome['profile'] = profile_scan(scanner)
+            else:
+                results = scanner.run()
+        METRICS.inc('aegis_scans_total')
+        outcome['results'] = results
+        
+        # Keep the results server-side so /api/analyze can take the id instead of
+        # the payload - only when /api/analyze can actually read them back
+        if SCAN_STORE.shared:
+            try:
+                scan_id = uuid.uuid4().hex
+                SCAN_STORE.put(f"scan:{scan_id}", results)
+                outcome['scan_id'] = scan_id
+                self._start_speculative_analysis(scan_id)
+            except Exception:
+                METRICS.inc('aegis_errors_total', stage='scan_store')
+        
+        if SCAN_HISTORY is not None:
+            try:
+                outcome['history_id'] = SCAN_HISTORY.record(results)
+            except Exception:
+                METRICS.inc('aegis_errors_total', stage='history')
+        
+        # The outcome may sit in the reuse window for a while
+        outcome['results'] = compact_result(results)
+        return outcome
+    
+    def _start_speculative_analysis(self, scan_id):
+        """Ask /api/analyze to start the report now so it is often ready before the user asks
+        
+        Adds at most half a second to the scan response.
+        """
+        if not os.environ.get('GROQ_API_KEY') or os.environ.get('SPECULATIVE_ANALYSIS', '1') == '0':
+            return
+        
+        url = os.environ.get('ANALYZE_URL')
+        if not url:
+            host = self.headers.get('Host', '')
+            if not host:
+                return
+            scheme = 'http' if host.startswith(('localhost', '127.0.0.1')) else 'https'
+            url = f"{scheme}://{host}/api/analyze"
+        
+        req = Request(
+            url,
+            data=json.dumps({'scan_id': scan_id, 'speculative': True}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        
+        # Sent before the scan replies: a serverless instance is frozen once its
+        # response is out, so a background thread could never send it. The
+        # short timeout caps the wait - only the request has to go out, the
+        # analysis then runs in its own invocation.
+        try:
+            urlopen(req, timeout=0.5).close()
+        except Exception:
+            pass
+
+
+class ScanHistory:
+    """Embedded SQLite history of scan results
+    
+    Each result is stored zlib-compressed next to indexed columns
+    (domain, time, score, header grade, TLS expiry, DNSSEC) plus CVE and
+    open-port side tables, so trend and cross-domain queries are answered
+    from indexes without decompressing results. `domains` points at each
+    domain's latest scan for "current state" filters.
+    
+    It also holds the certificate-transparency index: every subdomain seen
+    per domain with first/last-seen times, and how far the last crt.sh
+    sync got (`ct_sync`), so repeat scans only look at new certificates.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS scans (
+            id INTEGER PRIMARY KEY,
+            domain TEXT NOT NULL,
+            scanned_at INTEGER NOT NULL,
+            score INTEGER,
+            headers_grade TEXT,
+            tls_expires_at INTEGER,
+            dnssec INTEGER,
+            result BLOB NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS scans_domain_time ON scans (domain, scanned_at);
+        CREATE INDEX IF NOT EXISTS scans_time ON scans (scanned_at);
+        CREATE INDEX IF NOT EXISTS scans_score ON scans (score, domain);
+        CREATE INDEX IF NOT EXISTS scans_grade_score ON scans (headers_grade, score, domain);
+        CREATE INDEX IF NOT EXISTS scans_tls_expiry ON scans (tls_expires_at);
+        CREATE TABLE IF NOT EXISTS scan_cves (
+            cve TEXT NOT NULL,
+            scan_id INTEGER NOT NULL,
+            PRIMARY KEY (cve, scan_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS scan_ports (
+            port INTEGER NOT NULL,
+            scan_id INTEGER NOT NULL,
+            PRIMARY KEY (port, scan_id)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS domains (
+            domain TEXT PRIMARY KEY,
+            latest_scan_id INTEGER NOT NULL,
+            latest_at INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS domains_latest ON domains (latest_scan_id);
+        CREATE TABLE IF NOT EXISTS ct_sync (
+            domain TEXT PRIMARY KEY,
+            max_cert_id INTEGER NOT NULL,
+            first_synced_at INTEGER NOT NULL,
+            synced_at INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS subdomains (
+            domain TEXT NOT NULL,
+            name TEXT NOT NULL,
+            first_seen INTEGER NOT NULL,
+            last_seen INTEGER NOT NULL,
+            PRIMARY KEY (domain, name)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS subdomains_first_seen ON subdomains (first_seen);
+    """
+    
+    TREND_COLUMNS = 'id, scanned_at, score, headers_grade, tls_expires_at, dnssec'
+    
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+    
+    def _db(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+        return conn
+    
+    @staticmethod
+    def _epoch(iso_or_none):
+        try:
+            return int(datetime.fromisoformat(iso_or_none).timestamp())
+        except (TypeError, ValueError):
+            return int(time.time())
+    
+    @staticmethod
+    def _tls_expiry(ssl_info):
+        try:
+            expires = datetime.strptime(ssl_info.get('not_after', ''), '%b %d %H:%M:%S %Y %Z')
+            return int(expires.replace(tzinfo=timezone.utc).timestamp())
+        except (TypeError, ValueError):
+            return None
+    
+    def record(self, result):
+        """Store one AegisScanner result; returns its history id"""
+        return self.record_many([result])[0]
+    
+    def record_many(self, results):
+        """Store several results in one transaction; returns their history ids"""
+        conn = self._db()
+        with conn:
+            return [self._insert(conn, result) for result in results]
+    
+    def _insert(self, conn, result):
+        domain = str(result.get('target', '')).lower()
+        scanned_at = self._epoch(result.get('timestamp'))
+        dnssec = {'Signed': 1, 'Unsigned': 0}.get(result.get('whois_info', {}).get('dnssec'))
+        cves = {c.get('cve') for c in result.get('known_cves', []) if c.get('cve')}
+        ports = {p for host in result.get('phases', {}).get('hosts', []) for p in host.get('ports', [])}
+        
+        cur = conn.execute(
+            'INSERT INTO scans (domain, scanned_at, score, headers_grade, tls_expires_at, dnssec, result) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (domain, scanned_at, result.get('security_score'),
+             result.get('security_headers', {}).get('grade'),
+             self._tls_expiry(result.get('ssl_info', {})), dnssec,
+             compress_json(result))
+        )
+        scan_id = cur.lastrowid
+        conn.executemany('INSERT OR IGNORE INTO scan_cves (cve, scan_id) VALUES (?, ?)', [(c, scan_id) for c in cves])
+        conn.executemany('INSERT OR IGNORE INTO scan_ports (port, scan_id) VALUES (?, ?)', [(p, scan_id) for p in ports])
+        conn.execute(
+            'INSERT INTO domains (domain, latest_scan_id, latest_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(domain) DO UPDATE SET latest_scan_id = excluded.latest_scan_id, latest_at = excluded.latest_at '
+            'WHERE excluded.latest_at >= domains.latest_at',
+            (domain, scan_id, scanned_at)
+        )
+        return scan_id
+    
+    def get(self, scan_id):
+        """Full stored result for a history id"""
+        row = self._db().execute('SELECT result FROM scans WHERE id = ?', (scan_id,)).fetchone()
+        return json.loads(zlib.decompress(row['result'])) if row else None
+    
+    def trend(self, domain, since=None, until=None, limit=500):
+        """Indexed columns of a domain's scans over time, oldest first"""
+        rows = self._db().execute(
+            f'SELECT {self.TREND_COLUMNS} FROM scans WHERE domain = ? AND scanned_at BETWEEN ? AND ? '
+            'ORDER BY scanned_at LIMIT ?',
+            (domain.lower(), since or 0, until or 2 ** 62, limit)
+        ).fetchall()
+        return [dict(r) for r in rows]
+    
+    def _is_dense(self, sql, params, limit):
+        """True when a filter matches too many scans to sort them all
+        
+        Driving from a filter's own index costs one row per match, while
+        walking scans_score and probing the filter costs about
+        limit * total / matches rows, so the crossover is sqrt(limit * total).
+        The count stops at that threshold, so the probe stays cheap.
+        """
+        conn = self._db()
+        total = conn.execute('SELECT COALESCE(MAX(id), 0) FROM scans').fetchone()[0]
+        threshold = max(limit, int((limit * total) ** 0.5))
+        matches = conn.execute(f'SELECT COUNT(*) FROM ({sql} LIMIT ?)', (*params, threshold)).fetchone()[0]
+        return matches >= threshold
+    
+    def search(self, min_score=None, max_score=None, grade=None, cve=None, port=None,
+               dnssec=None, tls_expiring_days=None, latest_only=True, since=None, limit=500):
+        """Cross-domain filter over each domain's latest scan (or every scan)
+        
+        Results come in (score, domain) order. Score and grade filters read
+        that order straight from an index; CVE, port and TLS-expiry filters
+        either drive the query (rare matches) or are probed per row while
+        walking the score index (common matches), chosen by _is_dense().
+        """
+        where, params = [], []
+        scans = 'scans s'
+        if min_score is not None:
+            where.append('s.score >= ?')
+            params.append(min_score)
+        if max_score is not None:
+            where.append('s.score <= ?')
+            params.append(max_score)
+        if grade:
+            where.append('s.headers_grade = ?')
+            params.append(grade.upper())
+        if dnssec is not None:
+            where.append('s.dnssec = ?')
+            params.append(1 if dnssec else 0)
+        if tls_expiring_days is not None:
+            expires_before = int(time.time()) + int(tls_expiring_days) * 86400
+            where.append('s.tls_expires_at < ?')
+            params.append(expires_before)
+            if not self._is_dense('SELECT 1 FROM scans WHERE tls_expires_at < ?', (expires_before,), limit):
+                scans = 'scans s INDEXED BY scans_tls_expiry'
+        if since is not None:
+            where.append('s.scanned_at >= ?')
+            params.append(since)
+        join = 'JOIN'
+        for table, column, value in (
+            ('scan_cves', 'cve', (cve.upper() if cve.lower().startswith('cve-') else cve) if cve else None),
+            ('scan_ports', 'port', int(port) if port is not None else None),
+        ):
+            if value is None:
+                continue
+            if self._is_dense(f'SELECT 1 FROM {table} WHERE {column} = ?', (value,), limit):
+                where.append(f'EXISTS (SELECT 1 FROM {table} f WHERE f.{column} = ? AND f.scan_id = s.id)')
+                # Latest scans are a small slice of all scans: loop over domains, not the score index
+                join = 'CROSS JOIN'
+            else:
+                where.append(f's.id IN (SELECT scan_id FROM {table} WHERE {column} = ?)')
+            params.append(value)
+        
+        if latest_only:
+            source = f'domains d {join} {scans} ON s.id = d.latest_scan_id'
+        else:
+            source = scans
+        sql = f'SELECT s.domain, {", ".join("s." + c.strip() for c in self.TREND_COLUMNS.split(","))} FROM {source}'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY s.score, s.domain LIMIT ?'
+        params.append(limit)
+        return [dict(r) for r in self._db().execute(sql, params).fetchall()]
+    
+    def rescore(self, rules=None, domain=None, since=None, latest_only=True, update=False, batch_size=500):
+        """Re-run the scoring rules over stored results without any network I/O
+        
+        Returns [{'id', 'domain', 'scanned_at', 'score_before', 'score_after'}].
+        With update=True, scans whose score or factors changed get both the
+        indexed score column and the stored result's security_score and
+        score_factors rewritten, one transaction per batch.
+        """
+        where, params = [], []
+        source = 'domains d JOIN scans s ON s.id = d.latest_scan_id' if latest_only else 'scans s'
+        if domain:
+            where.append('s.domain = ?')
+            params.append(domain.lower())
+        if since is not None:
+            where.append('s.scanned_at >= ?')
+            params.append(since)
+        sql = f'SELECT s.id FROM {source}'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        
+        conn = self._db()
+        ids = [r['id'] for r in conn.execute(sql + ' ORDER BY s.id', params)]
+        changes = []
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            rows = conn.execute(
+                'SELECT id, domain, scanned_at, score, result FROM scans '
+                f'WHERE id IN ({", ".join("?" * len(batch))}) ORDER BY id', batch
+            ).fetchall()
+            # A batch of decoded results is held at once: keep its hosts, records and CVEs compact
+            results = [compact_result(json.loads(zlib.decompress(r['result']))) for r in rows]
+            updates = []
+            for row, result, (score, factors) in zip(rows, results, score_batch(results, rules)):
+                changes.append({
+                    'id': row['id'],
+                    'domain': row['domain'],
+                    'scanned_at': row['scanned_at'],
+                    'score_before': row['score'],
+                    'score_after': score
+                })
+                if update and (score != row['score'] or score != result.get('security_score')
+                               or factors != result.get('score_factors')):
+                    result['security_score'] = score
+                    result['score_factors'] = factors
+                    updates.append((score, compress_json(result), row['id']))
+            if updates:
+                with conn:
+                    conn.executemany('UPDATE scans SET score = ?, result = ? WHERE id = ?', updates)
+        return changes
+    
+    def lost_dnssec(self, since, limit=500):
+        """Domains whose latest scan is unsigned but were signed at some point since `since`"""
+        rows = self._db().execute(
+            'SELECT d.domain, s.scanned_at AS unsigned_at FROM domains d JOIN scans s ON s.id = d.latest_scan_id '
+            'WHERE s.dnssec = 0 AND EXISTS ('
+            '  SELECT 1 FROM scans p WHERE p.domain = d.domain AND p.scanned_at BETWEEN ? AND s.scanned_at AND p.dnssec = 1'
+            ') ORDER BY d.domain LIMIT ?',
+            (since, limit)
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    
+    def ct_state(self, domain):
+        """(max_cert_id, synced_at) of the domain's last complete CT sync, or None"""
+        row = self._db().execute(
+            'SELECT max_cert_id, synced_at FROM ct_sync WHERE domain = ?', (domain.lower(),)
+        ).fetchone()
+        return (row['max_cert_id'], row['synced_at']) if row else None
+    
+    def known_subdomains(self, domain):
+        """Every subdomain stored for a domain"""
+        rows = self._db().execute('SELECT name FROM subdomains WHERE domain = ? ORDER BY name', (domain.lower(),))
+        return [r['name'] for r in rows]
+    
+    def merge_subdomains(self, domain, names, seen_at=None, max_cert_id=None):
+        """Add names to a domain's subdomain set; returns the ones it did not hold
+        
+        Names already stored get last_seen moved up. With max_cert_id the
+        CT sync is recorded as complete up to that certificate id.
+        """
+        domain = domain.lower()
+        seen_at = int(seen_at or time.time())
+        conn = self._db()
+        with conn:
+            known = {r['name'] for r in conn.execute('SELECT name FROM subdomains WHERE domain = ?', (domain,))}
+            names = list(dict.fromkeys(names))
+            conn.executemany(
+                'INSERT INTO subdomains (domain, name, first_seen, last_seen) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(domain, name) DO UPDATE SET last_seen = max(last_seen, excluded.last_seen)',
+                [(domain, name, seen_at, seen_at) for name in names]
+            )
+            if max_cert_id is not None:
+                conn.execute(
+                    'INSERT INTO ct_sync (domain, max_cert_id, first_synced_at, synced_at) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT(domain) DO UPDATE SET max_cert_id = max(max_cert_id, excluded.max_cert_id), '
+                    'synced_at = excluded.synced_at',
+                    (domain, max_cert_id, seen_at, seen_at)
+                )
+        return [name for name in names if name not in known]
+    
+    def new_subdomains(self, since, domain=None, limit=500):
+        """Subdomains first seen since `since` by a sync after their domain's first one, newest first"""
+        sql = ('SELECT s.domain, s.name, s.first_seen, s.last_seen FROM subdomains s '
+               'JOIN ct_sync c ON c.domain = s.domain WHERE s.first_seen > c.first_synced_at AND s.first_seen >= ?')
+        params = [since]
+        if domain:
+            sql += ' AND s.domain = ?'
+            params.append(domain.lower())
+        rows = self._db().execute(sql + ' ORDER BY s.first_seen DESC LIMIT ?', params + [limit]).fetchall()
+        return [dict(r) for r in rows]
+
+SCAN_HISTORY = None if os.environ.get('SCAN_HISTORY', '1') == '0' else ScanHistory(
+    os.environ.get('SCAN_HISTORY_DB') or os.path.join(tempfile.gettempdir(), 'aegis-recon-history.db')
+)
+
+
+# ==================================================================
+# COMPACT RESULTS
+# ==================================================================
+#
+# A scan result is dicts of dicts, and hosts, technologies, DNS records,
+# cookies and CVEs repeat the same few keys thousands of times across a
+# batch. compact_result() swaps those entities for __slots__ records
+# (read-only mappings, so result['phases']['hosts'][0]['ip'] and .get()
+# keep working) and interns their repeated strings. An entity with a key
+# its record does not know stays a dict, so the JSON is always the same.
+# The scanner itself keeps building plain dicts; compact results are for
+# code that holds many of them at once.
+
+class Record(Mapping):
+    """Read-only mapping over __slots__; an unset slot is an absent key"""
+    
+    __slots__ = ()
+    INTERNED = frozenset()  # Fields whose string values repeat across results
+    NESTED = {}             # Fields holding lists of another record type
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.FIELDS = frozenset(cls.__slots__)
+    
+    @classmethod
+    def from_dict(cls, data):
+        """The record for data, or data itself if it has keys the record lacks"""
+        if not isinstance(data, dict) or not data.keys() <= cls.FIELDS:
+            return data
+        record = cls.__new__(cls)
+        for key, value in data.items():
+            if key in cls.INTERNED and type(value) is str:
+                value = sys.intern(value)
+            elif key in cls.NESTED and type(value) is list:
+                value = [cls.NESTED[key].from_dict(item) for item in value]
+            object.__setattr__(record, key, value)
+        return record
+    
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+    
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+    
+    def __iter__(self):
+        return (name for name in self.__slots__ if hasattr(self, name))
+    
+    def __len__(self):
+        return sum(1 for _ in self)
+    
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self}
+    
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+    
+    def __reduce__(self):
+        return type(self).from_dict, (self.to_dict(),)
+
+
+class ServiceRecord(Record):
+    __slots__ = ('protocol', 'product', 'version', 'banner', 'port')
+    INTERNED = frozenset(('protocol', 'product', 'version'))
+
+
+class HostRecord(Record):
+    __slots__ = ('hostname', 'ip', 'ports', 'status', 'rtt_ms', 'provider', 'edge',
+                 'families', 'ipv6_exposed', 'services', 'geo')
+    INTERNED = frozenset(('status', 'provider'))
+    NESTED = {'services': ServiceRecord}
+
+
+class TechRecord(Record):
+    __slots__ = ('name', 'category', 'source')
+    INTERNED = frozenset(('name', 'category', 'source'))
+
+
+class DNSRecord(Record):
+    __slots__ = ('type', 'name', 'value', 'ttl')
+    INTERNED = frozenset(('type',))
+
+
+class CookieRecord(Record):
+    __slots__ = ('name', 'secure', 'httponly', 'samesite', 'raw')
+    INTERNED = frozenset(('name', 'samesite'))
+
+
+class CVERecord(Record):
+    __slots__ = ('technology', 'cve', 'severity', 'description')
+    INTERNED = frozenset(('technology', 'cve', 'severity', 'description'))
+
+
+def _compact_list(container, key, record):
+    items = container.get(key)
+    if type(items) is list:
+        container[key] = [record.from_dict(item) for item in items]
+
+
+def compact_result(result):
+    """A copy of an AegisScanner result with its repeated entities as records"""
+    compact = dict(result)
+    if isinstance(compact.get('phases'), dict):
+        phases = compact['phases'] = dict(compact['phases'])
+        _compact_list(phases, 'hosts', HostRecord)
+        _compact_list(phases, 'technologies', TechRecord)
+    _compact_list(compact, 'dns_records', DNSRecord)
+    _compact_list(compact, 'known_cves', CVERecord)
+    if isinstance(compact.get('cookie_security'), dict):
+        cookie_security = compact['cookie_security'] = dict(compact['cookie_security'])
+        _compact_list(cookie_security, 'cookies', CookieRecord)
+    return compact
+
+
+# ==================================================================
+# METRICS
+# ==================================================================
+#
+# Counters and latency histograms kept in process memory and served in
+# the Prometheus text format (GET ?metrics). Values belong to one warm
+# instance and reset on a cold start; the instance label on aegis_info
+# tells scrapes of different instances apart.
+
+# Outbound hosts reported under their own dependency label; anything
+# else a scan fetches is the target
+DEPENDENCY_HOSTS = {
+    'crt.sh': 'crt.sh',
+    'dns.google': 'dns.google',
+    'rdap.org': 'rdap.org',
+    'ipinfo.io': 'ipinfo',
+    'api.groq.com': 'groq',
+    'cloudflare-dns.com': 'cloudflare-dns',
+}
+
+
+def open_url(request, timeout, dependency=None):
+    """urlopen with per-dependency latency and failure metrics"""
+    if dependency is None:
+        dependency = DEPENDENCY_HOSTS.get(urlparse(request.full_url).hostname or '', 'target')
+    with METRICS.outbound(dependency), trace_span('outbound', dependency, request.full_url):
+        return urlopen(request, timeout=timeout)
+
+
+METRICS = MetricsRegistry('scan')
+METRICS.describe('aegis_scan_seconds', 'histogram', 'Wall time of a whole scan')
+METRICS.describe('aegis_phase_seconds', 'histogram', 'Wall time of each scan phase')
+METRICS.describe('aegis_outbound_request_seconds', 'histogram', 'Time to response of outbound HTTP calls by dependency')
+METRICS.describe('aegis_outbound_errors_total', 'counter', 'Failed outbound calls by dependency and kind (timeout, http, error)')
+METRICS.describe('aegis_scans_total', 'counter', 'Completed scans')
+METRICS.describe('aegis_errors_total', 'counter', 'Failures swallowed by the handler, by stage')
+METRICS.describe('aegis_dns_queries_total', 'counter', 'Brute-force DNS queries sent (outcome=queries) and those that timed out, were truncated or failed')
+
+SCAN_STORE = ScanStore(ttl=int(os.environ.get('SCAN_STORE_TTL', 86400)), opener=open_url)
+
+
+# ==================================================================
+# PROFILING
+# ==================================================================
+#
+# POST /api/scan with "profile": true (authorized by PROFILE_TOKEN) runs
+# that one scan under a sampling profiler covering the threads it runs
+# on, and returns where the thread time went plus a span timeline of
+# phases and outbound calls in Chrome trace format (chrome://tracing,
+# Perfetto). The trace is a context variable that scan_thread() hands to
+# the threads a scan starts, so nothing is sampled or recorded for any
+# other scan running on the same instance.
+
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.005))  # Seconds between samples
+PROFILE_TOP = 20
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# A sample is charged to the module its innermost Python frame runs in;
+# for frames in the scanner's own code, to what the sampled line does
+PROFILE_MODULES = [
+    ('network', re.compile(r'[/\\](socket|ssl|selectors|http[/\\]client|urllib[/\\]\w+|asyncio[/\\]\w+)\.py$')),
+    ('json', re.compile(r'[/\\]json[/\\]\w+\.py$')),
+    ('regex', re.compile(r'[/\\](re[/\\]\w+|sre_\w+)\.py$')),
+    ('wait', re.compile(r'[/\\](threading|queue|concurrent[/\\]futures[/\\]\w+)\.py$')),
+]
+PROFILE_LINES = [
+    ('wait', re.compile(r'\btime\.sleep\(|\.(wait|acquire|result)\(|\.join\(\)')),
+    ('regex', re.compile(r'\bre\.\w+\(|\.(search|match|fullmatch|findall|finditer|sub)\(')),
+    ('json', re.compile(r'\bjson\.|orjson\.')),
+    ('string', re.compile(r'\.join\(|\.format\(|\bf["\']|\.(encode|decode|split|strip|lower)\(')),
+]
+
+
+class ScanTrace:
+    """Span timeline of one profiled scan"""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+        self.threads = set()  # Idents of the threads currently running the scan
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def span(self, kind, name, detail=None):
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            span = {
+                'kind': kind,
+                'name': name,
+                'start_ms': round((started - self.started) * 1000, 2),
+                'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+                'thread': threading.current_thread().name,
+            }
+            if detail:
+                span['detail'] = detail
+            if error:
+                span['error'] = error
+            with self._lock:
+                self.spans.append(span)
+    
+    def chrome_trace(self):
+        threads = {}
+        events = []
+        for span in sorted(self.spans, key=lambda s: s['start_ms']):
+            args = {k: span[k] for k in ('detail', 'error') if k in span}
+            events.append({
+                'name': span['name'], 'cat': span['kind'], 'ph': 'X', 'pid': 1,
+                'tid': threads.setdefault(span['thread'], len(threads) + 1),
+                'ts': round(span['start_ms'] * 1000), 'dur': round(span['duration_ms'] * 1000), 'args': args
+            })
+        events.extend(
+            {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': name}}
+            for name, tid in threads.items()
+        )
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+    
+    def outbound_summary(self):
+        summary = {}
+        for span in self.spans:
+            if span['kind'] != 'outbound':
+                continue
+            entry = summary.setdefault(span['name'], {'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            entry['calls'] += 1
+            entry['errors'] += 'error' in span
+            entry['total_ms'] = round(entry['total_ms'] + span['duration_ms'], 2)
+            entry['max_ms'] = max(entry['max_ms'], span['duration_ms'])
+        return summary
+
+
+TRACE = contextvars.ContextVar('aegis_trace', default=None)  # The ScanTrace of a profiled scan
+_NO_SPAN = nullcontext()
+
+
+def trace_span(kind, name, detail=None):
+    """A span on the profiled scan's timeline; a shared no-op otherwise"""
+    trace = TRACE.get()
+    return _NO_SPAN if trace is None else trace.span(kind, name, detail)
+
+
+def _run_traced(target):
+    trace = TRACE.get()
+    if trace is None:
+        return target()
+    ident = threading.get_ident()
+    trace.threads.add(ident)
+    try:
+        return target()
+    finally:
+        trace.threads.discard(ident)
+
+
+_SCAN_THREAD_IDS = itertools.count(1)
+
+
+def scan_thread(target, name=None):
+    """A daemon thread running target in the caller's context, profiled along with its scan"""
+    context = contextvars.copy_context()
+    name = name or f"scan-{next(_SCAN_THREAD_IDS)} ({target.__name__})"
+    return threading.Thread(target=context.run, args=(_run_traced, target), name=name, daemon=True)
+
+
+class SamplingProfiler:
+    """Samples the stacks of a set of threads (by default every thread) from a background thread
+    
+    Counts are thread time: a wait in eight pipeline workers at once is
+    charged eight times, once per thread doing it.
+    """
+    
+    def __init__(self, interval=None, threads=None):
+        self.interval = interval or PROFILE_INTERVAL
+        self.threads = threads
+        self.samples = 0
+        self.categories = {}
+        self.own = {}
+        self.inclusive = {}
+        self._lines = {}
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='aegis-profiler', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+    
+    def _run(self):
+        me = threading.get_ident()
+        threads = self.threads
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident != me and (threads is None or ident in threads):
+                    self._sample(frame)
+    
+    def _category(self, frame):
+        code = frame.f_code
+        for category, pattern in PROFILE_MODULES:
+            if pattern.search(code.co_filename):
+                return category
+        key = (code.co_filename, frame.f_lineno)
+        category = self._lines.get(key)
+        if category is None:
+            line = linecache.getline(*key)
+            category = next((c for c, pattern in PROFILE_LINES if pattern.search(line)), 'python')
+            self._lines[key] = category
+        return category
+    
+    def _sample(self, frame):
+        self.samples += 1
+        category = self._category(frame)
+        self.categories[category] = self.categories.get(category, 0) + 1
+        leaf = frame.f_code
+        self.own[leaf] = self.own.get(leaf, 0) + 1
+        seen = set()
+        while frame is not None:
+            code = frame.f_code
+            if code not in seen:
+                seen.add(code)
+                self.inclusive[code] = self.inclusive.get(code, 0) + 1
+            frame = frame.f_back
+    
+    def summary(self):
+        ms = self.interval * 1000
+        
+        def top(counts, own_code=False):
+            ranked = sorted(
+                (item for item in counts.items() if not own_code or item[0].co_filename.startswith(API_DIR)),
+                key=lambda item: -item[1]
+            )[:PROFILE_TOP]
+            return [{
+                'function': f"{os.path.basename(code.co_filename)}:{code.co_firstlineno} {code.co_name}",
+                'thread_ms': round(n * ms)
+            } for code, n in ranked]
+        
+        return {
+            'interval_ms': ms,
+            'wall_ms': round(self.elapsed * 1000),
+            'samples': self.samples,
+            'thread_ms': {c: round(n * ms) for c, n in sorted(self.categories.items(), key=lambda item: -item[1])},
+            'top_self': top(self.own),
+            'top_inclusive': top(self.inclusive, own_code=True),
+        }
+
+
+_PROFILE_LOCK = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def profile_scan(scanner):
+    """Run scanner.run() under the sampling profiler; returns (results, profile)
+    
+    Only the calling thread and the threads the scan starts through
+    scan_thread() are sampled. One profiled scan per instance at a time,
+    to bound the sampling overhead; raises ProfilerBusy if another is
+    already running.
+    """
+    if not _PROFILE_LOCK.acquire(blocking=False):
+        raise ProfilerBusy('Another scan is being profiled')
+    try:
+        trace = ScanTrace()
+        profiler = SamplingProfiler(threads=trace.threads)
+        token = TRACE.set(trace)
+        profiler.start()
+        try:
+            results = _run_traced(scanner.run)
+        finally:
+            TRACE.reset(token)
+            profiler.stop()
+    finally:
+        _PROFILE_LOCK.release()
+    
+    summary = profiler.summary()
+    summary['outbound'] = trace.outbound_summary()
+    return results, {'summary': summary, 'trace': trace.chrome_trace()}
+
+
+# ==================================================================
+# CIRCUIT BREAKERS
+# ==================================================================
+#
+# Third-party sources (crt.sh, DNS-over-HTTPS, RDAP, IPInfo) each sit
+# behind a breaker that lives at module level, so it remembers outcomes
+# across warm invocations. Once a source fails or is slow too often,
+# scans stop waiting on it: they skip it, use an alternative, or serve
+# its last good answer, until a single trial call finds it healthy again.
+
+BREAKER_WINDOW = int(os.environ.get('BREAKER_WINDOW', 20))            # Outcomes remembered
+BREAKER_FAILURE_RATE = float(os.environ.get('BREAKER_FAILURE_RATE', 0.5))
+BREAKER_COOLDOWN = float(os.environ.get('BREAKER_COOLDOWN', 30))      # Seconds open before a trial
+BREAKER_MAX_COOLDOWN = float(os.environ.get('BREAKER_MAX_COOLDOWN', 300))
+SOURCE_CACHE_TTL = int(os.environ.get('SOURCE_CACHE_TTL', 86400))
+
+# Calls slower than slow_call seconds count as failures. crt.sh is called
+# once per scan, so it trips on fewer outcomes than the per-record DoH calls.
+BREAKER_SETTINGS = {
+    'crt.sh': {'slow_call': 10, 'min_calls': 3},
+    'dns.google': {'slow_call': 2, 'min_calls': 5},
+    'cloudflare-dns': {'slow_call': 2, 'min_calls': 5},
+    'rdap.org': {'slow_call': 5, 'min_calls': 3},
+    'ipinfo': {'slow_call': 3, 'min_calls': 5},
+}
+
+# DNS-over-HTTPS JSON endpoints, in order of preference
+DOH_PROVIDERS = [
+    ('dns.google', 'https://dns.google/resolve?name={name}&type={rtype}'),
+    ('cloudflare-dns', 'https://cloudflare-dns.com/dns-query?name={name}&type={rtype}'),
+]
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker over a sliding window of outcomes
+    
+    Opens when at least min_calls of the last BREAKER_WINDOW outcomes are
+    recorded and the failing share reaches BREAKER_FAILURE_RATE. After
+    the cooldown one caller is let through as a trial: success closes the
+    breaker, failure reopens it with the cooldown doubled.
+    """
+    
+    def __init__(self, name, slow_call=5, min_calls=5, window=None, failure_rate=None, cooldown=None):
+        self.name = name
+        self.slow_call = slow_call
+        self.min_calls = min_calls
+        self.failure_rate = BREAKER_FAILURE_RATE if failure_rate is None else failure_rate
+        self.base_cooldown = BREAKER_COOLDOWN if cooldown is None else cooldown
+        self.cooldown = self.base_cooldown
+        self.state = 'closed'
+        self.opened_at = None
+        self.rejected = 0
+        self._outcomes = deque(maxlen=window or BREAKER_WINDOW)
+        self._trial = False
+        self._lock = threading.Lock()
+    
+    def allow(self):
+        """True if the caller may make the call; it must then record() the outcome"""
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._trial:
+                self._trial = True
+                return True
+            if self.state == 'closed':
+                return True
+            self.rejected += 1
+            return False
+    
+    def record(self, ok, elapsed=0.0):
+        failed = not ok or elapsed > self.slow_call
+        with self._lock:
+            if self.state == 'half_open':
+                self._trial = False
+                if failed:
+                    self.cooldown = min(self.cooldown * 2, BREAKER_MAX_COOLDOWN)
+                    self._open()
+                else:
+                    self.state = 'closed'
+                    self.cooldown = self.base_cooldown
+                    self._outcomes.clear()
+                return
+            
+            self._outcomes.append(failed)
+            if self.state == 'closed' and len(self._outcomes) >= self.min_calls:
+                if sum(self._outcomes) / len(self._outcomes) >= self.failure_rate:
+                    self._open()
+    
+    def _open(self):
+        self.state = 'open'
+        self.opened_at = time.monotonic()
+        self._outcomes.clear()
+    
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': sum(self._outcomes),
+                'calls': len(self._outcomes),
+                'rejected': self.rejected
+            }
+
+
+class StaleCache:
+    """Last good answer per key, served when its source is down"""
+    
+    def __init__(self, ttl, max_entries=512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+    
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+BREAKERS = {name: CircuitBreaker(name, **settings) for name, settings in BREAKER_SETTINGS.items()}
+SOURCE_CACHE = StaleCache(SOURCE_CACHE_TTL)
+
+
+def _breaker_metrics():
+    states = {'closed': 0, 'half_open': 1, 'open': 2}
+    return [
+        ('aegis_breaker_state', 'gauge', 'Circuit breaker state (0 closed, 1 half-open, 2 open)',
+         [({'dependency': b.name}, states[b.state]) for b in BREAKERS.values()]),
+        ('aegis_breaker_rejected_total', 'counter', 'Calls skipped because the breaker was open',
+         [({'dependency': b.name}, b.rejected) for b in BREAKERS.values()]),
+    ]
+
+
+METRICS.register(_breaker_metrics)
+
+
+# ==================================================================
+# SCAN COALESCING
+# ==================================================================
+#
+# Identical scans requested while one is running attach to it instead
+# of starting their own, so a link shared around a team sends one
+# scan's worth of traffic to the target and to crt.sh. A finished scan
+# keeps answering identical requests for SCAN_REUSE_WINDOW seconds
+# (0 disables reuse but still coalesces concurrent requests). Failed
+# scans are handed to the requests waiting on them and never reused.
+
+SCAN_REUSE_WINDOW = float(os.environ.get('SCAN_REUSE_WINDOW', 60))
+SCAN_REUSE_MAX = 64
+
+
+class _Flight:
+    """A single in-progress scan that concurrent requests wait on"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+    
+    def result(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class ScanFlights:
+    """Single-flight scans keyed by target and options, reused for a short window"""
+    
+    def __init__(self, ttl, max_entries=SCAN_REUSE_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._recent = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._recent)
+    
+    def run(self, key, compute):
+        """Return (value, shared): shared is True when another request's scan answered"""
+        with self._lock:
+            entry = self._recent.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1], True
+            self._recent.pop(key, None)
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+        
+        if not leader:
+            return flight.result(), True
+        
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                if flight.error is None and self.ttl > 0:
+                    self._recent[key] = (time.monotonic() + self.ttl, flight.value)
+                    while len(self._recent) > self.max_entries:
+                        self._recent.popitem(last=False)
+            flight.done.set()
+        return flight.value, False
+
+
+def normalize_domain(domain):
+    """Reduce user input (URL, trailing dot, mixed case) to the bare host name"""
+    domain = re.sub(r'^[a-z][a-z0-9+.-]*://', '', domain.strip(), flags=re.IGNORECASE)
+    domain = re.split(r'[/?#]', domain, maxsplit=1)[0]
+    return domain.rstrip('.').lower()
+
+
+def scan_key(domain, bruteforce):
+    return f"{domain}|bruteforce={int(bool(bruteforce))}"
+
+
+SCAN_FLIGHTS = ScanFlights(SCAN_REUSE_WINDOW)
+
+
+def _scan_flight_metrics():
+    counts = {'hit': SCAN_FLIGHTS.hits, 'coalesced': SCAN_FLIGHTS.coalesced, 'miss': SCAN_FLIGHTS.misses}
+    return [
+        ('aegis_scan_requests_total', 'counter', 'Scan requests by result (coalesced: joined an in-flight scan)',
+         [({'result': result}, n) for result, n in counts.items()]),
+        ('aegis_scan_reuse_entries', 'gauge', 'Finished scans held for reuse', [({}, len(SCAN_FLIGHTS))]),
+    ]
+
+
+METRICS.register(_scan_flight_metrics)
+
+
+# ==================================================================
+# SCORING RULES
+# ==================================================================
+#
+# calculate_score is a table, not code. Each rule tests a feature
+# extracted from a scan result and contributes points plus a
+# score_factors line:
+#
+#   feature     name from extract_score_features()
+#   eq/ne/lt/le/gt/ge/in/contains
+#               comparisons against the feature (a bare rule needs it truthy)
+#   all / any   lists of sub-conditions {'feature': ..., <comparison>: ...}
+#   points      fixed points, or points per unit with 'per_unit'
+#   per_unit    multiply points by (feature - offset), capped at 'cap' in magnitude
+#   each        feature is a list; one factor per item, points from the
+#               mapping {item: [points, reason]} or fixed 'points'; 'limit' caps items
+#   label       str.format template; {n} is the feature value, {key}/{reason}
+#               the current item, and any feature name can be referenced
+#   cap_score   applied after the floor: clamp the score to this maximum
+#
+# Weights can be tuned with SCORING_RULES_FILE (a JSON list in this
+# format) and applied to stored history with ScanHistory.rescore(),
+# without rescanning anything.
+
+SCORE_BASELINE = 70  # Baseline for unknown (not 100, as we can't verify security)
+SCORE_FLOOR = 15     # Don't go below 15 - that's critical exposure
+
+CDN_MARKERS = ['cloudflare', 'akamai', 'fastly']
+OUTDATED_INDICATORS = ['openssl/1.0', 'php/5.', 'php/7.0', 'php/7.1', 'php/7.2',
+                       'apache/2.2', 'nginx/1.1', 'jquery/1.', 'jquery/2.']
+
+DEFAULT_SCORING_RULES = [
+    # ========== POSITIVE FACTORS ==========
+    {'feature': 'has_https', 'points': 10, 'label': 'HTTPS enabled'},
+    {'feature': 'has_cdn', 'points': 5, 'label': 'CDN/WAF detected'},
+    {'feature': 'subdomain_count', 'le': 3, 'points': 5, 'label': 'Minimal subdomain exposure'},
+    {'feature': 'email_count', 'eq': 0, 'points': 5, 'label': 'No exposed email addresses'},
+    
+    # ========== NEGATIVE FACTORS ==========
+    {'feature': 'email_count', 'gt': 0, 'points': -3, 'per_unit': True, 'cap': 10, 'label': '{n} exposed emails'},
+    {'feature': 'host_ports', 'each': {
+        21: [-8, 'FTP - cleartext credentials'],
+        22: [-3, 'SSH - potential brute-force target'],
+        23: [-15, 'Telnet - critical, cleartext protocol'],
+        25: [-3, 'SMTP - potential spam relay'],
+        3306: [-10, 'MySQL - database exposed'],
+        5432: [-10, 'PostgreSQL - database exposed'],
+        1433: [-10, 'MSSQL - database exposed'],
+        3389: [-10, 'RDP - ransomware target'],
+        5900: [-8, 'VNC - screen sharing exposed'],
+        6379: [-10, 'Redis - database exposed'],
+        27017: [-10, 'MongoDB - database exposed'],
+    }, 'label': 'Port {key} ({reason})'},
+    {'all': [{'feature': 'has_http'}, {'feature': 'has_https', 'eq': False}], 'points': -8,
+     'label': 'HTTP only, no HTTPS detected'},
+    {'feature': 'outdated_software', 'each': True, 'points': -5, 'limit': 2, 'label': 'Outdated software ({key})'},
+    {'feature': 'subdomain_count', 'gt': 10, 'points': -1, 'per_unit': True, 'offset': 10, 'cap': 10,
+     'label': 'Large attack surface ({n} subdomains)'},
+    {'feature': 'ipv6_exposed_count', 'gt': 0, 'points': -3, 'per_unit': True, 'cap': 9,
+     'label': '{n} host(s) with ports open only over IPv6'},
+    
+    # ========== SECURITY CHECK FACTORS ==========
+    {'feature': 'headers_grade', 'eq': 'A', 'points': 10, 'label': 'Excellent security headers (Grade A)'},
+    {'feature': 'headers_grade', 'eq': 'B', 'points': 5, 'label': 'Good security headers (Grade B)'},
+    {'feature': 'headers_grade', 'in': ['D', 'F'], 'points': -5, 'label': 'Poor security headers (Grade {n})'},
+    {'all': [{'feature': 'ssl_valid'}, {'feature': 'ssl_expired'}], 'points': -15,
+     'label': 'SSL certificate is expired'},
+    {'all': [{'feature': 'ssl_valid'}, {'feature': 'ssl_expired', 'eq': False}, {'feature': 'ssl_days_left', 'lt': 30}],
+     'points': -3, 'label': 'SSL certificate expiring soon'},
+    {'all': [{'feature': 'ssl_valid'}, {'feature': 'ssl_expired', 'eq': False}, {'feature': 'ssl_days_left', 'ge': 30}],
+     'points': 5, 'label': 'Valid SSL certificate'},
+    {'all': [{'feature': 'ssl_valid'},
+             {'any': [{'feature': 'tls_version', 'contains': 'TLSv1.0'}, {'feature': 'tls_version', 'contains': 'TLSv1.1'}]}],
+     'points': -5, 'label': 'Outdated TLS version ({tls_version})'},
+    {'feature': 'accessible_panel_count', 'gt': 0, 'points': -5, 'per_unit': True, 'cap': 10,
+     'label': '{n} admin panel(s) accessible'},
+    {'feature': 'directory_listing', 'points': -8, 'label': 'Directory listing enabled ({exposed_dir_count} dirs exposed)'},
+    {'feature': 'critical_cve_count', 'gt': 0, 'points': -8, 'per_unit': True, 'cap': 15,
+     'label': '{n} critical CVE(s) detected'},
+    {'feature': 'high_cve_count', 'gt': 0, 'points': -5, 'per_unit': True, 'cap': 10,
+     'label': '{n} high severity CVE(s) detected'},
+    {'feature': 'sensitive_path_count', 'gt': 5, 'points': -3, 'label': 'Many sensitive paths in robots.txt'},
+    
+    # ========== OSINT MODULE FACTORS ==========
+    {'feature': 'insecure_cookie_count', 'gt': 0, 'points': -2, 'per_unit': True, 'cap': 6,
+     'label': '{n} cookie(s) missing security flags'},
+    {'feature': 'risky_methods', 'points': -4, 'label': 'Risky HTTP methods enabled ({n})'},
+    {'feature': 'cors_wildcard', 'points': -6, 'label': 'Wildcard CORS policy (Access-Control-Allow-Origin: *)'},
+    {'all': [{'feature': 'cors_wildcard', 'eq': False}, {'feature': 'cors_reflects'}], 'points': -8,
+     'label': 'CORS reflects arbitrary origins (critical misconfiguration)'},
+    {'feature': 'domain_days_left', 'lt': 30, 'points': -3, 'label': 'Domain expires in {n} days'},
+    {'feature': 'dnssec', 'eq': 'Signed', 'points': 3, 'label': 'DNSSEC enabled'},
+    {'feature': 'has_spf', 'points': 3, 'label': 'SPF record present'},
+    {'feature': 'has_dmarc', 'points': 3, 'label': 'DMARC record present'},
+    {'all': [{'feature': 'has_spf', 'eq': False}, {'feature': 'has_dmarc', 'eq': False}], 'points': -4,
+     'label': 'No SPF/DMARC email security records'},
+    
+    # ========== UNCERTAINTY PENALTY ==========
+    # If we detected very little, cap at 75
+    {'all': [{'feature': 'tech_count', 'eq': 0}, {'feature': 'host_count', 'le': 1}], 'cap_score': 75,
+     'label': 'Cap at 75: Limited reconnaissance data'},
+]
+
+
+def load_scoring_rules():
+    """Rules from SCORING_RULES_FILE when set, else the built-in table"""
+    path = os.environ.get('SCORING_RULES_FILE')
+    if not path:
+        return DEFAULT_SCORING_RULES
+    with open(path) as f:
+        return json.load(f)
+
+
+SCORING_RULES = load_scoring_rules()
+
+
+def _scan_reference_time(result):
+    """Local naive time of the scan, so rescoring old results matches the original run"""
+    try:
+        return datetime.fromisoformat(result['timestamp']).astimezone().replace(tzinfo=None)
+    except (KeyError, TypeError, ValueError):
+        return datetime.now()
+
+
+def extract_score_features(result, now=None):
+    """Flatten a scan result into the features scoring rules test"""
+    phases = result.get('phases', {})
+    hosts = phases.get('hosts', [])
+    technologies = phases.get('technologies', [])
+    tech_names = [t.get('name', '').lower() for t in technologies]
+    host_ports = [port for host in hosts for port in host.get('ports', [])]
+    
+    outdated = []
+    for tech in technologies:
+        name = tech.get('name', '').lower()
+        if any(indicator in name for indicator in OUTDATED_INDICATORS):
+            outdated.append(tech.get('name'))
+    
+    # Deduplicate CVEs by id, keeping the first severity seen
+    severities = {}
+    for c in result.get('known_cves', []):
+        severities.setdefault(c.get('cve'), c.get('severity'))
+    
+    ssl_info = result.get('ssl_info', {})
+    cookies = result.get('cookie_security', {}).get('cookies', [])
+    cors = result.get('cors_check', {})
+    whois = result.get('whois_info', {})
+    dns_records = result.get('dns_records', [])
+    txt_values = [r.get('value', '').lower() for r in dns_records if r.get('type') == 'TXT']
+    
+    domain_days_left = None
+    if whois.get('expiry_date'):
+        try:
+            exp = datetime.strptime(whois['expiry_date'], '%Y-%m-%d')
+            domain_days_left = (exp - (now or _scan_reference_time(result))).days
+        except (TypeError, ValueError):
+            pass
+    
+    return {
+        'has_https': 443 in host_ports,
+        'has_http': 80 in host_ports,
+        'has_cdn': any(h.get('edge') for h in hosts) or any(marker in t for t in tech_names for marker in CDN_MARKERS),
+        'subdomain_count': len(phases.get('subdomains', [])),
+        'email_count': len(phases.get('osint', {}).get('emails', [])),
+        'host_ports': host_ports,
+        'outdated_software': outdated,
+        'tech_count': len(technologies),
+        'host_count': len(hosts),
+        'ipv6_exposed_count': sum(1 for h in hosts if h.get('ipv6_exposed')),
+        'headers_grade': result.get('security_headers', {}).get('grade', 'F'),
+        'ssl_valid': bool(ssl_info.get('valid')),
+        'ssl_expired': bool(ssl_info.get('is_expired')),
+        'ssl_days_left': ssl_info.get('days_until_expiry', 999),
+        'tls_version': ssl_info.get('tls_version', ''),
+        'accessible_panel_count': len([p for p in result.get('admin_panels', {}).get('found', []) if p.get('accessible')]),
+        'directory_listing': bool(result.get('directory_listing', {}).get('vulnerable')),
+        'exposed_dir_count': len(result.get('directory_listing', {}).get('exposed_dirs', [])),
+        'critical_cve_count': sum(1 for s in severities.values() if s == 'Critical'),
+        'high_cve_count': sum(1 for s in severities.values() if s == 'High'),
+        'sensitive_path_count': len(result.get('robots_txt', {}).get('sensitive_paths', [])),
+        'insecure_cookie_count': len([c for c in cookies if not c.get('secure') or not c.get('httponly')]),
+        'risky_methods': result.get('http_methods', {}).get('risky_methods', []),
+        'cors_wildcard': bool(cors.get('wildcard_origin')),
+        'cors_reflects': bool(cors.get('reflects_origin')),
+        'domain_days_left': domain_days_left,
+        'dnssec': whois.get('dnssec'),
+        'has_spf': any('spf' in v for v in txt_values),
+        'has_dmarc': any('dmarc' in v for v in txt_values),
+    }
+
+
+_COMPARISONS = {
+    'eq': lambda v, x: v == x,
+    'ne': lambda v, x: v != x,
+    'lt': lambda v, x: v is not None and v < x,
+    'le': lambda v, x: v is not None and v <= x,
+    'gt': lambda v, x: v is not None and v > x,
+    'ge': lambda v, x: v is not None and v >= x,
+    'in': lambda v, x: v in x,
+    'contains': lambda v, x: v is not None and x in v,
+}
+
+
+def _all_of(checks):
+    if len(checks) == 1:
+        return checks[0]
+    if len(checks) == 2:
+        first, second = checks
+        return lambda features: first(features) and second(features)
+    return lambda features: all(check(features) for check in checks)
+
+
+def _compile_test(name, test, arg):
+    return lambda features: test(features.get(name), arg)
+
+
+def _compile_condition(condition):
+    """Turn a rule's condition into a predicate over a feature dict"""
+    checks = [_compile_condition(c) for c in condition.get('all', [])]
+    if condition.get('any'):
+        alternatives = [_compile_condition(c) for c in condition['any']]
+        checks.append(lambda features: any(alt(features) for alt in alternatives))
+    if 'feature' in condition:
+        name = condition['feature']
+        tests = [_compile_test(name, _COMPARISONS[op], arg) for op, arg in condition.items() if op in _COMPARISONS]
+        checks.extend(tests or [lambda features: bool(features.get(name))])
+    return _all_of(checks) if checks else (lambda features: True)
+
+
+def _factor(points, label):
+    return f"{'+' if points > 0 else '-'}{abs(points)}: {label}"
+
+
+def _label_value(value):
+    return ', '.join(str(v) for v in value) if isinstance(value, (list, tuple)) else value
+
+
+def _compile_label(template, local_fields):
+    """Formatter for a label; only labels naming other features pay for passing them all"""
+    fields = {field for _, field, _, _ in string.Formatter().parse(template) if field}
+    if not fields:
+        return lambda features, **values: template
+    if fields <= local_fields:
+        return lambda features, **values: template.format(**values)
+    return lambda features, **values: template.format(**values, **features)
+
+
+_COMPILED_RULES = {}
+
+
+def compile_scoring_rules(rules):
+    """Parse a rules table once into flat tuples the evaluator can run directly
+    
+    Tables are compiled on first use and reused, so batch rescoring pays
+    for the dict walking once rather than per result.
+    """
+    compiled = _COMPILED_RULES.get(id(rules))
+    if compiled is not None and compiled[0] is rules:
+        return compiled[1]
+    
+    scoring, caps = [], []
+    for rule in rules:
+        if 'cap_score' in rule:
+            caps.append((_compile_condition(rule), rule['cap_score'], rule['label']))
+        elif 'each' in rule:
+            table = rule['each'] if isinstance(rule['each'], dict) else None
+            scoring.append((True, rule['feature'], table, rule.get('points'), rule.get('limit'),
+                            _compile_label(rule['label'], {'key', 'reason'})))
+        else:
+            per_unit = (rule.get('offset', 0), rule.get('cap')) if rule.get('per_unit') else None
+            scoring.append((False, rule.get('feature'), _compile_condition(rule), rule['points'], per_unit,
+                            _compile_label(rule['label'], {'n'})))
+    _COMPILED_RULES[id(rules)] = (rules, (scoring, caps))
+    return scoring, caps
+
+
+def apply_scoring_rules(features, rules=None):
+    """Evaluate the rules table against one feature dict; returns (score, score_factors)"""
+    scoring, caps = compile_scoring_rules(SCORING_RULES if rules is None else rules)
+    score = SCORE_BASELINE
+    findings = []
+    
+    for each, name, condition, points, option, label in scoring:
+        if each:
+            applied = 0
+            for item in features.get(name) or []:
+                if option is not None and applied >= option:
+                    break
+                if condition is not None:
+                    entry = condition.get(item, condition.get(str(item)))
+                    if entry is None:
+                        continue
+                    item_points, reason = entry
+                else:
+                    item_points, reason = points, ''
+                score += item_points
+                applied += 1
+                findings.append(_factor(item_points, label(features, key=item, reason=reason)))
+            continue
+        
+        if not condition(features):
+            continue
+        
+        value = features.get(name)
+        rule_points = points
+        if option is not None:
+            offset, cap = option
+            rule_points *= value - offset
+            if cap is not None:
+                rule_points = max(-cap, min(cap, rule_points))
+        score += rule_points
+        findings.append(_factor(rule_points, label(features, n=_label_value(value))))
+    
+    score = max(SCORE_FLOOR, score)
+    
+    for condition, cap_score, label in caps:
+        if condition(features):
+            score = min(score, cap_score)
+            findings.append(label)
+    
+    return max(0, min(100, score)), findings
+
+
+def score_result(result, rules=None, now=None):
+    """Score one scan result; returns (security_score, score_factors)"""
+    return apply_scoring_rules(extract_score_features(result, now=now), rules)
+
+
+def score_batch(results, rules=None):
+    """Score many stored results with no network I/O; returns [(security_score, score_factors)]
+    
+    Each result is scored as of its own scan time, so an unchanged rule
+    table reproduces the stored scores.
+    """
+    rules = SCORING_RULES if rules is None else rules
+    return [apply_scoring_rules(extract_score_features(r), rules) for r in results]
+
+
+# ==================================================================
+# DNS BRUTE FORCE
+# ==================================================================
+#
+# Active subdomain discovery that does not depend on crt.sh: wordlist
+# labels are resolved under the target by a small asyncio DNS client
+# that keeps many queries in flight over a handful of UDP sockets.
+
+DNS_RESOLVERS = [r.strip() for r in os.environ.get('DNS_RESOLVERS', '8.8.8.8,1.1.1.1').split(',') if r.strip()]
+DNS_WORDLIST = os.environ.get('DNS_WORDLIST') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'subdomains.txt'
+)
+DNS_SOCKETS = int(os.environ.get('DNS_SOCKETS', 4))
+DNS_MAX_INFLIGHT = int(os.environ.get('DNS_MAX_INFLIGHT', 1000))
+DNS_TIMEOUT = float(os.environ.get('DNS_TIMEOUT', 1.5))
+DNS_RETRIES = int(os.environ.get('DNS_RETRIES', 2))
+
+QTYPE_A = 1
+QTYPE_AAAA = 28
+RCODE_NOERROR = 0
+RCODE_SERVFAIL = 2
+RCODE_NXDOMAIN = 3
+
+WORDLIST_ENTRY = re.compile(rb'(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)*[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?')
+
+
+def iter_wordlist(path):
+    """Labels from a newline-separated wordlist, read through mmap instead of into memory"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            pos, size = 0, len(data)
+            while pos < size:
+                end = data.find(b'\n', pos)
+                if end < 0:
+                    end = size
+                entry = data[pos:end].strip().lower()
+                pos = end + 1
+                if entry and WORDLIST_ENTRY.fullmatch(entry):
+                    yield entry.decode('ascii')
+
+
+def _parse_resolver(spec):
+    host, _, port = spec.rpartition(':') if spec.count(':') == 1 else (spec, '', '')
+    return (host or spec, int(port) if port else 53)
+
+
+def encode_dns_query(txid, name, qtype=QTYPE_A):
+    """Wire-format query with recursion desired"""
+    qname = b''.join(bytes([len(label)]) + label for label in name.encode('idna').split(b'.') if label)
+    return struct.pack('>HHHHHH', txid, 0x0100, 1, 0, 0, 0) + qname + b'\0' + struct.pack('>HH', qtype, 1)
+
+
+def _read_name(message, pos):
+    """Decode a possibly compressed name; returns (name, position after it)"""
+    labels, end, jumps = [], None, 0
+    while True:
+        length = message[pos]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = pos + 2
+            jumps += 1
+            if jumps > 16:
+                raise ValueError('DNS name compression loop')
+            pos = ((length & 0x3F) << 8) | message[pos + 1]
+            continue
+        pos += 1
+        if length == 0:
+            break
+        labels.append(message[pos:pos + length].decode('ascii', 'replace'))
+        pos += length
+    return '.'.join(labels).lower(), end if end is not None else pos
+
+
+def decode_dns_response(message):
+    """Parse a response into {'txid', 'rcode', 'truncated', 'name', 'addresses'}"""
+    txid, flags, qdcount, ancount, _, _ = struct.unpack_from('>HHHHHH', message)
+    pos, name = 12, ''
+    for _ in range(qdcount):
+        name, pos = _read_name(message, pos)
+        pos += 4
+    
+    addresses = []
+    for _ in range(ancount):
+        _, pos = _read_name(message, pos)
+        rtype, _, _, rdlength = struct.unpack_from('>HHIH', message, pos)
+        pos += 10
+        rdata = message[pos:pos + rdlength]
+        pos += rdlength
+        if rtype == QTYPE_A and rdlength == 4:
+            addresses.append(socket.inet_ntop(socket.AF_INET, rdata))
+        elif rtype == QTYPE_AAAA and rdlength == 16:
+            addresses.append(socket.inet_ntop(socket.AF_INET6, rdata))
+    
+    return {
+        'txid': txid,
+        'rcode': flags & 0x000F,
+        'truncated': bool(flags & 0x0200),
+        'name': name,
+        'addresses': addresses
+    }
+
+
+class _DNSProtocol(asyncio.DatagramProtocol):
+    def __init__(self, client):
+        self.client = client
+        self.pending = {}  # txid -> (future, name)
+    
+    def datagram_received(self, data, addr):
+        try:
+            response = decode_dns_response(data)
+        except (ValueError, IndexError, struct.error):
+            return
+        waiter = self.pending.get(response['txid'])
+        if waiter is None or addr[:2] not in self.client.resolver_addrs:
+            return  # Late, spoofed or unrelated
+        future, name = waiter
+        if response['name'] == name and not future.done():
+            future.set_result(response)
+    
+    def error_received(self, exc):
+        pass  # ICMP errors surface as timeouts on the affected queries
+
+
+class AsyncDNSClient:
+    """Concurrent DNS queries over a small pool of UDP sockets
+    
+    Up to max_inflight queries are outstanding at once. Each query is
+    matched by transaction id and question name, retried on timeout or
+    SERVFAIL (rotating resolvers, backing off), and re-asked over TCP when
+    the UDP answer is truncated.
+    """
+    
+    def __init__(self, resolvers=None, sockets=DNS_SOCKETS, max_inflight=DNS_MAX_INFLIGHT,
+                 timeout=DNS_TIMEOUT, retries=DNS_RETRIES):
+        self.resolvers = [_parse_resolver(r) for r in (resolvers or DNS_RESOLVERS)]
+        self.resolver_addrs = set(self.resolvers)
+        self.sockets = max(1, sockets)
+        self.max_inflight = max(1, max_inflight)
+        self.timeout = timeout
+        self.retries = retries
+        self.stats = {'queries': 0, 'timeouts': 0, 'truncated': 0, 'servfail': 0}
+        self._endpoints = []
+        self._next = 0
+    
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        for _ in range(self.sockets):
+            transport, protocol = await loop.create_datagram_endpoint(
+                lambda: _DNSProtocol(self), family=socket.AF_INET
+            )
+            try:
+                # Room for bursts of answers to thousands of outstanding queries
+                transport.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            except OSError:
+                pass
+            self._endpoints.append((transport, protocol))
+        self._slots = asyncio.Semaphore(self.max_inflight)
+        return self
+    
+    async def __aexit__(self, *exc):
+        for transport, _ in self._endpoints:
+            transport.close()
+        self._endpoints = []
+    
+    async def query(self, name, qtype=QTYPE_A):
+        """Resolve name; returns the decoded response, or None when every attempt timed out"""
+        name = name.lower().rstrip('.')
+        async with self._slots:
+            for attempt in range(self.retries + 1):
+                resolver = self.resolvers[(self._next + attempt) % len(self.resolvers)]
+                self._next += 1
+                response = await self._query_udp(name, qtype, resolver, self.timeout * (1 + attempt))
+                if response is None:
+                    self.stats['timeouts'] += 1
+                    continue
+                if response['truncated']:
+                    self.stats['truncated'] += 1
+                    response = await self._query_tcp(name, qtype, resolver, self.timeout * (1 + attempt))
+                    if response is None:
+                        continue
+                if response['rcode'] == RCODE_SERVFAIL:
+                    self.stats['servfail'] += 1
+                    continue
+                return response
+        return None
     
-    def do_POST(self):
-        """Handle scan requests"""
+    async def _query_udp(self, name, qtype, resolver, timeout):
+        loop = asyncio.get_running_loop()
+        transport, protocol = self._endpoints[self._next % len(self._endpoints)]
+        txid = random.getrandbits(16)
+        while txid in protocol.pending:
+            txid = random.getrandbits(16)
+        
+        future = loop.create_future()
+        protocol.pending[txid] = (future, name)
+        expire = loop.call_later(timeout, lambda: future.done() or future.set_result(None))
         try:
-            # Read request body
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length).decode('utf-8')
-            data = json.loads(body) if body else {}
+            self.stats['queries'] += 1
+            transport.sendto(encode_dns_query(txid, name, qtype), resolver)
+            return await future
+        finally:
+            expire.cancel()
+            protocol.pending.pop(txid, None)
+    
+    async def _query_tcp(self, name, qtype, resolver, timeout):
+        txid = random.getrandbits(16)
+        query = encode_dns_query(txid, name, qtype)
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(*resolver), timeout)
+            writer.write(struct.pack('>H', len(query)) + query)
+            length, = struct.unpack('>H', await asyncio.wait_for(reader.readexactly(2), timeout))
+            response = decode_dns_response(await asyncio.wait_for(reader.readexactly(length), timeout))
+            return response if response['txid'] == txid else None
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, struct.error):
+            return None
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+async def _detect_wildcard(client, target, probes=3):
+    """Addresses that random, surely-unregistered names under target resolve to"""
+    names = [f"{uuid.uuid4().hex[:16]}.{target}" for _ in range(probes)]
+    responses = await asyncio.gather(*(client.query(n) for n in names))
+    return {a for r in responses if r and r['rcode'] == RCODE_NOERROR for a in r['addresses']}
+
+
+def dns_bruteforce(target, wordlist=None, resolvers=None, on_found=None, deadline=None, **client_options):
+    """Resolve wordlist labels under target; on_found(name, addresses) is called as names are confirmed
+    
+    Returns {'found': {name: [addresses]}, 'wildcard': [...], 'queries', 'timeouts', ...}.
+    """
+    async def run():
+        async with AsyncDNSClient(resolvers, **client_options) as client:
+            labels = iter_wordlist(wordlist or DNS_WORDLIST)
+            wildcard = await _detect_wildcard(client, target)
+            found = {}
             
-            domain = data.get('domain', '').strip()
+            async def worker():
+                # Workers share one label iterator, so memory does not grow with the wordlist
+                for label in labels:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        return
+                    name = f"{label}.{target}"
+                    response = await client.query(name)
+                    if not response or response['rcode'] != RCODE_NOERROR or not response['addresses']:
+                        continue
+                    if wildcard and set(response['addresses']) <= wildcard:
+                        continue  # Indistinguishable from the wildcard record
+                    found[name] = response['addresses']
+                    if on_found is not None:
+                        on_found(name, response['addresses'])
             
-            if not domain:
-                self._send_json({'success': False, 'error': 'Domain is required'}, 400)
+            await asyncio.gather(*(worker() for _ in range(client.max_inflight)))
+            return dict(client.stats, found=found, wildcard=sorted(wildcard))
+    
+    return asyncio.run(run())
+
+
+# ==================================================================
+# DISCOVERY PIPELINE
+# ==================================================================
+
+PROBE_PORTS = [80, 443, 22, 21, 25, 3306, 6379, 8080]  # Web, plus every port SERVICE_SIGNATURES identify
+DISCOVERY_QUEUE_SIZE = int(os.environ.get('DISCOVERY_QUEUE_SIZE', 256))
+DISCOVERY_RESOLVERS = int(os.environ.get('DISCOVERY_RESOLVERS', 32))
+DISCOVERY_PROBERS = int(os.environ.get('DISCOVERY_PROBERS', 32))
+DISCOVERY_BUDGET = float(os.environ.get('DISCOVERY_BUDGET', 25))
+CT_SYNC_INTERVAL = int(os.environ.get('CT_SYNC_INTERVAL', 3600))  # Seconds a crt.sh sync stays fresh
+
+_END_OF_STAGE = object()
+
+
+def iter_json_array(stream, chunk_size=65536):
+    """Yield the objects of a top-level JSON array while it is still being read"""
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')('replace')
+    buffer, pos = '', 0
+    
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer = buffer[pos:] + text.decode(chunk or b'', final=not chunk)
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,[':
+                pos += 1
+            if pos >= len(buffer) or buffer[pos] == ']':
+                break
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                break  # Item continues in the next chunk
+            yield item
+        if not chunk:
+            return
+
+
+class PipelineStage:
+    """Worker threads mapping a function from a bounded queue into a sink"""
+    
+    def __init__(self, func, inbox, sink, workers, deadline):
+        self.func = func
+        self.inbox = inbox
+        self.sink = sink
+        self.deadline = deadline
+        self.processed = 0
+        self._lock = threading.Lock()
+        self.threads = [scan_thread(self._work) for _ in range(max(1, workers))]
+        for t in self.threads:
+            t.start()
+    
+    def _work(self):
+        while True:
+            item = self.inbox.get()
+            if item is _END_OF_STAGE:
                 return
+            if time.monotonic() >= self.deadline:
+                continue  # Out of budget: drain so upstream never blocks
+            try:
+                out = self.func(item)
+            except Exception:
+                out = None
+            with self._lock:
+                self.processed += 1
+            if out is not None and self.sink is not None:
+                self.sink(out)
+    
+    def close(self):
+        """Signal end of input and wait for the queue to be finished"""
+        for _ in self.threads:
+            self.inbox.put(_END_OF_STAGE)
+        for t in self.threads:
+            t.join()
+
+
+# ==================================================================
+# IP RANGE INDEX
+# ==================================================================
+#
+# Provider ranges live in data/ip-ranges/<provider>.txt: one CIDR per
+# line, '#' comments, and an optional '# kind: cdn|cloud' line that
+# applies to the ranges after it.
+
+IP_RANGES_DIR = os.environ.get('IP_RANGES_DIR') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'ip-ranges'
+)
+CDN_EDGE_POLICY = os.environ.get('CDN_EDGE_POLICY', 'web')  # full | web | skip
+EDGE_PORTS = [80, 443]
+EDGE_PROBE_SLOTS = threading.BoundedSemaphore(int(os.environ.get('EDGE_PROBE_CONCURRENCY', 4)))
+
+
+class IPRangeIndex:
+    """Provider lookup for IPv4 and IPv6 addresses
+    
+    Each family is a sorted list of disjoint intervals (adjacent ranges
+    of one provider merged, the first provider kept where two overlap),
+    so a lookup is a single bisect however many ranges are loaded.
+    """
+    
+    def __init__(self, ranges=()):
+        by_family = {4: [], 6: []}
+        for network, provider, kind in ranges:
+            net = ipaddress.ip_network(network, strict=False)
+            by_family[net.version].append((int(net.network_address), int(net.broadcast_address), (provider, kind)))
+        
+        self._tables = {}
+        for version, intervals in by_family.items():
+            starts, ends, tags = [], [], []
+            for start, end, tag in sorted(intervals):
+                if ends and start <= ends[-1] + 1 and tags[-1] == tag:
+                    ends[-1] = max(ends[-1], end)
+                    continue
+                if ends and start <= ends[-1]:
+                    start = ends[-1] + 1
+                    if start > end:
+                        continue
+                starts.append(start)
+                ends.append(end)
+                tags.append(tag)
+            self._tables[version] = (starts, ends, tags)
+    
+    @classmethod
+    def from_directory(cls, path):
+        ranges = []
+        for filename in sorted(os.listdir(path)):
+            if not filename.endswith('.txt'):
+                continue
+            provider, kind = filename[:-4], 'cdn'
+            with open(os.path.join(path, filename)) as f:
+                for line in f:
+                    line = line.strip()
+                    if line.startswith('#'):
+                        match = re.match(r'#\s*kind:\s*(\w+)', line)
+                        if match:
+                            kind = match.group(1).lower()
+                    elif line:
+                        ranges.append((line, provider, kind))
+        return cls(ranges)
+    
+    def __len__(self):
+        return sum(len(starts) for starts, _, _ in self._tables.values())
+    
+    def lookup(self, address):
+        """(provider, kind) for an address string, or None"""
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return None
+        starts, ends, tags = self._tables[ip.version]
+        value = int(ip)
+        i = bisect.bisect_right(starts, value) - 1
+        if i >= 0 and value <= ends[i]:
+            return tags[i]
+        return None
+
+
+def load_ip_ranges():
+    try:
+        return IPRangeIndex.from_directory(IP_RANGES_DIR)
+    except (OSError, ValueError):
+        return IPRangeIndex()
+
+
+IP_RANGES = load_ip_ranges()
+
+
+# ==================================================================
+# PORT PROBING
+# ==================================================================
+#
+# Connect timeouts follow each host's measured round-trip time instead
+# of a fixed second per port: a refused or accepted connect is an RTT
+# sample, and the timeout for ports still pending tightens (or widens)
+# as samples arrive, TCP retransmission-timer style.
+
+PROBE_TIMEOUT = float(os.environ.get('PROBE_TIMEOUT', 1.0))          # Before any RTT sample
+PROBE_MIN_TIMEOUT = float(os.environ.get('PROBE_MIN_TIMEOUT', 0.1))
+PROBE_MAX_TIMEOUT = float(os.environ.get('PROBE_MAX_TIMEOUT', 3.0))
+PROBE_RETRIES = int(os.environ.get('PROBE_RETRIES', 1))
+HAPPY_EYEBALLS_DELAY = float(os.environ.get('HAPPY_EYEBALLS_DELAY', 0.25))  # RFC 8305 attempt delay
+
+
+class RTTEstimator:
+    """Smoothed RTT and variance (RFC 6298) turned into a connect timeout"""
+    
+    def __init__(self, initial=None, floor=None, ceiling=None):
+        self.initial = PROBE_TIMEOUT if initial is None else initial
+        self.floor = PROBE_MIN_TIMEOUT if floor is None else floor
+        self.ceiling = PROBE_MAX_TIMEOUT if ceiling is None else ceiling
+        self.srtt = None
+        self.rttvar = None
+        self.samples = 0
+    
+    def sample(self, rtt):
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.samples += 1
+    
+    @property
+    def timeout(self):
+        if self.srtt is None:
+            return self.initial
+        return min(self.ceiling, max(self.floor, self.srtt + 4 * self.rttvar))
+
+
+_REFUSED = {errno.ECONNREFUSED, errno.ECONNRESET}
+
+
+def _family(ip):
+    return socket.AF_INET6 if ':' in ip else socket.AF_INET
+
+
+def _connect_wave(targets, backoff=1):
+    """Connect to every (address, port) at once
+    
+    targets maps an address to (ports, estimator, delay). An address with
+    a delay starts that many seconds into the wave, or as soon as every
+    address already started has settled, whichever comes first. Returns
+    {address: ({port: 'open'|'closed'}, unanswered ports)}.
+    """
+    answers = {ip: {} for ip in targets}
+    pending = {ip: {} for ip in targets}
+    started_at = {}
+    selector = selectors.DefaultSelector()
+    wave_started = time.monotonic()
+    
+    def start(ip):
+        ports, estimator, _ = targets[ip]
+        started_at[ip] = time.monotonic()
+        family = _family(ip)
+        for port in ports:
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            started = time.monotonic()
+            err = sock.connect_ex((ip, port))
+            if err in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+                selector.register(sock, selectors.EVENT_WRITE, (ip, port, started))
+                pending[ip][port] = sock
+                continue
+            sock.close()
+            if err in _REFUSED:
+                estimator.sample(time.monotonic() - started)
+                answers[ip][port] = 'closed'
+            # Anything else (unreachable, no route) is left unanswered
+    
+    def expire(ip):
+        for sock in pending[ip].values():
+            selector.unregister(sock)
+            sock.close()
+        pending[ip].clear()
+    
+    try:
+        for ip in targets:
+            if not targets[ip][2]:
+                start(ip)
+        
+        while True:
+            now = time.monotonic()
+            waiting = [ip for ip in targets if ip not in started_at]
+            settled = all(not pending[ip] for ip in started_at)
+            for ip in waiting:
+                if settled or now >= wave_started + targets[ip][2]:
+                    start(ip)
             
-            # Clean domain
-            domain = re.sub(r'^https?://', '', domain).rstrip('/')
-            
-            # Run the scan
-            scanner = AegisScanner(domain)
-            results = scanner.run()
-            
-            self._send_json({
-                'success': True,
-                'results': results,
-                'timestamp': datetime.now(timezone.utc).isoformat()
-            })
+            wakeups = []
+            for ip, at in started_at.items():
+                if pending[ip]:
+                    deadline = at + targets[ip][1].timeout * backoff
+                    if deadline <= now:
+                        expire(ip)
+                    else:
+                        wakeups.append(deadline)
+            wakeups.extend(wave_started + targets[ip][2] for ip in targets if ip not in started_at)
+            if not wakeups:
+                break
             
-        except Exception as e:
-            self._send_json({'success': False, 'error': str(e)}, 500)
+            for key, _ in selector.select(max(0, min(wakeups) - time.monotonic())):
+                ip, port, started = key.data
+                sock = key.fileobj
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                selector.unregister(sock)
+                sock.close()
+                del pending[ip][port]
+                if err == 0 or err in _REFUSED:
+                    targets[ip][1].sample(time.monotonic() - started)
+                    answers[ip][port] = 'open' if err == 0 else 'closed'
+    finally:
+        for ip in targets:
+            for sock in pending[ip].values():
+                sock.close()
+        selector.close()
     
-    def do_GET(self):
-        """Handle GET requests (health check)"""
-        self._send_json({
-            'status': 'ok',
-            'service': 'Aegis Recon Scanner',
-            'author': 'VexSpitta',
-            'github': 'https://github.com/Vexx-bit'
-        })
+    return {ip: (answers[ip], [p for p in targets[ip][0] if p not in answers[ip]]) for ip in targets}
+
+
+def probe_addresses(addresses, ports):
+    """TCP connect scan of a host's addresses with RTT-derived timeouts
     
-    def _send_json(self, data, status=200):
-        """Send JSON response"""
-        self.send_response(status)
-        self.send_header('Content-Type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(json.dumps(data).encode('utf-8'))
+    All addresses are scanned in one wave, happy-eyeballs style (RFC 8305):
+    IPv6 addresses start first and IPv4 follows HAPPY_EYEBALLS_DELAY later,
+    or immediately once IPv6 has settled, so a dual-stack host costs about
+    as long as its slower family rather than the sum of both. Each address
+    keeps its own RTT estimate and result.
+    
+    Only ports that neither accepted nor refused are retried, with the
+    timeout doubled each time. An address that answered nothing in the
+    first wave is treated as filtered and not retried.
+    """
+    first = socket.AF_INET6 if any(_family(ip) == socket.AF_INET6 for ip in addresses) else socket.AF_INET
+    estimators = {ip: RTTEstimator() for ip in addresses}
+    waves = _connect_wave({
+        ip: (ports, estimators[ip], 0 if _family(ip) == first else HAPPY_EYEBALLS_DELAY) for ip in addresses
+    })
+    answers = {ip: waves[ip][0] for ip in addresses}
+    ambiguous = {ip: waves[ip][1] for ip in addresses}
+    retried = dict.fromkeys(addresses, 0)
+    
+    for attempt in range(1, PROBE_RETRIES + 1):
+        targets = {ip: (ambiguous[ip], estimators[ip], 0) for ip in addresses if ambiguous[ip] and answers[ip]}
+        if not targets:
+            break
+        for ip, (more, still) in _connect_wave(targets, backoff=2 ** attempt).items():
+            retried[ip] += len(ambiguous[ip])
+            answers[ip].update(more)
+            ambiguous[ip] = still
+    
+    return {
+        ip: {
+            'family': 'ipv6' if _family(ip) == socket.AF_INET6 else 'ipv4',
+            'open': [p for p in ports if answers[ip].get(p) == 'open'],
+            'closed': [p for p in ports if answers[ip].get(p) == 'closed'],
+            'filtered': ambiguous[ip],
+            'rtt_ms': round(estimators[ip].srtt * 1000, 1) if estimators[ip].srtt is not None else None,
+            'timeout_ms': round(estimators[ip].timeout * 1000),
+            'retried': retried[ip]
+        }
+        for ip in addresses
+    }
+
+
+# ==================================================================
+# SERVICE IDENTIFICATION
+# ==================================================================
+#
+# Open ports are identified from what they say rather than their number:
+# server-first protocols (SSH, FTP, SMTP, MySQL) announce themselves on
+# connect, the rest get a minimal probe. Every connection is capped in
+# bytes and time, and the whole stage in time.
+
+BANNER_TIMEOUT = float(os.environ.get('BANNER_TIMEOUT', 2.0))      # Per connection (seconds)
+BANNER_IDLE = float(os.environ.get('BANNER_IDLE', 0.5))            # Wait for a banner before probing
+BANNER_MAX_BYTES = int(os.environ.get('BANNER_MAX_BYTES', 512))
+BANNER_CONCURRENCY = int(os.environ.get('BANNER_CONCURRENCY', 56))  # Seven bannered ports a host
+BANNER_BUDGET = float(os.environ.get('BANNER_BUDGET', 8))          # Whole stage (seconds)
+BANNER_SKIP_PORTS = {443}  # TLS: covered by the certificate and header checks
+
+HTTP_PROBE = b'HEAD / HTTP/1.0\r\n\r\n'
+
+# Client-first protocols, sent as soon as the connection opens
+SERVICE_PROBES = {
+    80: HTTP_PROBE,
+    8080: HTTP_PROBE,
+    6379: b'PING\r\nINFO server\r\n',
+}
+
+# First match wins: (protocol, pattern, product, version group). The
+# product is a fixed name or the number of the group holding it.
+SERVICE_SIGNATURES = [
+    ('ssh', rb'^SSH-[\d.]+-OpenSSH_([\w.]+)', 'openssh', 1),
+    ('ssh', rb'^SSH-[\d.]+-dropbear_([\w.]+)', 'dropbear', 1),
+    ('ssh', rb'^SSH-[\d.]+-([A-Za-z][\w-]*?)[_-]?([\d][\w.]*)?\s', 1, 2),
+    ('ftp', rb'^220[ -].*?\(vsFTPd ([\d.]+)\)', 'vsftpd', 1),
+    ('ftp', rb'^220[ -].*?ProFTPD ([\d.]+\w*)', 'proftpd', 1),
+    ('ftp', rb'^220[ -].*?FileZilla Server(?: version)? ([\d.]+)', 'filezilla server', 1),
+    ('ftp', rb'^220[ -].*?Pure-FTPd', 'pure-ftpd', None),
+    ('smtp', rb'^220[ -]\S+ E?SMTP Exim ([\d.]+)', 'exim', 1),
+    ('smtp', rb'^220[ -]\S+ E?SMTP Postfix', 'postfix', None),
+    ('smtp', rb'^220[ -]\S+ .*?Microsoft ESMTP MAIL Service', 'exchange', None),
+    ('smtp', rb'^220[ -][^\r\n]*SMTP', None, None),
+    ('ftp', rb'^220[ -]', None, None),
+    ('redis', rb'redis_version:([\d.]+)', 'redis', 1),
+    ('redis', rb'^(?:\+PONG|-NOAUTH|-DENIED)', 'redis', None),
+    ('mysql', rb'^.{4}\x0a([\d.]+)-MariaDB', 'mariadb', 1),
+    ('mysql', rb'^.{4}\x0a([\d.]+)', 'mysql', 1),
+    ('http', rb'^HTTP/1\.[01] \d{3}.*?\r\nServer: ([^/\r\n ]+)/?([\w.]*)', 1, 2),
+    ('http', rb'^HTTP/1\.[01] \d{3}', None, None),
+]
+
+
+def compile_service_signatures(signatures):
+    return [(protocol, re.compile(pattern, re.DOTALL | re.IGNORECASE), product, version)
+            for protocol, pattern, product, version in signatures]
+
+
+_SERVICE_SIGNATURES = compile_service_signatures(SERVICE_SIGNATURES)
+
+
+def identify_service(data, signatures=None):
+    """{'protocol', 'product', 'version', 'banner'} for the first bytes a port sent"""
+    line = data.split(b'\n', 1)[0].decode('latin-1').strip()[:200]
+    banner = ''.join(ch if ch.isprintable() else '.' for ch in line)
+    for protocol, pattern, product, version in signatures or _SERVICE_SIGNATURES:
+        match = pattern.search(data)
+        if match:
+            if isinstance(product, int):
+                product = match.group(product)
+                product = product.decode('latin-1').lower() if product else None
+            version = match.group(version) if version else None
+            return {
+                'protocol': protocol,
+                'product': product,
+                'version': version.decode('latin-1') if version else None,
+                'banner': banner
+            }
+    return {'protocol': None, 'product': None, 'version': None, 'banner': banner}
+
+
+# Known vulnerable releases of identified services: (product, first
+# affected, first fixed, cve, severity, description), either bound open.
+# Versions compare numerically, so exim 4.80 is not inside 4.87-4.91.
+SERVICE_CVES = [
+    ('openssh', None, '7.3', 'CVE-2016-6210', 'Medium', 'User enumeration via timing'),
+    ('openssh', None, '7.8', 'CVE-2018-15473', 'Medium', 'User enumeration'),
+    ('vsftpd', '2.3.4', '2.3.5', 'CVE-2011-2523', 'Critical', 'Backdoored release - remote shell'),
+    ('proftpd', '1.3.5', '1.3.5a', 'CVE-2015-3306', 'Critical', 'mod_copy unauthenticated file copy'),
+    ('exim', '4.87', '4.92', 'CVE-2019-10149', 'Critical', 'Remote command execution'),
+]
+
+
+def version_key(version):
+    """Sortable form of a version string: '7.4p1' -> ((7, 4), 'p1'); None if it has no number"""
+    match = re.match(r'\s*v?(\d+(?:\.\d+)*)(.*)', version or '')
+    if not match:
+        return None
+    return tuple(int(n) for n in match.group(1).split('.')), match.group(2).strip().lower()
+
+
+def service_cves(product, version, table=None):
+    """SERVICE_CVES entries whose range holds this product version"""
+    key = version_key(version)
+    if not product or key is None:
+        return []
+    product = product.lower()
+    return [
+        {'cve': cve, 'severity': severity, 'description': description}
+        for name, first, fixed, cve, severity, description in table or SERVICE_CVES
+        if name == product
+        and (first is None or key >= version_key(first))
+        and (fixed is None or key < version_key(fixed))
+    ]
+
+
+async def _read_banner(ip, port):
+    """Up to BANNER_MAX_BYTES from one port, probing if it does not speak first
+    
+    Whatever has arrived when BANNER_TIMEOUT runs out is returned; after
+    a probe, reading also stops once the reply goes quiet for BANNER_IDLE.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + BANNER_TIMEOUT
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), BANNER_TIMEOUT)
+    try:
+        data = b''
+        probe = SERVICE_PROBES.get(port)
+        if probe is None:
+            try:
+                data = await asyncio.wait_for(reader.read(BANNER_MAX_BYTES), BANNER_IDLE)
+                if not data:
+                    return data
+            except asyncio.TimeoutError:
+                probe = HTTP_PROBE  # Silent and unknown: most often HTTP
+        if probe:
+            writer.write(probe)
+        
+        # A server-first banner ends at its first line; a probe reply at EOF or silence
+        while len(data) < BANNER_MAX_BYTES and (probe or b'\n' not in data):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                chunk = await asyncio.wait_for(reader.read(BANNER_MAX_BYTES - len(data)),
+                                               min(remaining, BANNER_IDLE) if data else remaining)
+            except asyncio.TimeoutError:
+                break
+            if not chunk:
+                break
+            data += chunk
+        return data
+    finally:
+        writer.close()
+
+
+def grab_banners(targets, budget=None):
+    """Identify services on open (ip, port) pairs concurrently
+    
+    Returns {(ip, port): identify_service(...)}; ports that sent nothing
+    inside the caps, or within budget seconds (BANNER_BUDGET by default)
+    for the whole stage, are left out.
+    """
+    budget = BANNER_BUDGET if budget is None else budget
+    
+    async def run():
+        slots = asyncio.Semaphore(BANNER_CONCURRENCY)
+        services = {}
+        
+        async def grab(ip, port):
+            async with slots:
+                try:
+                    data = await _read_banner(ip, port)
+                except (OSError, asyncio.TimeoutError):
+                    return
+                if data:
+                    services[(ip, port)] = identify_service(data)
+        
+        tasks = [asyncio.ensure_future(grab(ip, port)) for ip, port in targets]
+        if tasks:
+            _, late = await asyncio.wait(tasks, timeout=budget)
+            for task in late:
+                task.cancel()
+            await asyncio.gather(*late, return_exceptions=True)
+        return services
+    
+    return asyncio.run(run())
+
+
+# ==================================================================
+# RESPONSE BODIES
+# ==================================================================
+#
+# Pages are kept as bytes. Checks that only look for ASCII markers
+# (technology signatures, listing titles, e-mail addresses) run on the
+# bytes directly; the text is decoded once, on first use, with the
+# charset from a byte-order mark, the Content-Type header, a <meta> or
+# XML declaration, or - failing those - UTF-8 if it decodes cleanly and
+# otherwise a guess (charset_normalizer when installed, else cp1252).
+
+FETCH_MAX_BYTES = int(os.environ.get('FETCH_MAX_BYTES', 2 * 1024 * 1024))
+CHARSET_SNIFF_BYTES = 1024  # Where HTML puts its <meta charset>
+
+_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+_HEADER_CHARSET = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+_DECLARED_CHARSET = re.compile(
+    rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)|<\?xml[^>]+encoding\s*=\s*["\']([\w.:-]+)', re.IGNORECASE
+)
+
+
+def _codec(label):
+    """Python codec name for a charset label, or None if Python has no such codec"""
+    if isinstance(label, bytes):
+        label = label.decode('ascii', 'ignore')
+    try:
+        return codecs.lookup(label.strip()).name
+    except (LookupError, ValueError):
+        return None
+
+
+def declared_charset(raw, content_type=''):
+    """The charset a body announces (BOM, header, then markup), or None"""
+    for bom, name in _BOMS:
+        if raw.startswith(bom):
+            return name
+    match = _HEADER_CHARSET.search(content_type or '')
+    codec = _codec(match.group(1)) if match else None
+    if codec:
+        return codec
+    match = _DECLARED_CHARSET.search(raw[:CHARSET_SNIFF_BYTES])
+    return _codec(match.group(1) or match.group(2)) if match else None
+
+
+class Body:
+    """A response body as bytes, decoded to text at most once and only on demand"""
+    
+    __slots__ = ('raw', 'content_type', '_declared', '_text', '_data', '_lower')
+    
+    def __init__(self, raw, content_type=''):
+        self.raw = raw
+        self.content_type = content_type
+        self._declared = declared_charset(raw, content_type)
+        self._text = None
+        self._data = None
+        self._lower = None
+    
+    def __bool__(self):
+        return bool(self.raw)
+    
+    def __len__(self):
+        return len(self.raw)
+    
+    @property
+    def text(self):
+        if self._text is None:
+            charset = self._declared
+            if charset is None:
+                try:
+                    self._text = self.raw.decode('utf-8')
+                    return self._text
+                except UnicodeDecodeError:
+                    charset = self._guess()
+            self._text = self.raw.decode(charset, 'replace')
+        return self._text
+    
+    def _guess(self):
+        if charset_normalizer is not None:
+            best = charset_normalizer.from_bytes(self.raw).best()
+            if best is not None and _codec(best.encoding):
+                return best.encoding
+        return 'cp1252'
+    
+    @property
+    def data(self):
+        """The body as bytes that ASCII markers can be searched in
+        
+        That is the raw body unless its charset is not ASCII-compatible
+        (UTF-16/32), in which case the text is re-encoded as UTF-8 once.
+        """
+        if self._data is None:
+            if self._declared and self._declared.startswith(('utf-16', 'utf-32')):
+                self._data = self.text.encode('utf-8')
+            else:
+                self._data = self.raw
+        return self._data
+    
+    def lower(self):
+        """data with ASCII letters lowercased, for case-insensitive marker checks"""
+        if self._lower is None:
+            self._lower = self.data.lower()
+        return self._lower
+
+
+# ==================================================================
+# SCAN DEADLINE
+# ==================================================================
+#
+# One wall-clock budget for the whole scan, kept under the function's
+# maxDuration in vercel.json. The long stages take the smaller of their
+# own budget and a share of the time left when they start, so the phases
+# after them always get some; request timeouts are cut to the time left,
+# and once it has run out the remaining phases are skipped and the score
+# is computed from what was gathered.
+
+SCAN_DEADLINE = float(os.environ.get('SCAN_DEADLINE', 50))  # Seconds (maxDuration is 60)
+DISCOVERY_SHARE = 0.5   # Of the time left when discovery starts
+BANNER_SHARE = 0.25     # Of the time left when banner grabbing starts
 
 
 class AegisScanner:
     """Lightweight scanner for Vercel serverless"""
     
-    def __init__(self, target: str):
+    def __init__(self, target: str, bruteforce=False):
         self.target = target
+        self.bruteforce = bruteforce
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0.0.0 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
@@ -105,104 +2587,430 @@ class AegisScanner:
             },
             'security_score': 100
         }
+        self._pages = {}  # url -> (Body, headers) from _fetch
+        self.deadline = None  # monotonic time the scan must end by, set by run()
+    
+    def _budget(self, seconds, share):
+        """Seconds a stage may take: its own budget, cut to a share of the scan time left"""
+        if self.deadline is None:
+            return seconds
+        return max(0.0, min(seconds, (self.deadline - time.monotonic()) * share))
+    
+    def _timeout(self, timeout):
+        """A request timeout that does not run past the scan deadline"""
+        if self.deadline is None:
+            return timeout
+        return max(0.5, min(timeout, self.deadline - time.monotonic()))
     
     def _fetch(self, url, timeout=10):
-        """Make HTTP request using urllib"""
-        try:
-            req = Request(url, headers=self.headers)
-            with urlopen(req, timeout=timeout) as response:
-                return response.read().decode('utf-8'), dict(response.headers)
-        except:
-            return None, {}
+        """GET a page as (Body or None, headers); each URL is fetched once per scan"""
+        if url not in self._pages:
+            try:
+                req = Request(url, headers=self.headers)
+                with open_url(req, timeout=self._timeout(timeout)) as response:
+                    body = Body(response.read(FETCH_MAX_BYTES), response.headers.get('Content-Type', ''))
+                    self._pages[url] = body, dict(response.headers)
+            except Exception:
+                self._pages[url] = None, {}
+        return self._pages[url]
     
     def _fetch_with_headers(self, url, timeout=10):
-        """Make HTTP request and return response with full headers"""
+        """Make HTTP request and return (Body or None, headers, status)"""
         try:
             req = Request(url, headers=self.headers)
-            with urlopen(req, timeout=timeout) as response:
-                return response.read().decode('utf-8'), dict(response.headers), response.status
+            with open_url(req, timeout=self._timeout(timeout)) as response:
+                body = Body(response.read(FETCH_MAX_BYTES), response.headers.get('Content-Type', ''))
+                return body, dict(response.headers), response.status
         except HTTPError as e:
             return None, dict(e.headers) if e.headers else {}, e.code
-        except:
+        except Exception:
             return None, {}, 0
     
-    def run(self):
-        """Execute all scan phases"""
-        self.scan_subdomains()
-        self.probe_hosts()
-        self.fingerprint_tech()
-        self.scan_osint()
-        self.enrich_hosts()
+    # Scan phases, in run order
+    PHASES = (
+        'discover_hosts',
+        'identify_services',
+        'fingerprint_tech',
+        'scan_osint',
+        'enrich_hosts',
         
         # Security checks
-        self.check_security_headers()
-        self.check_ssl_certificate()
-        self.check_robots_txt()
-        self.check_admin_panels()
-        self.check_directory_listing()
-        self.check_cms_cves()
+        'check_security_headers',
+        'check_ssl_certificate',
+        'check_robots_txt',
+        'check_admin_panels',
+        'check_directory_listing',
+        'check_cms_cves',
         
         # NEW OSINT modules
-        self.enumerate_dns_records()
-        self.lookup_whois()
-        self.check_cookie_security()
-        self.check_http_methods()
-        self.check_cors_policy()
+        'enumerate_dns_records',
+        'lookup_whois',
+        'check_cookie_security',
+        'check_http_methods',
+        'check_cors_policy',
+        
+        'calculate_score',
+    )
+    
+    def run(self):
+        """Execute all scan phases within SCAN_DEADLINE; phases left when it passes are skipped"""
+        self.deadline = time.monotonic() + SCAN_DEADLINE
+        skipped = []
+        for phase in self.PHASES:
+            if phase != 'calculate_score' and time.monotonic() >= self.deadline:
+                skipped.append(phase)
+                continue
+            with METRICS.timer('aegis_phase_seconds', phase=phase), trace_span('phase', phase):
+                getattr(self, phase)()
+        self.results['skipped_phases'] = skipped
         
-        self.calculate_score()
+        sources = self.results.setdefault('sources', {})
+        for dependency, outcomes in sources.items():
+            outcomes['breaker'] = BREAKERS[dependency].state
+        self.results['skipped_sources'] = sorted(d for d, outcomes in sources.items() if outcomes.get('skipped'))
         return self.results
     
-    def scan_subdomains(self):
-        """Query crt.sh for certificate transparency logs"""
+    def _source(self, dependency, outcome):
+        """Count a third-party call as ok, failed, skipped (breaker open) or cached"""
+        outcomes = self.results.setdefault('sources', {}).setdefault(dependency, {})
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    
+    def _stale(self, dependency, key):
+        """The source's last good answer for key, if it is still cached"""
+        value = SOURCE_CACHE.get((dependency, key))
+        if value is not None:
+            self._source(dependency, 'cached')
+        return value
+    
+    def _fetch_source(self, dependency, url, timeout=10, headers=None, stale=True):
+        """Fetch from a third-party source through its circuit breaker
+        
+        Returns the body, or with stale=True the last good body for the URL
+        when the breaker is open or the call fails, or None.
+        """
+        breaker = BREAKERS[dependency]
+        if not breaker.allow():
+            self._source(dependency, 'skipped')
+            return self._stale(dependency, url) if stale else None
+        
+        started = time.monotonic()
+        ok, content = False, None
         try:
-            url = f"https://crt.sh/?q=%.{self.target}&output=json"
-            content, _ = self._fetch(url, timeout=15)
-            
-            if content:
-                data = json.loads(content)
-                subdomains = set()
-                for entry in data:
-                    name = entry.get('name_value', '')
-                    for sub in name.split('\n'):
+            req = Request(url, headers=dict(self.headers, **(headers or {})))
+            with open_url(req, timeout=self._timeout(timeout), dependency=dependency) as response:
+                content = response.read().decode('utf-8', 'replace')
+            ok = True
+        except HTTPError as e:
+            ok = e.code < 500  # The source is up; it just has no answer for this query
+        except Exception:
+            pass
+        finally:
+            breaker.record(ok, time.monotonic() - started)
+        
+        if content is not None:
+            SOURCE_CACHE.put((dependency, url), content)
+            self._source(dependency, 'ok')
+            return content
+        self._source(dependency, 'ok' if ok else 'failed')
+        return self._stale(dependency, url) if stale and not ok else None
+    
+    def enumerate_subdomains(self):
+        """Stream subdomains from crt.sh certificate transparency logs
+        
+        Entries are parsed as the response arrives, so downstream stages
+        start on the first names while the rest are still downloading.
+        With the scan history enabled, the names stored for the target are
+        handed out first, certificates up to the last sync's highest id are
+        skipped, and crt.sh is not asked at all within CT_SYNC_INTERVAL of
+        the last sync. New names are merged into the stored set
+        (phases.ct_sync). While the crt.sh breaker is open, or if it fails,
+        the stored names - or without history, the names from the last
+        complete crt.sh answer - are used instead.
+        """
+        index = SCAN_HISTORY
+        state = index.ct_state(self.target) if index is not None else None
+        known = index.known_subdomains(self.target) if state else []
+        sync = self.results['phases']['ct_sync'] = {
+            'known': len(known), 'certificates': 0, 'new_subdomains': [], 'synced': False
+        }
+        if state and time.time() - state[1] < CT_SYNC_INTERVAL:
+            self._source('crt.sh', 'cached')
+            yield from known
+            return
+        
+        url = f"https://crt.sh/?q=%.{self.target}&output=json"
+        breaker = BREAKERS['crt.sh']
+        if not breaker.allow():
+            self._source('crt.sh', 'skipped')
+            if known:
+                yield from known
+                return
+            cached = self._stale('crt.sh', self.target)
+            if cached is None:
+                raise URLError('crt.sh circuit open')
+            yield from cached
+            return
+        
+        # crt.sh has no "certificates after id N" filter for JSON output, so a
+        # sync still downloads the whole answer; only the new entries are parsed
+        yield from known
+        seen = set(known)
+        names, fresh = [], {}
+        max_cert_id = last_id = state[0] if state else 0
+        started = time.monotonic()
+        first_byte = None
+        ok = complete = False
+        try:
+            with open_url(Request(url, headers=self.headers), timeout=15) as response:
+                first_byte = time.monotonic() - started
+                for entry in iter_json_array(response):
+                    if not isinstance(entry, dict):
+                        continue
+                    cert_id = entry.get('id') if isinstance(entry.get('id'), int) else 0
+                    if cert_id and cert_id <= last_id:
+                        continue  # Seen by an earlier sync; its names are stored
+                    max_cert_id = max(max_cert_id, cert_id)
+                    sync['certificates'] += 1
+                    for sub in entry.get('name_value', '').split('\n'):
                         sub = sub.strip().lower()
                         if sub.endswith(self.target) and '*' not in sub:
-                            subdomains.add(sub)
-                
-                self.results['phases']['subdomains'] = list(subdomains)[:50]
-        except:
-            self.results['phases']['subdomains'] = [self.target]
+                            fresh[sub] = None
+                            if sub not in seen:
+                                seen.add(sub)
+                                names.append(sub)
+                                yield sub
+            ok = complete = True
+            if index is None:
+                SOURCE_CACHE.put(('crt.sh', self.target), names)
+        except GeneratorExit:
+            ok = True  # The scan stopped reading (out of budget), not crt.sh's fault
+            raise
+        except Exception:
+            if not known:
+                cached = self._stale('crt.sh', self.target)
+                if cached is None:
+                    raise
+                # Names already handed out are filtered by the caller's seen set
+                yield from cached
+        finally:
+            # Slowness is judged on time to first byte: large answers stream for a while
+            breaker.record(ok, first_byte if first_byte is not None else time.monotonic() - started)
+            self._source('crt.sh', 'ok' if ok else 'failed')
+            if index is not None and (fresh or complete):
+                # A sync cut short still stores its names but not its position
+                try:
+                    added = index.merge_subdomains(self.target, list(fresh), max_cert_id=max_cert_id if complete else None)
+                    sync['synced'] = complete
+                except Exception:
+                    added = []
+                    METRICS.inc('aegis_errors_total', stage='ct_index')
+                if state:
+                    sync['new_subdomains'] = sorted(added)
+    
+    def resolve_host(self, hostname):
+        """Resolve a hostname to its IPv4 and IPv6 addresses, or None"""
+        try:
+            infos = socket.getaddrinfo(hostname, None, socket.AF_UNSPEC, socket.SOCK_STREAM)
+        except (OSError, UnicodeError):
+            return None
+        addresses = []
+        for family, _, _, _, sockaddr in infos:
+            if family in (socket.AF_INET, socket.AF_INET6) and sockaddr[0] not in addresses:
+                addresses.append(sockaddr[0])
+        return (hostname, addresses) if addresses else None
     
-    def probe_hosts(self):
-        """Resolve subdomains and check basic connectivity"""
-        hosts = []
-        domains_to_check = self.results['phases']['subdomains'][:15] or [self.target]
-        common_ports = [80, 443, 22, 21, 8080]
+    def probe_addresses(self, addresses, edge=False):
+        """Check the common ports on a host's addresses, both families at once
         
-        for domain in domains_to_check:
-            try:
-                ip = socket.gethostbyname(domain)
-                open_ports = []
-                
-                for port in common_ports:
-                    try:
-                        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                        sock.settimeout(1)
-                        if sock.connect_ex((ip, port)) == 0:
-                            open_ports.append(port)
-                        sock.close()
-                    except:
-                        pass
-                
-                hosts.append({
-                    'hostname': domain,
-                    'ip': ip,
-                    'ports': open_ports,
-                    'status': 'up' if open_ports else 'filtered'
-                })
-            except:
-                pass
+        CDN edge addresses are shared by thousands of sites and say nothing
+        about the origin: depending on CDN_EDGE_POLICY they get only the web
+        ports, probed a few at a time ('web'), or are not probed ('skip').
+        """
+        if edge and CDN_EDGE_POLICY == 'skip':
+            return {ip: {'family': 'ipv6' if _family(ip) == socket.AF_INET6 else 'ipv4', 'open': [], 'closed': [],
+                         'filtered': [], 'rtt_ms': None, 'timeout_ms': None, 'retried': 0, 'skipped': True}
+                    for ip in addresses}
+        if edge and CDN_EDGE_POLICY == 'web':
+            with EDGE_PROBE_SLOTS, trace_span('probe', 'edge', ' '.join(addresses)):
+                return probe_addresses(addresses, [p for p in PROBE_PORTS if p in EDGE_PORTS])
+        with trace_span('probe', 'origin', ' '.join(addresses)):
+            return probe_addresses(addresses, PROBE_PORTS)
+    
+    def discover_hosts(self):
+        """Enumerate -> resolve -> probe as one streaming pipeline
+        
+        Stages are joined by bounded queues: enumeration blocks when
+        resolvers fall behind, and resolvers block when probers do, so
+        memory stays flat however many subdomains a target has. Work stops
+        at DISCOVERY_BUDGET seconds (or DISCOVERY_SHARE of the scan time
+        left, if less) rather than at a fixed number of names.
+        Each address is probed once and the result is shared by every
+        hostname that resolves to it (phases.ip_groups). Hosts are recorded
+        per address family; ports that answer over IPv6 but not over the
+        host's IPv4 addresses are listed as ipv6_exposed.
+        """
+        started = time.monotonic()
+        deadline = started + self._budget(DISCOVERY_BUDGET, DISCOVERY_SHARE)
+        names = queue.Queue(DISCOVERY_QUEUE_SIZE)
+        resolved = queue.Queue(DISCOVERY_QUEUE_SIZE)
+        subdomains, hosts = [], []
+        seen = set()
+        seen_lock = threading.Lock()
+        
+        def claim(name):
+            """First sighting of a name from any source"""
+            with seen_lock:
+                if name in seen:
+                    return False
+                seen.add(name)
+                subdomains.append(name)
+                return True
+        
+        # Hostnames behind one CDN or load-balancer address share a single probe
+        ip_groups, probes, providers, host_addresses = {}, {}, {}, {}
+        group_lock = threading.Lock()
+        
+        def probe_once(item):
+            hostname, addresses = item
+            with group_lock:
+                new = [ip for ip in addresses if ip not in ip_groups]
+                for ip in addresses:
+                    ip_groups.setdefault(ip, []).append(hostname)
+                host_addresses[hostname] = addresses
+            for ip in new:
+                providers[ip] = IP_RANGES.lookup(ip)
+            edge = [ip for ip in new if providers[ip] and providers[ip][1] == 'cdn']
+            origin = [ip for ip in new if ip not in edge]
+            if origin:
+                probes.update(self.probe_addresses(origin))
+            if edge:
+                probes.update(self.probe_addresses(edge, edge=True))
+        
+        resolvers = PipelineStage(self.resolve_host, names, resolved.put, DISCOVERY_RESOLVERS, deadline)
+        probers = PipelineStage(probe_once, resolved, None, DISCOVERY_PROBERS, deadline)
+        
+        # Brute force runs beside crt.sh; its names arrive already resolved
+        bruteforce, brute_thread = {}, None
+        if self.bruteforce:
+            def on_found(name, addresses):
+                if claim(name):
+                    resolved.put((name, addresses))
+            
+            def run_bruteforce():
+                try:
+                    with trace_span('dns', 'bruteforce'):
+                        bruteforce.update(dns_bruteforce(self.target, on_found=on_found, deadline=deadline))
+                except Exception as e:
+                    bruteforce['error'] = str(e)
+            
+            brute_thread = scan_thread(run_bruteforce)
+            brute_thread.start()
+        
+        complete = True
+        ct_failed = False
+        try:
+            for sub in self.enumerate_subdomains():
+                if time.monotonic() >= deadline:
+                    complete = False
+                    break
+                if claim(sub):
+                    names.put(sub)
+        except Exception:
+            ct_failed = True
+        
+        if brute_thread is not None:
+            brute_thread.join()
+            for outcome in ('queries', 'timeouts', 'truncated', 'servfail'):
+                METRICS.inc('aegis_dns_queries_total', bruteforce.get(outcome, 0), outcome=outcome)
         
-        self.results['phases']['hosts'] = hosts
+        if not subdomains:
+            if ct_failed:
+                claim(self.target)
+            names.put(self.target)  # Nothing discovered: still probe the apex
+        
+        resolvers.close()
+        probers.close()
+        
+        for hostname, addresses in host_addresses.items():
+            probed = [ip for ip in addresses if ip in probes]
+            if not probed:
+                continue  # Out of budget before this host was probed
+            families = {}
+            for ip in probed:
+                family = families.setdefault(probes[ip]['family'], {'addresses': [], 'ports': []})
+                family['addresses'].append(ip)
+                family['ports'].extend(p for p in probes[ip]['open'] if p not in family['ports'])
+            ports = [p for p in PROBE_PORTS if any(p in f['ports'] for f in families.values())]
+            v4_ports = families.get('ipv4', {}).get('ports')
+            
+            ip = (families.get('ipv4') or families['ipv6'])['addresses'][0]
+            tag = providers.get(ip)
+            hosts.append({
+                'hostname': hostname,
+                'ip': ip,
+                'ports': ports,
+                'status': 'edge' if probes[ip].get('skipped') else 'up' if ports else 'filtered',
+                'rtt_ms': probes[ip]['rtt_ms'],
+                'provider': tag[0] if tag else None,
+                'edge': tag is not None and tag[1] == 'cdn',
+                'families': families,
+                'ipv6_exposed': [p for p in families.get('ipv6', {}).get('ports', []) if p not in v4_ports]
+                                if v4_ports is not None else []
+            })
+        
+        self.results['phases']['subdomains'] = sorted(subdomains)
+        self.results['phases']['hosts'] = sorted(hosts, key=lambda h: h['hostname'])
+        self.results['phases']['ip_groups'] = [
+            {'ip': ip, 'family': 'ipv6' if _family(ip) == socket.AF_INET6 else 'ipv4',
+             'hostnames': sorted(ip_groups[ip]), 'provider': (providers.get(ip) or (None,))[0]}
+            for ip in sorted(ip_groups)
+        ]
+        self.results['phases']['discovery'] = {
+            'enumerated': len(subdomains),
+            'resolved': resolvers.processed,
+            'unique_ips': len(ip_groups),
+            'ipv6_ips': sum(1 for ip in ip_groups if _family(ip) == socket.AF_INET6),
+            'edge_ips': sum(1 for tag in providers.values() if tag and tag[1] == 'cdn'),
+            'probed': len(probes),
+            'complete': complete and time.monotonic() < deadline,
+            'elapsed_ms': round((time.monotonic() - started) * 1000)
+        }
+        if self.bruteforce:
+            self.results['phases']['discovery']['bruteforce'] = {
+                'found': len(bruteforce.get('found', {})),
+                'wildcard': bruteforce.get('wildcard', []),
+                **{k: bruteforce[k] for k in ('queries', 'timeouts', 'truncated', 'servfail', 'error') if k in bruteforce}
+            }
+    
+    def identify_services(self):
+        """Grab banners from open ports and name the service behind each
+        
+        CDN edges are skipped: their banners belong to the CDN, not the target.
+        """
+        targets = {}
+        for host in self.results['phases']['hosts']:
+            if host.get('edge'):
+                continue
+            for family in host.get('families', {}).values():
+                for ip in family['addresses']:
+                    targets.update(((ip, port), None) for port in family['ports'] if port not in BANNER_SKIP_PORTS)
+        
+        try:
+            services = grab_banners(targets, self._budget(BANNER_BUDGET, BANNER_SHARE))
+        except Exception:
+            services = {}
+        
+        for host in self.results['phases']['hosts']:
+            found = {}
+            for family in host.get('families', {}).values():
+                for ip in family['addresses']:
+                    for port in family['ports']:
+                        if (ip, port) in services and port not in found:
+                            found[port] = dict(services[(ip, port)], port=port)
+            if found:
+                host['services'] = [found[port] for port in sorted(found)]
+        
+        self.results['phases']['banners'] = {'grabbed': len(targets), 'identified': len(services)}
     
     def fingerprint_tech(self):
         """Detect technologies from HTTP headers and HTML"""
@@ -213,7 +3021,7 @@ class AegisScanner:
             content, headers = self._fetch(url)
             
             if content:
-                html = content.lower()
+                html = content.lower()  # Lowercased bytes: the signatures are ASCII
                 
                 # Header-based detection
                 server = headers.get('Server', '')
@@ -226,22 +3034,22 @@ class AegisScanner:
                 
                 # HTML-based detection
                 tech_signatures = {
-                    'wordpress': 'WordPress',
-                    'wp-content': 'WordPress',
-                    'drupal': 'Drupal',
-                    'joomla': 'Joomla',
-                    'shopify': 'Shopify',
-                    'wix': 'Wix',
-                    'squarespace': 'Squarespace',
-                    'react': 'React',
-                    'angular': 'Angular',
-                    'vue': 'Vue.js',
-                    'bootstrap': 'Bootstrap',
-                    'tailwind': 'Tailwind CSS',
-                    'jquery': 'jQuery',
-                    'cloudflare': 'Cloudflare',
-                    'google-analytics': 'Google Analytics',
-                    'gtag': 'Google Tag Manager'
+                    b'wordpress': 'WordPress',
+                    b'wp-content': 'WordPress',
+                    b'drupal': 'Drupal',
+                    b'joomla': 'Joomla',
+                    b'shopify': 'Shopify',
+                    b'wix': 'Wix',
+                    b'squarespace': 'Squarespace',
+                    b'react': 'React',
+                    b'angular': 'Angular',
+                    b'vue': 'Vue.js',
+                    b'bootstrap': 'Bootstrap',
+                    b'tailwind': 'Tailwind CSS',
+                    b'jquery': 'jQuery',
+                    b'cloudflare': 'Cloudflare',
+                    b'google-analytics': 'Google Analytics',
+                    b'gtag': 'Google Tag Manager'
                 }
                 
                 for sig, name in tech_signatures.items():
@@ -262,10 +3070,10 @@ class AegisScanner:
             content, _ = self._fetch(url)
             
             if content:
-                email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-                found = re.findall(email_pattern, content)
+                email_pattern = rb'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
+                found = re.findall(email_pattern, content.data)
                 
-                for email in found:
+                for email in (match.decode('ascii') for match in found):
                     if not any(x in email.lower() for x in ['example.com', 'domain.com', 'email.com', '.png', '.jpg', '.gif']):
                         emails.add(email.lower())
         except:
@@ -284,7 +3092,7 @@ class AegisScanner:
                 ip = host.get('ip')
                 if ip:
                     url = f"https://ipinfo.io/{ip}?token={token}"
-                    content, _ = self._fetch(url, timeout=5)
+                    content = self._fetch_source('ipinfo', url, timeout=5)
                     if content:
                         data = json.loads(content)
                         host['geo'] = {
@@ -481,7 +3289,7 @@ class AegisScanner:
                 
                 sensitive_found = []
                 
-                for line in content.split('\n'):
+                for line in content.text.split('\n'):
                     line = line.strip().lower()
                     if line.startswith('disallow:'):
                         path = line.replace('disallow:', '').strip()
@@ -570,11 +3378,11 @@ class AegisScanner:
                         if status == 200 and content:
                             # Check for directory listing indicators
                             listing_indicators = [
-                                'Index of', 'Directory listing', '<title>Index of',
-                                'Parent Directory', '[DIR]', '[To Parent Directory]'
+                                b'Index of', b'Directory listing', b'<title>Index of',
+                                b'Parent Directory', b'[DIR]', b'[To Parent Directory]'
                             ]
                             
-                            if any(indicator in content for indicator in listing_indicators):
+                            if any(indicator in content.data for indicator in listing_indicators):
                                 self.results['directory_listing']['vulnerable'] = True
                                 self.results['directory_listing']['exposed_dirs'].append(dir_path)
                                 break
@@ -641,6 +3449,17 @@ class AegisScanner:
                             'description': vuln['desc']
                         })
         
+        # Services identified from port banners, by version range
+        seen = set()
+        for host in self.results['phases'].get('hosts', []):
+            for service in host.get('services', []):
+                name = f"{service.get('product')}/{service.get('version')}".lower()
+                if name in seen:
+                    continue
+                seen.add(name)
+                for vuln in service_cves(service.get('product'), service.get('version')):
+                    cves.append({'technology': name, **vuln})
+        
         self.results['known_cves'] = cves
 
     # ==================================================================
@@ -654,8 +3473,20 @@ class AegisScanner:
         
         for rtype in record_types:
             try:
-                url = f"https://dns.google/resolve?name={self.target}&type={rtype}"
-                content, _ = self._fetch(url, timeout=5)
+                # Live answer from the first provider that gives one, then a cached one
+                urls = [(dependency, template.format(name=self.target, rtype=rtype))
+                        for dependency, template in DOH_PROVIDERS]
+                content = None
+                for dependency, url in urls:
+                    content = self._fetch_source(dependency, url, timeout=5,
+                                                 headers={'Accept': 'application/dns-json'}, stale=False)
+                    if content:
+                        break
+                for dependency, url in urls:
+                    if content:
+                        break
+                    content = self._stale(dependency, url)
+                
                 if content:
                     data = json.loads(content)
                     for answer in data.get('Answer', []):
@@ -679,7 +3510,7 @@ class AegisScanner:
         try:
             # Use RDAP (Registration Data Access Protocol) - the modern WHOIS
             url = f"https://rdap.org/domain/{self.target}"
-            content, _ = self._fetch(url, timeout=8)
+            content = self._fetch_source('rdap.org', url, timeout=8)
             
             if content:
                 data = json.loads(content)
@@ -807,7 +3638,7 @@ class AegisScanner:
             
             try:
                 req = Request(url, headers=self.headers, method='OPTIONS')
-                with urlopen(req, timeout=5) as response:
+                with open_url(req, timeout=5) as response:
                     allow = response.headers.get('Allow', '')
                     if allow:
                         methods = [m.strip().upper() for m in allow.split(',')]
@@ -828,7 +3659,7 @@ class AegisScanner:
             for method in test_methods:
                 try:
                     req = Request(url, headers=self.headers, method=method)
-                    with urlopen(req, timeout=3) as response:
+                    with open_url(req, timeout=3) as response:
                         if response.status < 500:
                             allowed.append(method)
                             if method in ['PUT', 'DELETE', 'TRACE', 'CONNECT']:
@@ -868,7 +3699,7 @@ class AegisScanner:
             
             try:
                 req = Request(url, headers=test_headers)
-                with urlopen(req, timeout=5) as response:
+                with open_url(req, timeout=5) as response:
                     acao = response.headers.get('Access-Control-Allow-Origin', '')
                     
                     if acao == '*':
@@ -904,243 +3735,14 @@ class AegisScanner:
         IMPORTANT: This is a PASSIVE reconnaissance score, not a vulnerability assessment.
         A high score means low VISIBLE exposure, not necessarily secure infrastructure.
         True security requires active vulnerability scanning and penetration testing.
-        """
-        # Start at 70 - baseline for unknown (not 100, as we can't verify security)
-        score = 70
-        phases = self.results['phases']
-        findings = []  # Track what affected the score
-        
-        # ========== POSITIVE FACTORS (add points) ==========
-        
-        # HTTPS enabled (+10)
-        if any(443 in host.get('ports', []) for host in phases['hosts']):
-            score += 10
-            findings.append('+10: HTTPS enabled')
-        
-        # Modern security headers detected via technologies
-        tech_names = [t.get('name', '').lower() for t in phases.get('technologies', [])]
-        if any('cloudflare' in t or 'akamai' in t or 'fastly' in t for t in tech_names):
-            score += 5
-            findings.append('+5: CDN/WAF detected')
-        
-        # Limited attack surface (few subdomains)
-        subdomain_count = len(phases.get('subdomains', []))
-        if subdomain_count <= 3:
-            score += 5
-            findings.append('+5: Minimal subdomain exposure')
-        
-        # No exposed emails
-        if not phases['osint']['emails']:
-            score += 5
-            findings.append('+5: No exposed email addresses')
-        
-        # ========== NEGATIVE FACTORS (deduct points) ==========
-        
-        # Exposed email addresses (-5 each, max -15)
-        email_count = len(phases['osint']['emails'])
-        if email_count > 0:
-            deduction = min(email_count * 3, 10)
-            score -= deduction
-            findings.append(f'-{deduction}: {email_count} exposed emails')
-        
-        # Risky open ports (reduced penalties)
-        risky_ports = {
-            21: (8, 'FTP - cleartext credentials'),
-            22: (3, 'SSH - potential brute-force target'),
-            23: (15, 'Telnet - critical, cleartext protocol'),
-            25: (3, 'SMTP - potential spam relay'),
-            3306: (10, 'MySQL - database exposed'),
-            5432: (10, 'PostgreSQL - database exposed'),
-            1433: (10, 'MSSQL - database exposed'),
-            3389: (10, 'RDP - ransomware target'),
-            5900: (8, 'VNC - screen sharing exposed'),
-            6379: (10, 'Redis - database exposed'),
-            27017: (10, 'MongoDB - database exposed'),
-        }
-        
-        for host in phases['hosts']:
-            for port in host.get('ports', []):
-                if port in risky_ports:
-                    deduction, reason = risky_ports[port]
-                    score -= deduction
-                    findings.append(f'-{deduction}: Port {port} ({reason})')
-        
-        # HTTP without HTTPS (-8)
-        has_http = any(80 in host.get('ports', []) for host in phases['hosts'])
-        has_https = any(443 in host.get('ports', []) for host in phases['hosts'])
-        if has_http and not has_https:
-            score -= 8
-            findings.append('-8: HTTP only, no HTTPS detected')
-        
-        # Outdated software detection (reduced to -5)
-        outdated_indicators = ['openssl/1.0', 'php/5.', 'php/7.0', 'php/7.1', 'php/7.2', 
-                               'apache/2.2', 'nginx/1.1', 'jquery/1.', 'jquery/2.']
-        outdated_found = 0
-        for tech in phases.get('technologies', []):
-            tech_name = tech.get('name', '').lower()
-            for indicator in outdated_indicators:
-                if indicator in tech_name and outdated_found < 2:  # Max 2 outdated penalties
-                    score -= 5
-                    outdated_found += 1
-                    findings.append(f'-5: Outdated software ({tech.get("name")})')
-                    break
-        
-        # Large subdomain footprint increases attack surface
-        if subdomain_count > 10:
-            deduction = min((subdomain_count - 10) * 1, 10)
-            score -= deduction
-            findings.append(f'-{deduction}: Large attack surface ({subdomain_count} subdomains)')
-        
-        # ========== NEW SECURITY CHECK FACTORS ==========
-        
-        # Security Headers Grade (reduced penalties)
-        headers_grade = self.results.get('security_headers', {}).get('grade', 'F')
-        if headers_grade == 'A':
-            score += 10
-            findings.append('+10: Excellent security headers (Grade A)')
-        elif headers_grade == 'B':
-            score += 5
-            findings.append('+5: Good security headers (Grade B)')
-        elif headers_grade == 'C':
-            pass  # Neutral
-        elif headers_grade in ['D', 'F']:
-            score -= 5
-            findings.append(f'-5: Poor security headers (Grade {headers_grade})')
-        
-        # SSL Certificate
-        ssl_info = self.results.get('ssl_info', {})
-        if ssl_info.get('valid'):
-            if ssl_info.get('is_expired'):
-                score -= 15
-                findings.append('-15: SSL certificate is expired')
-            elif ssl_info.get('days_until_expiry', 999) < 30:
-                score -= 3
-                findings.append('-3: SSL certificate expiring soon')
-            else:
-                score += 5
-                findings.append('+5: Valid SSL certificate')
-            
-            # Check TLS version
-            tls_version = ssl_info.get('tls_version', '')
-            if 'TLSv1.0' in tls_version or 'TLSv1.1' in tls_version:
-                score -= 5
-                findings.append(f'-5: Outdated TLS version ({tls_version})')
-        
-        # Admin Panels Exposed (reduced)
-        admin_panels = self.results.get('admin_panels', {}).get('found', [])
-        accessible_panels = [p for p in admin_panels if p.get('accessible')]
-        if accessible_panels:
-            deduction = min(len(accessible_panels) * 5, 10)
-            score -= deduction
-            findings.append(f'-{deduction}: {len(accessible_panels)} admin panel(s) accessible')
-        
-        # Directory Listing (reduced)
-        if self.results.get('directory_listing', {}).get('vulnerable'):
-            exposed_count = len(self.results['directory_listing'].get('exposed_dirs', []))
-            score -= 8
-            findings.append(f'-8: Directory listing enabled ({exposed_count} dirs exposed)')
-        
-        # Known CVEs (reduced and deduplicated)
-        cves = self.results.get('known_cves', [])
-        # Deduplicate by CVE ID
-        seen_cves = set()
-        unique_cves = []
-        for c in cves:
-            if c.get('cve') not in seen_cves:
-                seen_cves.add(c.get('cve'))
-                unique_cves.append(c)
-        
-        critical_cves = [c for c in unique_cves if c.get('severity') == 'Critical']
-        high_cves = [c for c in unique_cves if c.get('severity') == 'High']
-        
-        if critical_cves:
-            deduction = min(len(critical_cves) * 8, 15)
-            score -= deduction
-            findings.append(f'-{deduction}: {len(critical_cves)} critical CVE(s) detected')
-        if high_cves:
-            deduction = min(len(high_cves) * 5, 10)
-            score -= deduction
-            findings.append(f'-{deduction}: {len(high_cves)} high severity CVE(s) detected')
-        
-        # Robots.txt sensitive paths (minor penalty)
-        sensitive_paths = self.results.get('robots_txt', {}).get('sensitive_paths', [])
-        if len(sensitive_paths) > 5:
-            score -= 3
-            findings.append('-3: Many sensitive paths in robots.txt')
-        
-        # ========== NEW MODULE FACTORS ==========
-        
-        # Cookie security
-        cookies = self.results.get('cookie_security', {}).get('cookies', [])
-        insecure_cookies = [c for c in cookies if not c.get('secure') or not c.get('httponly')]
-        if insecure_cookies:
-            deduction = min(len(insecure_cookies) * 2, 6)
-            score -= deduction
-            findings.append(f'-{deduction}: {len(insecure_cookies)} cookie(s) missing security flags')
-        
-        # HTTP risky methods
-        risky_methods = self.results.get('http_methods', {}).get('risky_methods', [])
-        if risky_methods:
-            score -= 4
-            findings.append(f'-4: Risky HTTP methods enabled ({", ".join(risky_methods)})')
-        
-        # CORS misconfiguration
-        cors = self.results.get('cors_check', {})
-        if cors.get('wildcard_origin'):
-            score -= 6
-            findings.append('-6: Wildcard CORS policy (Access-Control-Allow-Origin: *)')
-        elif cors.get('reflects_origin'):
-            score -= 8
-            findings.append('-8: CORS reflects arbitrary origins (critical misconfiguration)')
-        
-        # WHOIS: domain expiry warning
-        whois = self.results.get('whois_info', {})
-        if whois.get('expiry_date'):
-            try:
-                from datetime import datetime
-                exp = datetime.strptime(whois['expiry_date'], '%Y-%m-%d')
-                days_left = (exp - datetime.now()).days
-                if days_left < 30:
-                    score -= 3
-                    findings.append(f'-3: Domain expires in {days_left} days')
-            except:
-                pass
         
-        # DNSSEC bonus
-        if whois.get('dnssec') == 'Signed':
-            score += 3
-            findings.append('+3: DNSSEC enabled')
-        
-        # DNS: SPF/DMARC check
-        dns_records = self.results.get('dns_records', [])
-        has_spf = any('spf' in r.get('value', '').lower() for r in dns_records if r.get('type') == 'TXT')
-        has_dmarc = any('dmarc' in r.get('value', '').lower() for r in dns_records if r.get('type') == 'TXT')
-        if has_spf:
-            score += 3
-            findings.append('+3: SPF record present')
-        if has_dmarc:
-            score += 3
-            findings.append('+3: DMARC record present')
-        if not has_spf and not has_dmarc:
-            score -= 4
-            findings.append('-4: No SPF/DMARC email security records')
-        
-        # ========== MINIMUM SCORE ==========
-        # Don't go below 15 - that's critical exposure
-        score = max(15, score)
-        
-        # ========== UNCERTAINTY PENALTY ==========
-        # If we detected very little, cap at 75
-        tech_count = len(phases.get('technologies', []))
-        host_count = len(phases.get('hosts', []))
-        
-        if tech_count == 0 and host_count <= 1:
-            score = min(score, 75)
-            findings.append('Cap at 75: Limited reconnaissance data')
+        The weights live in DEFAULT_SCORING_RULES (or SCORING_RULES_FILE).
+        """
+        score, findings = score_result(self.results, rules=SCORING_RULES, now=datetime.now())
         
         # Store findings for potential use in reports
         self.results['score_factors'] = findings
-        self.results['security_score'] = max(0, min(100, score))
+        self.results['security_score'] = score
         
         # Add disclaimer
         self.results['score_disclaimer'] = (
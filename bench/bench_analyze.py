@@ -0,0 +1,183 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════╗
+║                            AEGIS RECON                                     ║
+║              Advanced Threat Intelligence System                           ║
+╠═══════════════════════════════════════════════════════════════════════════╣
+║  Author: VexSpitta                                                         ║
+║  GitHub: https://github.com/Vexx-bit                                       ║
+║  Project: https://github.com/Vexx-bit/Aegis-Recon                         ║
+║                                                                            ║
+║  © 2024-2026 VexSpitta. All Rights Reserved.                              ║
+║  Unauthorized copying, modification, or distribution is prohibited.       ║
+╚═══════════════════════════════════════════════════════════════════════════╝
+
+Aegis Recon - /api/analyze Benchmark & Load Harness
+Runs the analyze handler behind a local threaded HTTP server with GROQ
+pointed at a stand-in LLM server, then fires concurrent requests over a
+synthetic scan corpus. Fully offline.
+
+    python bench/bench_analyze.py --concurrency 50 --requests 200
+    python bench/bench_analyze.py --mode stream --latency 0.3 --tps 200
+    python bench/bench_analyze.py --mode hedge --deadline-ms 500
+    python bench/bench_analyze.py --repeat          # identical payloads: cache + single-flight
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from llm_stub import StubLLMServer
+from scan_corpus import SIZES, make_scan_result
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(label, samples):
+    ms = [s * 1000 for s in samples]
+    return (f"{label:<22} n={len(ms):<5} p50={percentile(ms, 50):8.1f}ms  p95={percentile(ms, 95):8.1f}ms  "
+            f"p99={percentile(ms, 99):8.1f}ms  max={max(ms) if ms else 0:8.1f}ms")
+
+
+def post_analyze(port, payload):
+    """POST one analysis; returns (status, time to first body byte, total time, model)"""
+    body = json.dumps(payload).encode('utf-8')
+    started = time.perf_counter()
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    try:
+        conn.request('POST', '/', body=body, headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        first = response.read(1)
+        ttfb = time.perf_counter() - started
+        rest = response.read()
+        total = time.perf_counter() - started
+    finally:
+        conn.close()
+    
+    text = (first + rest).decode('utf-8', errors='replace')
+    model = None
+    if payload.get('stream'):
+        for line in text.splitlines():
+            if line.startswith('data:') and '"model"' in line:
+                model = json.loads(line[5:]).get('model')
+    else:
+        try:
+            model = json.loads(text).get('analysis', {}).get('model')
+        except ValueError:
+            pass
+    return response.status, ttfb, total, model
+
+
+def run_load(port, sizes, args):
+    """Fire args.requests analyses at args.concurrency and report latency per size"""
+    jobs = []
+    for i in range(args.requests):
+        size = sizes[i % len(sizes)]
+        seed = 0 if args.repeat else i
+        payload = {'results': make_scan_result(size, seed)}
+        if args.mode == 'stream':
+            payload['stream'] = True
+        elif args.mode == 'hedge':
+            payload['deadline_ms'] = args.deadline_ms
+        jobs.append((size, payload))
+    
+    results = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [(size, pool.submit(post_analyze, port, payload)) for size, payload in jobs]
+        for size, future in futures:
+            results.append((size, future.result()))
+    elapsed = time.perf_counter() - started
+    
+    print(f"\n== Load: mode={args.mode} concurrency={args.concurrency} requests={args.requests} "
+          f"repeat={args.repeat} ==")
+    print(f"throughput: {len(results) / elapsed:.1f} req/s over {elapsed:.2f}s")
+    errors = sum(1 for _, (status, *_rest) in results if status != 200)
+    models = {}
+    for _, (_, _, _, model) in results:
+        models[model] = models.get(model, 0) + 1
+    print(f"errors: {errors}  models: {models}")
+    
+    for size in sizes:
+        subset = [r for s, r in results if s == size]
+        print(summarize(f"{size} total", [r[2] for r in subset]))
+        print(summarize(f"{size} ttfb", [r[1] for r in subset]))
+    print(summarize('all total', [r[2] for _, r in results]))
+    print(summarize('all ttfb', [r[1] for _, r in results]))
+
+
+def run_fallback_bench(analyze, sizes, iterations):
+    """CPU cost of the rule-based report and of prompt planning, no network"""
+    print(f"\n== Local cost per call ({iterations} iterations) ==")
+    for size in sizes:
+        result = make_scan_result(size, 0)
+        fallback, planning = [], []
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            analyze.handler.generate_fallback_analysis(None, result)
+            t1 = time.perf_counter()
+            analyze.plan_analysis(result)
+            t2 = time.perf_counter()
+            fallback.append(t1 - t0)
+            planning.append(t2 - t1)
+        print(summarize(f"{size} fallback", fallback))
+        print(summarize(f"{size} plan+prompt", planning))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark for /api/analyze')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--sizes', default=','.join(SIZES), help='comma-separated corpus sizes')
+    parser.add_argument('--mode', choices=['plain', 'stream', 'hedge'], default='plain')
+    parser.add_argument('--deadline-ms', type=int, default=500)
+    parser.add_argument('--repeat', action='store_true', help='send identical payloads per size')
+    parser.add_argument('--latency', type=float, default=0.5, help='stub LLM seconds to first token')
+    parser.add_argument('--tps', type=float, default=400, help='stub LLM tokens per second')
+    parser.add_argument('--tokens', type=int, default=600, help='stub LLM tokens per completion')
+    parser.add_argument('--fallback-iterations', type=int, default=50)
+    parser.add_argument('--no-load', action='store_true', help='only run the local cost benchmark')
+    args = parser.parse_args()
+    sizes = [s.strip() for s in args.sizes.split(',') if s.strip()]
+    
+    stub = StubLLMServer(latency=args.latency, tokens_per_second=args.tps, completion_tokens=args.tokens).start()
+    
+    # analyze reads its configuration at import time
+    os.environ['GROQ_API_KEY'] = 'bench-key'
+    os.environ['GROQ_API_URL'] = stub.url
+    import analyze
+    
+    run_fallback_bench(analyze, sizes, args.fallback_iterations)
+    
+    if not args.no_load:
+        server = ThreadingHTTPServer(('127.0.0.1', 0), analyze.handler)
+        server.daemon_threads = True
+        server.request_queue_size = max(128, args.concurrency * 2)
+        analyze.handler.log_message = lambda *a: None
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            run_load(server.server_address[1], sizes, args)
+            print(f"upstream LLM requests: {stub.requests}")
+        finally:
+            server.shutdown()
+    
+    stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════╗
+║                            AEGIS RECON                                     ║
+║              Advanced Threat Intelligence System                           ║
+╠═══════════════════════════════════════════════════════════════════════════╣
+║  Author: VexSpitta                                                         ║
+║  GitHub: https://github.com/Vexx-bit                                       ║
+║  Project: https://github.com/Vexx-bit/Aegis-Recon                         ║
+║                                                                            ║
+║  © 2024-2026 VexSpitta. All Rights Reserved.                              ║
+║  Unauthorized copying, modification, or distribution is prohibited.       ║
+╚═══════════════════════════════════════════════════════════════════════════╝
+
+
+Aegis Recon - DNS Brute-Force Benchmark
+Runs dns_bruteforce against the stand-in DNS server with a synthetic
+wordlist and checks what it finds: a plain zone, a wildcard zone, and a
+lossy zone with truncated answers.
+
+    python bench/bench_dns.py --words 20000 --inflight 1000 --latency 0.02
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import scan
+from dns_stub import StubDNSServer
+
+ZONE = 'bench.example'
+
+
+def write_wordlist(words):
+    fd, path = tempfile.mkstemp(prefix='aegis-words-', suffix='.txt')
+    with os.fdopen(fd, 'w') as f:
+        f.write('# synthetic\n')
+        for i in range(words):
+            f.write(f"host{i}\n")
+    return path
+
+
+def run(label, server, wordlist, expected, inflight, timeout):
+    with server:
+        started = time.perf_counter()
+        result = scan.dns_bruteforce(ZONE, wordlist=wordlist, resolvers=[server.address],
+                                     max_inflight=inflight, timeout=timeout)
+        elapsed = time.perf_counter() - started
+    
+    found = set(result['found'])
+    status = 'ok' if found == expected else f"MISMATCH (missing {len(expected - found)}, extra {len(found - expected)})"
+    print(f"{label:<22} {elapsed:6.2f}s  {result['queries'] / elapsed:8.0f} q/s  found {len(found):5d}  "
+          f"timeouts {result['timeouts']:4d}  truncated {result['truncated']:3d}  "
+          f"wildcard {len(result['wildcard'])}  {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark DNS brute-force discovery against a local DNS stub')
+    parser.add_argument('--words', type=int, default=20000)
+    parser.add_argument('--exists', type=int, default=500, help='names in the wordlist that exist')
+    parser.add_argument('--inflight', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.02, help='stub answer latency (seconds)')
+    parser.add_argument('--timeout', type=float, default=0.5, help='per-attempt query timeout (seconds)')
+    args = parser.parse_args()
+    
+    wordlist = write_wordlist(args.words)
+    step = max(1, args.words // args.exists)
+    real = {f"host{i}.{ZONE}": [f"10.1.{i // 256 % 256}.{i % 256}"] for i in range(0, args.words, step)}
+    expected = set(real)
+    
+    try:
+        run('plain', StubDNSServer(ZONE, real, latency=args.latency), wordlist, expected,
+            args.inflight, args.timeout)
+        run('wildcard', StubDNSServer(ZONE, real, wildcard='10.9.9.9', latency=args.latency), wordlist, expected,
+            args.inflight, args.timeout)
+        lossy = StubDNSServer(ZONE, real, truncate=list(real)[::10], drop_rate=0.05, latency=args.latency)
+        run('5% loss + truncation', lossy, wordlist, expected, args.inflight, args.timeout)
+    finally:
+        os.remove(wordlist)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════╗
+║                            AEGIS RECON                                     ║
+║              Advanced Threat Intelligence System                           ║
+╠═══════════════════════════════════════════════════════════════════════════╣
+║  Author: VexSpitta                                                         ║
+║  GitHub: https://github.com/Vexx-bit                                       ║
+║  Project: https://github.com/Vexx-bit/Aegis-Recon                         ║
+║                                                                            ║
+║  © 2024-2026 VexSpitta. All Rights Reserved.                              ║
+║  Unauthorized copying, modification, or distribution is prohibited.       ║
+╚═══════════════════════════════════════════════════════════════════════════╝
+
+Aegis Recon - Scan History Benchmark
+Fills a throwaway ScanHistory database with synthetic scans spread over
+a year and times the trend / cross-domain queries.
+
+    python bench/bench_history.py --scans 1000000 --domains 50000
+"""
+
+from datetime import datetime, timedelta, timezone
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import scan
+from scan_corpus import make_scan_result
+
+
+def synthetic_scans(count, domains, seed=0):
+    """Small scan results for `domains` names, spread over the past year in time order"""
+    rng = random.Random(seed)
+    templates = [make_scan_result('small', s) for s in range(8)]
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    for i in range(count):
+        result = dict(rng.choice(templates))
+        result['target'] = f"domain{rng.randrange(domains)}.example"
+        result['timestamp'] = (start + timedelta(seconds=i * 365 * 86400 // count)).isoformat()
+        result['security_score'] = rng.randint(15, 100)
+        result['whois_info'] = {'dnssec': 'Signed' if rng.random() < 0.7 else 'Unsigned'}
+        result['known_cves'] = [{'cve': f"CVE-2024-{rng.randrange(500):04d}", 'severity': 'High', 'technology': 'x'}
+                                for _ in range(rng.randint(0, 2))]
+        result['phases'] = dict(result['phases'], hosts=[{'hostname': result['target'], 'ip': '10.0.0.1',
+                                                          'ports': rng.sample([21, 22, 80, 443, 3306, 8080], 2)}])
+        yield result
+
+
+def timed(label, fn, repeat=5):
+    best, rows = float('inf'), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = fn()
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<44} {best * 1000:9.2f} ms  ({len(rows)} rows)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ScanHistory queries')
+    parser.add_argument('--scans', type=int, default=200000)
+    parser.add_argument('--domains', type=int, default=10000)
+    parser.add_argument('--batch', type=int, default=5000)
+    parser.add_argument('--db', help='database path (default: a temporary file)')
+    args = parser.parse_args()
+    
+    path = args.db or os.path.join(tempfile.mkdtemp(prefix='aegis-history-'), 'history.db')
+    history = scan.ScanHistory(path)
+    
+    started = time.perf_counter()
+    batch = []
+    for result in synthetic_scans(args.scans, args.domains):
+        batch.append(result)
+        if len(batch) >= args.batch:
+            history.record_many(batch)
+            batch = []
+    if batch:
+        history.record_many(batch)
+    elapsed = time.perf_counter() - started
+    print(f"inserted {args.scans} scans over {args.domains} domains in {elapsed:.1f}s "
+          f"({args.scans / elapsed:.0f}/s), db size {os.path.getsize(path) / 1e6:.1f} MB")
+    
+    month_ago = int(time.time()) - 30 * 86400
+    timed('trend(domain42)', lambda: history.trend('domain42.example'))
+    timed('trend(domain42, last 30 days)', lambda: history.trend('domain42.example', since=month_ago))
+    timed('search(max_score=30) latest', lambda: history.search(max_score=30))
+    timed('search(cve=CVE-2024-0042) latest', lambda: history.search(cve='CVE-2024-0042'))
+    timed('search(cve=CVE-2024-0042, all scans)', lambda: history.search(cve='CVE-2024-0042', latest_only=False))
+    timed('search(port=3306, dnssec=False) latest', lambda: history.search(port=3306, dnssec=False))
+    timed('search(max_score=30, all scans)', lambda: history.search(max_score=30, latest_only=False))
+    timed('search(grade=F, all scans)', lambda: history.search(grade='F', latest_only=False))
+    timed('search(port=22, all scans)', lambda: history.search(port=22, latest_only=False))
+    timed('search(tls_expiring_days=30, all scans)',
+          lambda: history.search(tls_expiring_days=30, latest_only=False))
+    timed('search(min_score=90, grade=A, all scans)',
+          lambda: history.search(min_score=90, grade='A', latest_only=False))
+    timed('lost_dnssec(last 30 days)', lambda: history.lost_dnssec(month_ago))
+    timed('get(id)', lambda: [history.get(args.scans // 2)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════╗
+║                            AEGIS RECON                                     ║
+║              Advanced Threat Intelligence System                           ║
+╠═══════════════════════════════════════════════════════════════════════════╣
+║  Author: VexSpitta                                                         ║
+║  GitHub: https://github.com/Vexx-bit                                       ║
+║  Project: https://github.com/Vexx-bit/Aegis-Recon                         ║
+║                                                                            ║
+║  © 2024-2026 VexSpitta. All Rights Reserved.                              ║
+║  Unauthorized copying, modification, or distribution is prohibited.       ║
+╚═══════════════════════════════════════════════════════════════════════════╝
+
+Aegis Recon - JSON Response Encoding Benchmark
+Bytes on the wire and encode time of the /api/scan response for each
+synthetic corpus size: json vs orjson, identity vs gzip vs brotli.
+
+    python bench/bench_json.py --iterations 50
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import scan
+from scan_corpus import SIZES, make_scan_result
+
+
+def timed(fn, iterations):
+    """Best-of-N wall time in milliseconds, plus the last result"""
+    best, result = float('inf'), None
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON response encoding')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--sizes', default=','.join(SIZES))
+    args = parser.parse_args()
+    
+    print(f"orjson: {'yes' if scan.orjson else 'not installed'}   brotli: {'yes' if scan.brotli else 'not installed'}")
+    print(f"{'size':<8} {'variant':<18} {'bytes':>10} {'ratio':>7} {'encode ms':>10}")
+    
+    for size in [s.strip() for s in args.sizes.split(',') if s.strip()]:
+        payload = {'success': True, 'results': make_scan_result(size), 'timestamp': '2026-01-01T00:00:00+00:00'}
+        
+        baseline_ms, raw = timed(lambda: json.dumps(payload).encode('utf-8'), args.iterations)
+        rows = [('json', len(raw), baseline_ms)]
+        
+        if scan.orjson is not None:
+            ms, body = timed(lambda: scan.orjson.dumps(payload), args.iterations)
+            rows.append(('orjson', len(body), ms))
+        
+        fast_ms, body = timed(lambda: scan._dumps_json(payload), args.iterations)
+        ms, gz = timed(lambda: gzip.compress(body, compresslevel=6), args.iterations)
+        rows.append(('_dumps_json+gzip', len(gz), fast_ms + ms))
+        
+        if scan.brotli is not None:
+            ms, br = timed(lambda: scan.brotli.compress(body, quality=5), args.iterations)
+            rows.append(('_dumps_json+br', len(br), fast_ms + ms))
+        
+        for variant, nbytes, ms in rows:
+            print(f"{size:<8} {variant:<18} {nbytes:>10} {nbytes / len(raw):>7.2f} {ms:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
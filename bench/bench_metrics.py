@@ -0,0 +1,106 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════╗
+║                            AEGIS RECON                                     ║
+║              Advanced Threat Intelligence System                           ║
+╠═══════════════════════════════════════════════════════════════════════════╣
+║  Author: VexSpitta                                                         ║
+║  GitHub: https://github.com/Vexx-bit                                       ║
+║  Project: https://github.com/Vexx-bit/Aegis-Recon                         ║
+║                                                                            ║
+║  © 2024-2026 VexSpitta. All Rights Reserved.                              ║
+║  Unauthorized copying, modification, or distribution is prohibited.       ║
+╚═══════════════════════════════════════════════════════════════════════════╝
+
+
+Aegis Recon - Metrics Registry Benchmark
+Cost per update of the in-process metrics registry (counter, histogram,
+timer, outbound wrapper), single-threaded and under thread contention,
+and the render time of a populated registry.
+
+    python bench/bench_metrics.py --ops 200000 --threads 8
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+import scan
+
+
+def per_op_ns(fn, ops):
+    started = time.perf_counter()
+    for _ in range(ops):
+        fn()
+    return (time.perf_counter() - started) / ops * 1e9
+
+
+def contended_ns(fn, ops, threads):
+    """Wall time per op with `threads` threads sharing one registry"""
+    barrier = threading.Barrier(threads + 1)
+    
+    def work():
+        barrier.wait()
+        for _ in range(ops // threads):
+            fn()
+    
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for w in workers:
+        w.join()
+    return (time.perf_counter() - started) / ops * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the metrics registry')
+    parser.add_argument('--ops', type=int, default=200000)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+    
+    registry = scan.MetricsRegistry('bench')
+    
+    def timer():
+        with registry.timer('aegis_phase_seconds', phase='discover_hosts'):
+            pass
+    
+    def outbound():
+        with registry.outbound('crt.sh'):
+            pass
+    
+    cases = [
+        ('baseline (empty call)', lambda: None),
+        ('inc', lambda: registry.inc('aegis_scans_total')),
+        ('inc (2 labels)', lambda: registry.inc('aegis_outbound_errors_total', dependency='crt.sh', kind='timeout')),
+        ('observe', lambda: registry.observe('aegis_outbound_request_seconds', 0.042, dependency='crt.sh')),
+        ('timer', timer),
+        ('outbound', outbound),
+    ]
+    
+    print(f"{'operation':<24} {'ns/op':>10} {f'ns/op x{args.threads} threads':>22}")
+    for name, fn in cases:
+        single = per_op_ns(fn, args.ops)
+        contended = contended_ns(fn, args.ops, args.threads)
+        print(f"{name:<24} {single:>10.0f} {contended:>22.0f}")
+    
+    # A scan records ~20 phase timings and up to a few hundred outbound calls
+    per_scan_us = (20 * per_op_ns(timer, args.ops) + 300 * per_op_ns(outbound, args.ops)) / 1000
+    print(f"\nper-scan overhead (20 phases + 300 outbound calls): {per_scan_us:.0f} us")
+    
+    for phase in scan.AegisScanner.PHASES:
+        registry.observe('aegis_phase_seconds', 0.5, phase=phase)
+    for dependency in set(scan.DEPENDENCY_HOSTS.values()) | {'target'}:
+        for kind in ('timeout', 'http', 'error'):
+            registry.inc('aegis_outbound_errors_total', dependency=dependency, kind=kind)
+    started = time.perf_counter()
+    body = registry.render()
+    print(f"render: {(time.perf_counter() - started) * 1000:.2f} ms, {len(body.splitlines())} lines")
+
+
+if __name__ == '__main__':
+    main()
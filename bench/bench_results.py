@@ -0,0 +1,96 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════╗
+║                            AEGIS RECON                                     ║
+║              Advanced Threat Intelligence System                           ║
+╠═══════════════════════════════════════════════════════════════════════════╣
+║  Author: VexSpitta                                                         ║
+║  GitHub: https://github.com/Vexx-bit                                       ║
+║  Project: https://github.com/Vexx-bit/Aegis-Recon                         ║
+║                                                                            ║
+║  © 2024-2026 VexSpitta. All Rights Reserved.                              ║
+║  Unauthorized copying, modification, or distribution is prohibited.       ║
+╚═══════════════════════════════════════════════════════════════════════════╝
+
+
+Aegis Recon - Result Model Memory Benchmark
+Memory held by many decoded scan results as plain dicts versus
+compact_result() records, the cost of compacting and scoring them, and
+the peak memory of one-shot versus streamed JSON encoding of the batch.
+
+    python bench/bench_results.py --size medium --count 2000
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import _shared
+import scan
+from scan_corpus import SIZES, make_scan_result
+
+
+def held(build):
+    """(bytes still allocated by what build() returns, seconds, the value)"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    value = build()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, elapsed, value
+
+
+def peak(fn):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    _, top = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return top, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the compact result model')
+    parser.add_argument('--size', choices=sorted(SIZES), default='medium')
+    parser.add_argument('--count', type=int, default=2000)
+    args = parser.parse_args()
+    
+    # Results as they come back from storage: every string its own object
+    blobs = [json.dumps(make_scan_result(args.size, seed)) for seed in range(args.count)]
+    
+    plain_bytes, plain_s, plain = held(lambda: [json.loads(b) for b in blobs])
+    compact_bytes, compact_s, compact = held(lambda: [scan.compact_result(json.loads(b)) for b in blobs])
+    print(f"{args.count} {args.size} results held in memory")
+    print(f"  plain dicts      {plain_bytes / 2**20:9.1f} MiB  decode {plain_s:6.2f} s")
+    print(f"  compact records  {compact_bytes / 2**20:9.1f} MiB  decode+compact {compact_s:6.2f} s"
+          f"  ({100 * (1 - compact_bytes / plain_bytes):.0f}% smaller)")
+    
+    for label, results in (('plain', plain), ('compact', compact)):
+        started = time.perf_counter()
+        scores = scan.score_batch(results)
+        print(f"  score_batch {label:<8} {time.perf_counter() - started:6.2f} s")
+    assert scores == scan.score_batch(plain), 'compact results must score the same'
+    del plain
+    
+    # Encoding the batch as one document, as an export would
+    print(f"all {args.count} compact results as one JSON array")
+    for label, fn in (('one-shot _dumps_json', lambda: _shared._dumps_json(compact)),
+                      ('streamed iter_json', lambda: sum(len(c) for c in _shared.iter_json(compact))),
+                      ('streamed compress_json', lambda: _shared.compress_json(compact)),
+                      ('gzip json_response', lambda: _shared.json_response(compact, 'gzip'))):
+        top, elapsed = peak(fn)
+        print(f"  {label:<24} peak {top / 2**20:8.1f} MiB  {elapsed:6.2f} s")
+
+if __name__ == '__main__':
+    main()
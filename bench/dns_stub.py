@@ -0,0 +1,186 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════╗
+║                            AEGIS RECON                                     ║
+║              Advanced Threat Intelligence System                           ║
+╠═══════════════════════════════════════════════════════════════════════════╣
+║  Author: VexSpitta                                                         ║
+║  GitHub: https://github.com/Vexx-bit                                       ║
+║  Project: https://github.com/Vexx-bit/Aegis-Recon                         ║
+║                                                                            ║
+║  © 2024-2026 VexSpitta. All Rights Reserved.                              ║
+║  Unauthorized copying, modification, or distribution is prohibited.       ║
+╚═══════════════════════════════════════════════════════════════════════════╝
+
+
+Aegis Recon - Stand-in Authoritative DNS Server
+Answers A queries for one zone over UDP and TCP on the same port, with
+optional wildcard records, truncation, packet loss and latency, so the
+brute-force resolver can be tested and benchmarked offline.
+"""
+
+import argparse
+import asyncio
+import random
+import socket
+import struct
+import threading
+import time
+
+FLAG_QR = 0x8000
+FLAG_AA = 0x0400
+FLAG_TC = 0x0200
+FLAG_RD = 0x0100
+FLAG_RA = 0x0080
+RCODE_NXDOMAIN = 3
+RCODE_REFUSED = 5
+
+
+class StubDNSServer:
+    """Authoritative stand-in for one zone
+    
+    records:   {name: [ipv4, ...]} for names under the zone
+    wildcard:  address any other name under the zone resolves to, or None
+    truncate:  names whose UDP answer has TC set; the full answer is on TCP
+    drop_rate: fraction of UDP queries silently dropped (forces retries)
+    latency:   seconds before each answer
+    """
+    
+    def __init__(self, zone, records, wildcard=None, truncate=(), drop_rate=0.0, latency=0.0,
+                 host='127.0.0.1', port=0, seed=0):
+        self.zone = zone.lower()
+        self.records = {name.lower(): list(addresses) for name, addresses in records.items()}
+        self.wildcard = wildcard
+        self.truncate = {name.lower() for name in truncate}
+        self.drop_rate = drop_rate
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.queries = 0
+        self.tcp_queries = 0
+        self.dropped = 0
+        self._random = random.Random(seed)
+        self._ready = threading.Event()
+        self._loop = None
+    
+    @property
+    def address(self):
+        """Resolver spec for AsyncDNSClient / DNS_RESOLVERS"""
+        return f"{self.host}:{self.port}"
+    
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        self._ready.wait()
+        return self
+    
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+    
+    def _run(self):
+        self._loop = loop = asyncio.new_event_loop()
+        stub = self
+        
+        class _UDP(asyncio.DatagramProtocol):
+            def connection_made(self, transport):
+                self.transport = transport
+            
+            def datagram_received(self, data, addr):
+                stub.queries += 1
+                if stub.drop_rate and stub._random.random() < stub.drop_rate:
+                    stub.dropped += 1
+                    return
+                response = stub.answer(data, tcp=False)
+                if response is not None:
+                    loop.call_later(stub.latency, self.transport.sendto, response, addr)
+        
+        async def handle_tcp(reader, writer):
+            try:
+                length, = struct.unpack('>H', await reader.readexactly(2))
+                query = await reader.readexactly(length)
+                stub.tcp_queries += 1
+                await asyncio.sleep(stub.latency)
+                response = stub.answer(query, tcp=True)
+                if response is not None:
+                    writer.write(struct.pack('>H', len(response)) + response)
+                    await writer.drain()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+        
+        async def setup():
+            transport, _ = await loop.create_datagram_endpoint(_UDP, local_addr=(self.host, self.port))
+            self.port = transport.get_extra_info('sockname')[1]
+            sock = transport.get_extra_info('socket')
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+            await asyncio.start_server(handle_tcp, self.host, self.port)
+        
+        loop.run_until_complete(setup())
+        self._ready.set()
+        loop.run_forever()
+    
+    def answer(self, query, tcp):
+        """Wire-format response to a wire-format query, or None if unparseable"""
+        try:
+            txid, flags, qdcount = struct.unpack_from('>HHH', query)
+            pos, labels = 12, []
+            while query[pos]:
+                labels.append(query[pos + 1:pos + 1 + query[pos]].decode('ascii').lower())
+                pos += 1 + query[pos]
+            qtype, qclass = struct.unpack_from('>HH', query, pos + 1)
+            question = query[12:pos + 5]
+        except (IndexError, struct.error, UnicodeDecodeError):
+            return None
+        
+        name = '.'.join(labels)
+        flags = FLAG_QR | FLAG_AA | FLAG_RA | (flags & FLAG_RD)
+        answers = []
+        if name != self.zone and not name.endswith('.' + self.zone):
+            flags |= RCODE_REFUSED
+        elif name in self.records:
+            answers = self.records[name]
+        elif self.wildcard and name != self.zone:
+            answers = [self.wildcard]
+        else:
+            flags |= RCODE_NXDOMAIN
+        
+        if qtype != 1:
+            answers = []
+        if answers and name in self.truncate and not tcp:
+            flags |= FLAG_TC
+            answers = []
+        
+        records = b''.join(
+            struct.pack('>HHHIH', 0xC00C, 1, 1, 300, 4) + socket.inet_aton(address) for address in answers
+        )
+        return struct.pack('>HHHHHH', txid, flags, 1, len(answers), 0, 0) + question + records
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a stand-in authoritative DNS server for one zone')
+    parser.add_argument('zone')
+    parser.add_argument('--port', type=int, default=5353)
+    parser.add_argument('--names', default='www,mail,api,dev', help='comma-separated labels that exist')
+    parser.add_argument('--wildcard', help='address for every other name in the zone')
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+    
+    records = {f"{label}.{args.zone}": ['10.0.0.1'] for label in args.names.split(',') if label}
+    server = StubDNSServer(args.zone, records, wildcard=args.wildcard, latency=args.latency, port=args.port)
+    server.start()
+    print(f"Stub DNS for {args.zone} on {server.address} - set DNS_RESOLVERS to this")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════╗
+║                            AEGIS RECON                                     ║
+║              Advanced Threat Intelligence System                           ║
+╠═══════════════════════════════════════════════════════════════════════════╣
+║  Author: VexSpitta                                                         ║
+║  GitHub: https://github.com/Vexx-bit                                       ║
+║  Project: https://github.com/Vexx-bit/Aegis-Recon                         ║
+║                                                                            ║
+║  © 2024-2026 VexSpitta. All Rights Reserved.                              ║
+║  Unauthorized copying, modification, or distribution is prohibited.       ║
+╚═══════════════════════════════════════════════════════════════════════════╝
+
+Aegis Recon - Stand-in LLM Server
+Local OpenAI-compatible chat-completions endpoint with configurable
+latency and generation speed, for benchmarks and offline testing.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import threading
+import time
+
+
+class StubLLMServer:
+    """Threaded chat-completions stand-in
+    
+    latency:           seconds before the first token
+    tokens_per_second: generation speed after the first token
+    completion_tokens: words in every completion
+    fail_rate:         fraction of requests answered with HTTP 500
+    """
+    
+    def __init__(self, host='127.0.0.1', port=0, latency=0.5, tokens_per_second=400,
+                 completion_tokens=600, fail_rate=0.0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.fail_rate = fail_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+    
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/openai/v1/chat/completions"
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+    
+    def _next_request(self):
+        with self._lock:
+            self.requests += 1
+            return self.requests
+    
+    def _make_handler(self):
+        stub = self
+        
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def log_message(self, *args):
+                pass
+            
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                number = stub._next_request()
+                
+                if stub.fail_rate and number % max(1, round(1 / stub.fail_rate)) == 0:
+                    time.sleep(stub.latency)
+                    self._send(500, b'{"error": "stub failure"}', 'application/json')
+                    return
+                
+                tokens = min(stub.completion_tokens, body.get('max_tokens', stub.completion_tokens))
+                words = [f"word{i} " for i in range(tokens)]
+                words[0] = "## Executive Summary\n"
+                
+                time.sleep(stub.latency)
+                if body.get('stream'):
+                    self._stream(words)
+                else:
+                    time.sleep(tokens / stub.tokens_per_second)
+                    payload = json.dumps({
+                        'id': f'stub-{number}',
+                        'object': 'chat.completion',
+                        'model': body.get('model'),
+                        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ''.join(words)}, 'finish_reason': 'stop'}]
+                    }).encode('utf-8')
+                    self._send(200, payload, 'application/json')
+            
+            def _send(self, status, payload, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            
+            def _stream(self, words):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                
+                def write_chunk(data):
+                    self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+                    self.wfile.flush()
+                
+                delay = 1 / stub.tokens_per_second
+                for word in words:
+                    delta = {'choices': [{'index': 0, 'delta': {'content': word}}]}
+                    write_chunk(f"data: {json.dumps(delta)}\n\n".encode('utf-8'))
+                    time.sleep(delay)
+                write_chunk(b"data: [DONE]\n\n")
+                self.wfile.write(b'0\r\n\r\n')
+        
+        return _Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a stand-in OpenAI-compatible chat-completions server')
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds before the first token')
+    parser.add_argument('--tps', type=float, default=400, help='generated tokens per second')
+    parser.add_argument('--tokens', type=int, default=600, help='tokens per completion')
+    args = parser.parse_args()
+    
+    server = StubLLMServer(port=args.port, latency=args.latency, tokens_per_second=args.tps,
+                           completion_tokens=args.tokens)
+    print(f"Stub LLM listening on {server.url} - set GROQ_API_URL to this")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
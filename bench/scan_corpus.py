@@ -0,0 +1,113 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════╗
+║                            AEGIS RECON                                     ║
+║              Advanced Threat Intelligence System                           ║
+╠═══════════════════════════════════════════════════════════════════════════╣
+║  Author: VexSpitta                                                         ║
+║  GitHub: https://github.com/Vexx-bit                                       ║
+║  Project: https://github.com/Vexx-bit/Aegis-Recon                         ║
+║                                                                            ║
+║  © 2024-2026 VexSpitta. All Rights Reserved.                              ║
+║  Unauthorized copying, modification, or distribution is prohibited.       ║
+╚═══════════════════════════════════════════════════════════════════════════╝
+
+Aegis Recon - Synthetic Scan Corpus
+Deterministic AegisScanner-shaped results from small to huge, for
+benchmarks that must not touch the network.
+"""
+
+import random
+from datetime import datetime, timezone
+
+
+# subdomains, hosts, dns records, technologies, cookies, cves
+SIZES = {
+    'small': (3, 2, 8, 3, 2, 0),
+    'medium': (40, 15, 20, 8, 6, 3),
+    'large': (300, 120, 80, 20, 25, 15),
+    'huge': (3000, 1000, 400, 40, 80, 60),
+}
+
+_TECHS = ['nginx/1.18.0', 'Apache/2.2.15', 'PHP/7.1.33', 'WordPress', 'jQuery/1.12.4', 'React',
+          'Cloudflare', 'Bootstrap', 'OpenSSL/1.0.2k', 'Drupal', 'Google Analytics', 'Vue.js']
+_HEADERS = [('Strict-Transport-Security', 'critical'), ('Content-Security-Policy', 'high'),
+            ('X-Frame-Options', 'medium'), ('X-Content-Type-Options', 'medium'),
+            ('Referrer-Policy', 'medium'), ('Permissions-Policy', 'medium'), ('X-XSS-Protection', 'low')]
+_CVES = [('CVE-2023-23752', 'Critical'), ('CVE-2022-21661', 'High'), ('CVE-2018-7600', 'Critical'),
+         ('CVE-2020-11022', 'Medium'), ('CVE-2020-1971', 'High'), ('Multiple', 'High')]
+
+
+def make_scan_result(size='medium', seed=0, target='corp.example'):
+    """Build one synthetic scan result of the given size"""
+    n_subs, n_hosts, n_dns, n_tech, n_cookies, n_cves = SIZES[size]
+    rng = random.Random(f"{size}-{seed}")
+    
+    subdomains = [f"{rng.choice(['api', 'www', 'mail', 'dev', 'cdn', 'vpn', 'app'])}{i}.{target}" for i in range(n_subs)]
+    hosts = []
+    for i in range(n_hosts):
+        ports = sorted(rng.sample([80, 443, 22, 21, 8080, 3306], rng.randint(0, 3)))
+        hosts.append({
+            'hostname': subdomains[i % len(subdomains)] if subdomains else target,
+            'ip': f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}",
+            'ports': ports,
+            'status': 'up' if ports else 'filtered'
+        })
+    
+    dns_records = [{'type': 'TXT', 'name': target, 'value': 'v=spf1 include:_spf.example -all', 'ttl': 300}]
+    for i in range(n_dns - 1):
+        rtype = rng.choice(['A', 'AAAA', 'MX', 'NS', 'CNAME'])
+        value = f"10.9.{i // 256 % 256}.{i % 256}" if rtype == 'A' else f"ns{i}.{target}"
+        dns_records.append({'type': rtype, 'name': target, 'value': value, 'ttl': 3600})
+    
+    technologies = [{'name': _TECHS[i % len(_TECHS)] + ('' if i < len(_TECHS) else f' #{i}'),
+                     'category': 'CMS/Framework', 'source': 'html'} for i in range(n_tech)]
+    missing = rng.sample(_HEADERS, rng.randint(2, len(_HEADERS)))
+    cookies = [{'name': f"session{i}", 'secure': rng.random() > 0.4, 'httponly': rng.random() > 0.4,
+                'samesite': rng.choice(['Lax', 'Strict', None]), 'raw': f"session{i}=abc; Path=/"}
+               for i in range(n_cookies)]
+    cves = []
+    for i in range(n_cves):
+        cve, severity = _CVES[i % len(_CVES)]
+        cves.append({'technology': technologies[i % max(1, n_tech)]['name'].lower() if n_tech else 'php/7.1',
+                     'cve': cve, 'severity': severity, 'description': 'Synthetic vulnerability'})
+    panels = [{'path': p, 'status': s, 'accessible': s == 200}
+              for p, s in [('/admin', 403), ('/wp-admin', 302), ('/.env', 200)][:1 + n_cves % 3]]
+    
+    return {
+        'target': target,
+        'timestamp': datetime(2026, 1, 1, tzinfo=timezone.utc).isoformat(),
+        'phases': {
+            'subdomains': subdomains,
+            'hosts': hosts,
+            'osint': {'emails': [f"user{i}@{target}" for i in range(min(20, n_subs // 10))]},
+            'technologies': technologies
+        },
+        'security_score': rng.randint(20, 95),
+        'security_headers': {
+            'headers_found': [],
+            'headers_missing': [{'name': n, 'description': '', 'importance': imp} for n, imp in missing],
+            'grade': rng.choice(['A', 'B', 'C', 'D', 'F']),
+            'score_percentage': rng.randint(0, 100)
+        },
+        'ssl_info': {'valid': True, 'subject': target, 'issuer': "Let's Encrypt", 'tls_version': 'TLSv1.3',
+                     'not_after': 'Jan  1 00:00:00 2027 GMT', 'is_expired': False, 'days_until_expiry': rng.randint(5, 300)},
+        'robots_txt': {'found': True, 'sensitive_paths': [{'path': '/admin/', 'keyword': 'admin'}], 'all_disallowed': ['/admin/']},
+        'admin_panels': {'found': panels, 'checked': 15},
+        'directory_listing': {'vulnerable': n_cves > 5, 'exposed_dirs': ['/uploads/'] if n_cves > 5 else []},
+        'known_cves': cves,
+        'dns_records': dns_records,
+        'whois_info': {'registrar': 'Example Registrar', 'creation_date': '2010-01-01', 'expiry_date': '2030-01-01',
+                       'name_servers': f"ns1.{target}, ns2.{target}", 'dnssec': rng.choice(['Signed', 'Unsigned'])},
+        'cookie_security': {'cookies': cookies},
+        'http_methods': {'methods': ['GET', 'POST', 'HEAD'], 'risky_methods': []},
+        'cors_check': {'cors_enabled': False, 'wildcard_origin': False, 'reflects_origin': False},
+        'score_factors': ['+10: HTTPS enabled', '-5: Poor security headers (Grade D)', '-8: Directory listing enabled (1 dirs exposed)',
+                          f'-{min(10, n_subs // 10)}: Large attack surface ({n_subs} subdomains)'],
+    }
+
+
+def corpus(sizes=None, per_size=3):
+    """Yield (size, result) pairs; different seeds give distinct cache keys"""
+    for size in sizes or SIZES:
+        for seed in range(per_size):
+            yield size, make_scan_result(size, seed)
@@ -40,6 +40,7 @@ const AUTHOR = { name: 'Rapid Tech Solutions', website: 'https://rapidtech.softw
 
 // State
 let currentResults = null;
+let currentScanId = null;
 let cachedReport = null;
 
 // DOM refs
@@ -131,6 +132,7 @@ async function handleScanSubmit(e) {
         statusMessage.innerHTML = '<i class="bi bi-check-circle-fill"></i> Scan complete!';
 
         currentResults = data.results;
+        currentScanId = data.scan_id || null;
         displayResults(data.results);
 
         setTimeout(() => {
@@ -627,16 +629,22 @@ async function generateReport() {
         '<div class="loading-state"><span class="loader"></span><p>Generating AI threat analysis...</p></div>';
 
     try {
-        const res = await fetch(`${API_BASE_URL}/analyze`, {
+        // Reference the server-side copy of the scan; re-upload only if it has expired
+        const requestReport = body => fetch(`${API_BASE_URL}/analyze`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ results: currentResults })
+            headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+            body: JSON.stringify({ ...body, stream: true })
         });
-        const data = await res.json();
-        if (!res.ok || !data.success) throw new Error(data.error || 'Report generation failed');
+        let res = currentScanId ? await requestReport({ scan_id: currentScanId }) : null;
+        if (!res || res.status === 404) res = await requestReport({ results: currentResults });
+        if (!res.ok || !res.body) {
+            const data = await res.json().catch(() => ({}));
+            throw new Error(data.error || 'Report generation failed');
+        }
 
-        cachedReport = { target: currentResults.target, analysis: data.analysis, scanResults: currentResults, cachedAt: new Date().toISOString() };
-        displayReport(data.analysis);
+        const analysis = await readReportStream(res, partial => displayReport(partial));
+        cachedReport = { target: currentResults.target, analysis, scanResults: currentResults, cachedAt: new Date().toISOString() };
+        displayReport(analysis);
     } catch (err) {
         document.getElementById('reportModalBody').innerHTML = `
             <div style="text-align:center;padding:2rem;">
@@ -648,6 +656,39 @@ async function generateReport() {
     }
 }
 
+// Parse the server-sent events from /api/analyze, rendering as tokens arrive
+async function readReportStream(res, onProgress) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    const analysis = { report: '', model: 'AI', generated_at: new Date().toISOString() };
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let sep;
+        while ((sep = buffer.indexOf('\n\n')) !== -1) {
+            const frame = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            const event = (frame.match(/^event: (.*)$/m) || [])[1];
+            const data = JSON.parse((frame.match(/^data: (.*)$/m) || [])[1] || '{}');
+
+            if (event === 'token') {
+                analysis.report += data.content;
+                onProgress(analysis);
+            } else if (event === 'done') {
+                Object.assign(analysis, data);
+            } else if (event === 'error') {
+                throw new Error(data.error || 'Report stream interrupted');
+            }
+        }
+    }
+    if (!analysis.report) throw new Error('Report generation failed');
+    return analysis;
+}
+
 // ============================================================================
 // DISPLAY REPORT (in modal)
 // ============================================================================
@@ -826,6 +867,7 @@ function resetDashboard() {
     const exportBtn = document.getElementById('exportJsonBtn');
     if (exportBtn) exportBtn.disabled = true;
     currentResults = null;
+    currentScanId = null;
     cachedReport = null;
     domainInput.focus();
 }
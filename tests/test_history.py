@@ -0,0 +1,91 @@
+"""
+ScanHistory storage and offline rescoring
+"""
+
+import copy
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import scan
+from test_scoring import NOW, random_result
+
+
+def scored_results(count, seed=0):
+    """Results as a scan stores them: scored as of their own timestamp"""
+    rng = random.Random(seed)
+    results = []
+    for i in range(count):
+        result = random_result(rng)
+        result['target'] = f'site{i % 5}.example'
+        result['timestamp'] = NOW.astimezone().isoformat()
+        result['security_score'], result['score_factors'] = scan.score_batch([result])[0]
+        results.append(result)
+    return results
+
+
+def https_worth(points):
+    rules = copy.deepcopy(scan.DEFAULT_SCORING_RULES)
+    rule = next(r for r in rules if r.get('feature') == 'has_https')
+    rule['points'] = points
+    return rules
+
+
+@pytest.fixture
+def history(tmp_path):
+    return scan.ScanHistory(str(tmp_path / 'history.db'))
+
+
+def test_record_and_get_round_trip(history):
+    results = scored_results(3)
+    ids = history.record_many(results)
+    assert [history.get(i) for i in ids] == results
+
+
+def test_rescore_with_unchanged_rules_is_a_no_op(history):
+    history.record_many(scored_results(40))
+    changes = history.rescore(latest_only=False, batch_size=7)
+    assert len(changes) == 40
+    assert all(c['score_before'] == c['score_after'] for c in changes)
+
+
+def test_rescore_update_rewrites_column_and_stored_result(history):
+    results = scored_results(40)
+    ids = history.record_many(results)
+    rules = https_worth(30)
+    
+    changes = history.rescore(rules, latest_only=False, update=True, batch_size=7)
+    expected = scan.score_batch(results, rules)
+    assert [c['id'] for c in changes] == ids
+    assert [c['score_after'] for c in changes] == [score for score, _ in expected]
+    assert any(c['score_before'] != c['score_after'] for c in changes)
+    
+    trend = {row['id']: row['score'] for d in {r['target'] for r in results} for row in history.trend(d)}
+    for scan_id, (score, factors) in zip(ids, expected):
+        stored = history.get(scan_id)
+        assert trend[scan_id] == score
+        assert stored['security_score'] == score
+        assert stored['score_factors'] == factors
+    
+    # Stored results now agree with the rules: a second pass moves nothing
+    assert all(c['score_before'] == c['score_after']
+               for c in history.rescore(rules, latest_only=False, update=True))
+
+
+def test_rescore_without_update_leaves_history_alone(history):
+    results = scored_results(10)
+    ids = history.record_many(results)
+    history.rescore(https_worth(30), latest_only=False)
+    assert [history.get(i) for i in ids] == results
+
+
+def test_rescore_latest_only_and_domain_filter(history):
+    history.record_many(scored_results(20))
+    latest = history.rescore()
+    assert sorted(c['domain'] for c in latest) == [f'site{i}.example' for i in range(5)]
+    assert [c['domain'] for c in history.rescore(domain='SITE3.example', latest_only=False)] == ['site3.example'] * 4
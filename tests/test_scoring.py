@@ -0,0 +1,273 @@
+"""
+Scoring rules table versus the hand-written calculate_score() it replaced
+"""
+
+import copy
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+import scan
+
+NOW = datetime(2026, 3, 1, 12, 0, 0)
+
+
+def legacy_calculate_score(results, now):
+    """AegisScanner.calculate_score() as it was before the rules table, returning (score, findings)"""
+    score = 70
+    phases = results['phases']
+    findings = []
+    
+    if any(443 in host.get('ports', []) for host in phases['hosts']):
+        score += 10
+        findings.append('+10: HTTPS enabled')
+    
+    tech_names = [t.get('name', '').lower() for t in phases.get('technologies', [])]
+    if any('cloudflare' in t or 'akamai' in t or 'fastly' in t for t in tech_names):
+        score += 5
+        findings.append('+5: CDN/WAF detected')
+    
+    subdomain_count = len(phases.get('subdomains', []))
+    if subdomain_count <= 3:
+        score += 5
+        findings.append('+5: Minimal subdomain exposure')
+    
+    if not phases['osint']['emails']:
+        score += 5
+        findings.append('+5: No exposed email addresses')
+    
+    email_count = len(phases['osint']['emails'])
+    if email_count > 0:
+        deduction = min(email_count * 3, 10)
+        score -= deduction
+        findings.append(f'-{deduction}: {email_count} exposed emails')
+    
+    risky_ports = {
+        21: (8, 'FTP - cleartext credentials'),
+        22: (3, 'SSH - potential brute-force target'),
+        23: (15, 'Telnet - critical, cleartext protocol'),
+        25: (3, 'SMTP - potential spam relay'),
+        3306: (10, 'MySQL - database exposed'),
+        5432: (10, 'PostgreSQL - database exposed'),
+        1433: (10, 'MSSQL - database exposed'),
+        3389: (10, 'RDP - ransomware target'),
+        5900: (8, 'VNC - screen sharing exposed'),
+        6379: (10, 'Redis - database exposed'),
+        27017: (10, 'MongoDB - database exposed'),
+    }
+    for host in phases['hosts']:
+        for port in host.get('ports', []):
+            if port in risky_ports:
+                deduction, reason = risky_ports[port]
+                score -= deduction
+                findings.append(f'-{deduction}: Port {port} ({reason})')
+    
+    has_http = any(80 in host.get('ports', []) for host in phases['hosts'])
+    has_https = any(443 in host.get('ports', []) for host in phases['hosts'])
+    if has_http and not has_https:
+        score -= 8
+        findings.append('-8: HTTP only, no HTTPS detected')
+    
+    outdated_indicators = ['openssl/1.0', 'php/5.', 'php/7.0', 'php/7.1', 'php/7.2',
+                           'apache/2.2', 'nginx/1.1', 'jquery/1.', 'jquery/2.']
+    outdated_found = 0
+    for tech in phases.get('technologies', []):
+        tech_name = tech.get('name', '').lower()
+        for indicator in outdated_indicators:
+            if indicator in tech_name and outdated_found < 2:
+                score -= 5
+                outdated_found += 1
+                findings.append(f'-5: Outdated software ({tech.get("name")})')
+                break
+    
+    if subdomain_count > 10:
+        deduction = min((subdomain_count - 10) * 1, 10)
+        score -= deduction
+        findings.append(f'-{deduction}: Large attack surface ({subdomain_count} subdomains)')
+    
+    headers_grade = results.get('security_headers', {}).get('grade', 'F')
+    if headers_grade == 'A':
+        score += 10
+        findings.append('+10: Excellent security headers (Grade A)')
+    elif headers_grade == 'B':
+        score += 5
+        findings.append('+5: Good security headers (Grade B)')
+    elif headers_grade in ['D', 'F']:
+        score -= 5
+        findings.append(f'-5: Poor security headers (Grade {headers_grade})')
+    
+    ssl_info = results.get('ssl_info', {})
+    if ssl_info.get('valid'):
+        if ssl_info.get('is_expired'):
+            score -= 15
+            findings.append('-15: SSL certificate is expired')
+        elif ssl_info.get('days_until_expiry', 999) < 30:
+            score -= 3
+            findings.append('-3: SSL certificate expiring soon')
+        else:
+            score += 5
+            findings.append('+5: Valid SSL certificate')
+        tls_version = ssl_info.get('tls_version', '')
+        if 'TLSv1.0' in tls_version or 'TLSv1.1' in tls_version:
+            score -= 5
+            findings.append(f'-5: Outdated TLS version ({tls_version})')
+    
+    admin_panels = results.get('admin_panels', {}).get('found', [])
+    accessible_panels = [p for p in admin_panels if p.get('accessible')]
+    if accessible_panels:
+        deduction = min(len(accessible_panels) * 5, 10)
+        score -= deduction
+        findings.append(f'-{deduction}: {len(accessible_panels)} admin panel(s) accessible')
+    
+    if results.get('directory_listing', {}).get('vulnerable'):
+        exposed_count = len(results['directory_listing'].get('exposed_dirs', []))
+        score -= 8
+        findings.append(f'-8: Directory listing enabled ({exposed_count} dirs exposed)')
+    
+    seen_cves = set()
+    unique_cves = []
+    for c in results.get('known_cves', []):
+        if c.get('cve') not in seen_cves:
+            seen_cves.add(c.get('cve'))
+            unique_cves.append(c)
+    critical_cves = [c for c in unique_cves if c.get('severity') == 'Critical']
+    high_cves = [c for c in unique_cves if c.get('severity') == 'High']
+    if critical_cves:
+        deduction = min(len(critical_cves) * 8, 15)
+        score -= deduction
+        findings.append(f'-{deduction}: {len(critical_cves)} critical CVE(s) detected')
+    if high_cves:
+        deduction = min(len(high_cves) * 5, 10)
+        score -= deduction
+        findings.append(f'-{deduction}: {len(high_cves)} high severity CVE(s) detected')
+    
+    if len(results.get('robots_txt', {}).get('sensitive_paths', [])) > 5:
+        score -= 3
+        findings.append('-3: Many sensitive paths in robots.txt')
+    
+    cookies = results.get('cookie_security', {}).get('cookies', [])
+    insecure_cookies = [c for c in cookies if not c.get('secure') or not c.get('httponly')]
+    if insecure_cookies:
+        deduction = min(len(insecure_cookies) * 2, 6)
+        score -= deduction
+        findings.append(f'-{deduction}: {len(insecure_cookies)} cookie(s) missing security flags')
+    
+    risky_methods = results.get('http_methods', {}).get('risky_methods', [])
+    if risky_methods:
+        score -= 4
+        findings.append(f'-4: Risky HTTP methods enabled ({", ".join(risky_methods)})')
+    
+    cors = results.get('cors_check', {})
+    if cors.get('wildcard_origin'):
+        score -= 6
+        findings.append('-6: Wildcard CORS policy (Access-Control-Allow-Origin: *)')
+    elif cors.get('reflects_origin'):
+        score -= 8
+        findings.append('-8: CORS reflects arbitrary origins (critical misconfiguration)')
+    
+    whois = results.get('whois_info', {})
+    if whois.get('expiry_date'):
+        try:
+            days_left = (datetime.strptime(whois['expiry_date'], '%Y-%m-%d') - now).days
+            if days_left < 30:
+                score -= 3
+                findings.append(f'-3: Domain expires in {days_left} days')
+        except ValueError:
+            pass
+    
+    if whois.get('dnssec') == 'Signed':
+        score += 3
+        findings.append('+3: DNSSEC enabled')
+    
+    dns_records = results.get('dns_records', [])
+    has_spf = any('spf' in r.get('value', '').lower() for r in dns_records if r.get('type') == 'TXT')
+    has_dmarc = any('dmarc' in r.get('value', '').lower() for r in dns_records if r.get('type') == 'TXT')
+    if has_spf:
+        score += 3
+        findings.append('+3: SPF record present')
+    if has_dmarc:
+        score += 3
+        findings.append('+3: DMARC record present')
+    if not has_spf and not has_dmarc:
+        score -= 4
+        findings.append('-4: No SPF/DMARC email security records')
+    
+    score = max(15, score)
+    if len(phases.get('technologies', [])) == 0 and len(phases.get('hosts', [])) <= 1:
+        score = min(score, 75)
+        findings.append('Cap at 75: Limited reconnaissance data')
+    
+    return max(0, min(100, score)), findings
+
+
+def random_result(rng):
+    """A scan result covering every input the legacy scorer looked at"""
+    result = {
+        'target': 'example.com',
+        'phases': {
+            'subdomains': ['www.example.com'] * rng.choice([0, 1, 3, 4, 10, 11, 15, 25]),
+            'hosts': [{'ports': rng.sample([21, 22, 23, 25, 80, 443, 1433, 3306, 3389, 5432, 5900, 6379, 8080, 27017],
+                                           rng.randint(0, 4))}
+                      for _ in range(rng.randint(0, 4))],
+            'osint': {'emails': ['admin@example.com'] * rng.choice([0, 1, 2, 3, 4, 7])},
+            'technologies': [{'name': rng.choice(['nginx/1.18', 'nginx/1.14', 'PHP/5.6', 'php/7.2.1', 'Apache/2.2.3',
+                                                  'Cloudflare', 'akamai-ghost', 'jQuery/1.12', 'WordPress',
+                                                  'OpenSSL/1.0.2'])}
+                             for _ in range(rng.randint(0, 5))],
+        },
+        'admin_panels': {'found': [{'accessible': rng.random() < 0.5} for _ in range(rng.randint(0, 4))]},
+        'directory_listing': {'vulnerable': rng.random() < 0.3, 'exposed_dirs': ['/backup/'] * rng.randint(0, 3)},
+        'known_cves': [{'cve': rng.choice(['CVE-2021-1', 'CVE-2021-2', 'CVE-2021-3', 'Multiple']),
+                        'severity': rng.choice(['Critical', 'High', 'Medium'])}
+                       for _ in range(rng.randint(0, 6))],
+        'robots_txt': {'sensitive_paths': [{'path': '/admin'}] * rng.randint(0, 8)},
+        'cookie_security': {'cookies': [{'secure': rng.random() < 0.5, 'httponly': rng.random() < 0.5}
+                                        for _ in range(rng.randint(0, 5))]},
+        'http_methods': {'risky_methods': rng.sample(['PUT', 'DELETE', 'TRACE'], rng.randint(0, 2))},
+        'cors_check': {'wildcard_origin': rng.random() < 0.3, 'reflects_origin': rng.random() < 0.3},
+        'dns_records': [{'type': rng.choice(['TXT', 'A']),
+                         'value': rng.choice(['v=spf1 -all', 'v=DMARC1; p=none', '192.0.2.1'])}
+                        for _ in range(rng.randint(0, 3))],
+    }
+    if rng.random() < 0.9:
+        result['security_headers'] = {'grade': rng.choice(['A', 'B', 'C', 'D', 'F', 'Unknown'])}
+    if rng.random() < 0.9:
+        result['ssl_info'] = {'valid': rng.random() < 0.8, 'is_expired': rng.random() < 0.2,
+                              'tls_version': rng.choice(['TLSv1.3', 'TLSv1.2', 'TLSv1.1', 'TLSv1.0', ''])}
+        if rng.random() < 0.8:
+            result['ssl_info']['days_until_expiry'] = rng.randint(-5, 200)
+    whois = {'dnssec': rng.choice(['Signed', 'Unsigned', None])}
+    if rng.random() < 0.5:
+        whois['expiry_date'] = (NOW + timedelta(days=rng.randint(-10, 100))).strftime('%Y-%m-%d')
+    elif rng.random() < 0.3:
+        whois['expiry_date'] = 'unknown'
+    result['whois_info'] = whois
+    return result
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_rules_table_matches_legacy_score(seed):
+    rng = random.Random(seed)
+    for _ in range(1000):
+        result = random_result(rng)
+        assert scan.score_result(copy.deepcopy(result), now=NOW) == legacy_calculate_score(result, NOW)
+
+
+def test_score_batch_scores_as_of_scan_time():
+    rng = random.Random(99)
+    results = [random_result(rng) for _ in range(200)]
+    for result in results:
+        result['timestamp'] = NOW.astimezone().isoformat()
+    assert scan.score_batch(results) == [legacy_calculate_score(r, NOW) for r in results]
+
+
+def test_compact_results_score_the_same():
+    rng = random.Random(7)
+    results = [random_result(rng) for _ in range(200)]
+    compact = [scan.compact_result(copy.deepcopy(r)) for r in results]
+    assert [scan.score_result(r, now=NOW) for r in compact] == [scan.score_result(r, now=NOW) for r in results]
@@ -0,0 +1,38 @@
+"""
+Banner identification and version-range CVE matching
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+import scan
+
+
+@pytest.mark.parametrize('banner, product, version', [
+    (b'SSH-2.0-OpenSSH_7.4p1 Debian-10+deb9u7\r\n', 'openssh', '7.4p1'),
+    (b'220 mail.example.com ESMTP Exim 4.89 Mon, 01 Jan 2024\r\n', 'exim', '4.89'),
+    (b'220 (vsFTPd 2.3.4)\r\n', 'vsftpd', '2.3.4'),
+    (b'$100\r\n# Server\r\nredis_version:5.0.7\r\n', 'redis', '5.0.7'),
+])
+def test_identify_service(banner, product, version):
+    service = scan.identify_service(banner)
+    assert (service['product'], service['version']) == (product, version)
+
+
+@pytest.mark.parametrize('version, affected', [
+    ('4.80', False), ('4.86', False), ('4.87', True), ('4.91', True), ('4.92', False), ('4.96', False),
+])
+def test_exim_cve_range(version, affected):
+    assert bool(scan.service_cves('exim', version)) is affected
+
+
+def test_version_suffixes():
+    assert [c['cve'] for c in scan.service_cves('OpenSSH', '7.7p1')] == ['CVE-2018-15473']
+    assert scan.service_cves('openssh', '7.8p1') == []
+    assert scan.service_cves('proftpd', '1.3.5')[0]['cve'] == 'CVE-2015-3306'
+    assert scan.service_cves('proftpd', '1.3.5a') == []
+    assert scan.service_cves('exim', None) == []
@@ -0,0 +1,269 @@
+"""
+╔═══════════════════════════════════════════════════════════════════════════╗
+║                            AEGIS RECON                                     ║
+║              Advanced Threat Intelligence System                           ║
+╠═══════════════════════════════════════════════════════════════════════════╣
+║  Author: VexSpitta                                                         ║
+║  GitHub: https://github.com/Vexx-bit                                       ║
+║  Project: https://github.com/Vexx-bit/Aegis-Recon                         ║
+║                                                                            ║
+║  © 2024-2026 VexSpitta. All Rights Reserved.                              ║
+║  Unauthorized copying, modification, or distribution is prohibited.       ║
+╚═══════════════════════════════════════════════════════════════════════════╝
+
+
+Aegis Recon - Portfolio Sweep
+Runs AegisScanner over a list of domains outside the serverless handler:
+a process pool with a thread pool inside each worker, results appended
+to an NDJSON file one line per domain. Workers stream each result into a
+spool file beside the output and the parent copies it across, so no
+result is ever held as one encoded line. The output file is the
+checkpoint - rerunning the same command skips every domain already in
+it, so an interrupted sweep resumes where it stopped.
+
+    python tools/sweep.py domains.txt -o sweep.ndjson --processes 8 --threads 16
+    cat domains.txt | python tools/sweep.py - -o sweep.ndjson --retry-errors
+"""
+
+from multiprocessing import Pool
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import os
+import re
+import shutil
+import signal
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+import scan
+from _shared import write_json
+
+# Lines start with the domain and status so a resume can read them
+# without parsing the results
+_LINE_PREFIX = re.compile(rb'^\{"domain": ?("(?:[^"\\]|\\.)*"), ?"status": ?"(ok|error)"')
+
+_WORKER = {}
+
+# OS threads all scans of a sweep may start between them (see _init_worker)
+SWEEP_MAX_THREADS = int(os.environ.get('SWEEP_MAX_THREADS', 2048))
+
+
+# ==================================================================
+# WORKERS
+# ==================================================================
+
+def _init_worker(threads, bruteforce, spool, scan_threads):
+    # The parent decides when to stop; a Ctrl-C must not kill scans mid-line
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _WORKER['pool'] = ThreadPoolExecutor(max_workers=threads)
+    _WORKER['bruteforce'] = bruteforce
+    _WORKER['spool'] = spool
+    # Each scan starts its own resolver and prober threads; shrink them so
+    # processes x threads x scan_threads stays within the sweep's cap
+    scan.DISCOVERY_RESOLVERS = max(1, min(scan.DISCOVERY_RESOLVERS, scan_threads // 2))
+    scan.DISCOVERY_PROBERS = max(1, min(scan.DISCOVERY_PROBERS, scan_threads - scan_threads // 2))
+
+
+def _scan_one(domain):
+    """Scan domain into a spool file; returns (ok, path of its NDJSON line without the newline)"""
+    started = time.monotonic()
+    fd, path = tempfile.mkstemp(suffix='.json', dir=_WORKER['spool'])
+    with os.fdopen(fd, 'wb') as line:
+        try:
+            results = scan.AegisScanner(domain, bruteforce=_WORKER['bruteforce']).run()
+        except Exception as e:
+            line.write(json.dumps({'domain': domain, 'status': 'error', 'elapsed': round(time.monotonic() - started, 3),
+                                   'error': f"{type(e).__name__}: {e}"}).encode('utf-8'))
+            return False, path
+        head = json.dumps({'domain': domain, 'status': 'ok', 'elapsed': round(time.monotonic() - started, 3)})
+        line.write(head[:-1].encode('utf-8') + b', "results": ')
+        write_json(results, line)
+        line.write(b'}')
+    return True, path
+
+
+def _scan_chunk(domains):
+    return list(_WORKER['pool'].map(_scan_one, domains))
+
+
+# ==================================================================
+# CHECKPOINT
+# ==================================================================
+
+def read_domains(source):
+    """Normalized, de-duplicated domains from a file (or stdin for '-'), in order"""
+    stream = sys.stdin if source == '-' else open(source, encoding='utf-8')
+    seen = {}
+    with stream:
+        for line in stream:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                seen.setdefault(scan.normalize_domain(line), None)
+    seen.pop('', None)
+    return list(seen)
+
+
+def load_checkpoint(path, retry_errors=False):
+    """Domains already swept into path
+    
+    A line torn by a kill mid-write is cut off so the file stays valid
+    NDJSON. With retry_errors, domains that failed are swept again (their
+    old lines stay; the newest line for a domain wins).
+    """
+    done = {}
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'rb+') as f:
+        good = 0
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            good += len(line)
+            match = _LINE_PREFIX.match(line)
+            if match:
+                done[json.loads(match.group(1))] = match.group(2) == b'ok'
+        f.truncate(good)
+    return {domain for domain, ok in done.items() if ok or not retry_errors}
+
+
+def _duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    return f"{seconds // 60}m{seconds % 60:02d}s"
+
+
+class Progress:
+    """Throughput and ETA over this run's completions, printed to stderr"""
+    
+    def __init__(self, total, skipped, every):
+        self.total = total
+        self.skipped = skipped
+        self.every = every
+        self.done = 0
+        self.errors = 0
+        self.started = time.monotonic()
+        self._last = self.started
+    
+    def update(self, ok):
+        self.done += 1
+        self.errors += not ok
+        now = time.monotonic()
+        if now - self._last >= self.every:
+            self._last = now
+            self.report()
+    
+    def report(self, final=False):
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        remaining = self.total - self.done
+        eta = _duration(remaining / rate) if rate else '?'
+        line = (f"[sweep] {self.done}/{self.total} ({100 * self.done / self.total if self.total else 100:.1f}%)"
+                f" {self.errors} errors, {rate:.2f} domains/s, {60 * rate:.0f}/min")
+        if self.skipped:
+            line += f", {self.skipped} resumed"
+        line += f", elapsed {_duration(elapsed)}" if final else f", ETA {eta}"
+        print(line, file=sys.stderr, flush=True)
+
+
+# ==================================================================
+# SWEEP
+# ==================================================================
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def sweep(domains, output, processes, threads, bruteforce=False, retry_errors=False,
+          history=False, progress_every=10.0, max_threads=SWEEP_MAX_THREADS):
+    """Scan domains into output, skipping those already there; returns the Progress"""
+    done = load_checkpoint(output, retry_errors)
+    pending = [d for d in domains if d not in done]
+    progress = Progress(len(pending), len(domains) - len(pending), progress_every)
+    if not pending:
+        progress.report(final=True)
+        return progress
+    
+    # A chunk fills one worker's thread pool; smaller chunks keep fewer
+    # finished scans waiting on a slow one before they are written
+    chunk_size = max(1, threads)
+    scan_threads = max_threads // max(1, processes * threads)
+    spool = output + '.spool'
+    shutil.rmtree(spool, ignore_errors=True)  # Lines of an interrupted run were never appended
+    os.makedirs(spool)
+    pool = Pool(processes, initializer=_init_worker, initargs=(threads, bruteforce, spool, scan_threads))
+    
+    def interrupt(signum, frame):
+        raise KeyboardInterrupt
+    previous = signal.signal(signal.SIGTERM, interrupt)
+    
+    try:
+        with open(output, 'ab') as out:
+            for lines in pool.imap_unordered(_scan_chunk, _chunks(pending, chunk_size)):
+                for _, path in lines:
+                    with open(path, 'rb') as line:
+                        shutil.copyfileobj(line, out)
+                    out.write(b'\n')
+                out.flush()
+                os.fsync(out.fileno())  # The checkpoint: a line on disk is never scanned again
+                for ok, path in lines:
+                    if ok and history:
+                        _record_history(path)
+                    os.remove(path)
+                    progress.update(ok)
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+        progress.report(final=True)
+        print("[sweep] interrupted - rerun the same command to resume", file=sys.stderr)
+        raise
+    finally:
+        pool.join()
+        signal.signal(signal.SIGTERM, previous)
+        shutil.rmtree(spool, ignore_errors=True)
+    
+    progress.report(final=True)
+    return progress
+
+
+def _record_history(path):
+    try:
+        with open(path, 'rb') as line:
+            scan.SCAN_HISTORY.record(json.load(line)['results'])
+    except Exception as e:
+        print(f"[sweep] history: {e}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1], formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('domains', help="file with one domain per line, or - for stdin")
+    parser.add_argument('-o', '--output', required=True, help="NDJSON results file, also the resume checkpoint")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, default=8, help="concurrent scans per process")
+    parser.add_argument('--max-threads', type=int, default=SWEEP_MAX_THREADS,
+                        help="cap on the discovery threads of all concurrent scans together")
+    parser.add_argument('--bruteforce', action='store_true', help="also brute-force subdomains from the wordlist")
+    parser.add_argument('--retry-errors', action='store_true', help="sweep domains whose last line is an error again")
+    parser.add_argument('--history', action='store_true', help="record each result in the scan history database")
+    parser.add_argument('--progress', type=float, default=10.0, help="seconds between progress lines")
+    args = parser.parse_args(argv)
+    
+    if args.history and scan.SCAN_HISTORY is None:
+        parser.error("--history needs the scan history enabled (SCAN_HISTORY=0 is set)")
+    
+    try:
+        progress = sweep(read_domains(args.domains), args.output, args.processes, args.threads,
+                         bruteforce=args.bruteforce, retry_errors=args.retry_errors,
+                         history=args.history, progress_every=args.progress, max_threads=args.max_threads)
+    except KeyboardInterrupt:
+        return 130
+    return 1 if progress.errors and progress.errors == progress.done else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())